@@ -0,0 +1,114 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from room_locks import RoomLocks
+
+
+class RoomLoadCoalescer:
+    """Single-flight room loads: concurrent joins to the same room share one load"""
+
+    def __init__(self, loader):
+        self._loader = loader  # room_id -> what joins need of the room (None if it does not exist)
+        self._flights = {}  # room_id -> [done_event, result, error]
+        self._lock = threading.Lock()
+
+    def load(self, room_id):
+        with self._lock:
+            flight = self._flights.get(room_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[room_id] = [threading.Event(), None, None]
+
+        if not leader:
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1]
+
+        try:
+            flight[1] = self._loader(room_id)
+        except Exception as e:
+            flight[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(room_id, None)
+            flight[0].set()
+        return flight[1]
+
+
+class JoinAdmission:
+    """Bounded admission for joins: few run at once, reconnects go first, the rest retry later"""
+
+    def __init__(self, max_active=8, max_waiting=200, max_waiting_new=50, max_wait=0.75, retry_after=2.0,
+                 room_locks=None):
+        self.max_active = max_active  # Joins doing DB work at the same time
+        self.max_waiting = max_waiting  # Queue bound for reconnects
+        self.max_waiting_new = max_waiting_new  # New players are turned away sooner
+        self.max_wait = max_wait  # Seconds a join may queue (kept under the client's 1s reload timer)
+        self.retry_after = retry_after  # Base delay suggested to turned-away clients
+        self._active = 0
+        self._waiting = []  # heap of (priority, ticket) - 0 = reconnect, 1 = new player
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+        # Joins to one room run one at a time, so reconnect/new-player decisions see each other
+        # (pass the server's RoomLocks so joins also exclude swaps and deals in that room)
+        self._room_locks = room_locks or RoomLocks()
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self, reconnect):
+        """Wait for a join slot; False means the client should retry later"""
+        entry = (0 if reconnect else 1, next(self._tickets))
+        deadline = time.monotonic() + self.max_wait
+
+        with self._cond:
+            if self._active < self.max_active and not self._waiting:
+                self._active += 1
+                self.admitted += 1
+                return True
+
+            limit = self.max_waiting if reconnect else self.max_waiting_new
+            if len(self._waiting) >= limit:
+                self.rejected += 1
+                return False
+
+            heapq.heappush(self._waiting, entry)
+            while True:
+                if self._waiting[0] == entry and self._active < self.max_active:
+                    heapq.heappop(self._waiting)
+                    self._active += 1
+                    self.admitted += 1
+                    self._cond.notify_all()  # Next in line may also fit
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self.rejected += 1
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(remaining)
+
+    def room_lock(self, room_id):
+        return self._room_locks.lock(room_id)
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def retry_delay(self, reconnect):
+        """Suggested retry delay in seconds - grows with the queue, jittered to spread the next wave"""
+        with self._cond:
+            backlog = len(self._waiting) / max(1, self.max_active)
+        delay = self.retry_after * (1 + backlog) * (0.5 if reconnect else 1.0)
+        return round(delay * random.uniform(0.75, 1.25), 2)
+
+    def stats(self):
+        with self._cond:
+            return {'active': self._active, 'waiting': len(self._waiting),
+                    'admitted': self.admitted, 'rejected': self.rejected}
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+import zlib
+
+ARCHIVE_INTERVAL = 30.0  # Seconds between archive passes
+ARCHIVE_BATCH_ROUNDS = 200  # Rounds moved per transaction
+EVENT_RETENTION_SECONDS = 24 * 3600  # Checkpointed events stay this long as an audit trail, then are compacted
+COMPACT_BATCH_EVENTS = 10000  # Events deleted per transaction
+
+
+def encode_card(card):
+    """Card as one int: twice its index (+1 for dealt cards, which carry 'deck'), or negative for blank cards"""
+    if card.get('index', -1) >= 0:
+        return card['index'] * 2 + ('deck' in card)
+    # Blank cards keep the value and suit they replaced
+    return -1 - (card['suit'] * 13 + card['value'] - 1)
+
+
+def decode_card(code):
+    if code < 0:
+        code = -1 - code
+        return {'value': (code % 13) + 1, 'suit': code // 13, 'index': -1}
+    index = code // 2
+    card = {'value': (index % 13) + 1, 'suit': index // 13, 'index': index}
+    if code % 2:
+        card['deck'] = index // 52 + 1
+    return card
+
+
+def encode_round(rows):
+    """Compress one round's room_players rows into a single blob"""
+    return zlib.compress(json.dumps([
+        [player_id, name, identifier, [encode_card(card) for card in json.loads(cards or '[]')],
+         chant_count, total_swaps, folded, ready, json.loads(flipped or '[]'), completion, joined_at,
+         json.loads(card_order) if card_order else []]
+        for (player_id, name, identifier, cards, chant_count, total_swaps, folded, ready, flipped, completion,
+             joined_at, card_order) in rows
+    ], separators=(',', ':')).encode(), 9)
+
+
+def decode_round(blob):
+    """Rows of an archived round, in the room_players column order used by GameDatabase._load_round"""
+    rows = []
+    for player in json.loads(zlib.decompress(blob)):
+        player_id, name, identifier, hand, chant_count, total_swaps, folded, ready, flipped, completion, joined_at = \
+            player[:11]
+        card_order = player[11] if len(player) > 11 else []  # Archived before display order was stored
+        rows.append((player_id, name, identifier, json.dumps([decode_card(code) for code in hand]), chant_count,
+                     total_swaps, folded, ready, json.dumps(flipped), completion, joined_at,
+                     json.dumps(card_order) if card_order else None))
+    return rows
+
+
+def merge_round(archived, rows):
+    """Rows of a round that is archived and also back in room_players (a late update) - room_players wins"""
+    merged = {row[0]: row for row in archived}
+    merged.update((row[0], row) for row in rows)
+    return list(merged.values())
+
+
+class RoundArchive:
+    """Background mover of finished rounds out of room_players into one compressed row per round
+
+    Each pass also compacts the event log: events already covered by the checkpoint and older than
+    event_retention seconds are deleted, so room_events holds only the audit window and the tail since
+    the last checkpoint.
+    """
+
+    def __init__(self, storage, interval=ARCHIVE_INTERVAL, batch_rounds=ARCHIVE_BATCH_ROUNDS,
+                 event_retention=EVENT_RETENTION_SECONDS, batch_events=COMPACT_BATCH_EVENTS):
+        self.storage = storage
+        self.interval = interval
+        self.batch_rounds = batch_rounds
+        self.event_retention = event_retention
+        self.batch_events = batch_events
+
+    def start(self, lock):
+        """Archive in the background; `lock` keeps passes from interleaving with checkpoints"""
+        threading.Thread(target=self._run, args=(lock,), daemon=True).start()
+
+    def archive_batch(self):
+        """Move up to batch_rounds finished rounds in one transaction; returns how many moved"""
+        return self.storage.archive_rounds(self.batch_rounds)
+
+    def compact_batch(self):
+        """Delete up to batch_events checkpointed events past the retention window; returns how many went"""
+        return self.storage.compact_events(time.time() - self.event_retention, self.batch_events)
+
+    def _run(self, lock):
+        while True:
+            time.sleep(self.interval)
+            try:
+                # Batches until caught up, letting checkpoints in between them
+                while True:
+                    with lock:
+                        moved = self.archive_batch()
+                    if moved:
+                        print(f"[ARCHIVE] Archived {moved} finished rounds")
+                    if moved < self.batch_rounds:
+                        break
+                while True:
+                    with lock:
+                        compacted = self.compact_batch()
+                    if compacted:
+                        print(f"[ARCHIVE] Compacted {compacted} checkpointed events")
+                    if compacted < self.batch_events:
+                        break
+            except Exception as e:
+                print(f"[ARCHIVE] Error while archiving rounds: {e}")
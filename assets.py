@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import re
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Optional - gzip is still served without it
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Optional - original images are served without it
+    Image = None
+
+# Text assets worth precompressing (images are already compressed)
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.html', '.svg', '.json', '.txt'}
+# Assets whose /static/... references get rewritten to fingerprinted URLs
+REWRITE_EXTENSIONS = {'.css', '.js'}
+# Card backs get a WebP variant no wider/taller than this (2x the on-screen card)
+CARD_BACK_DIR = 'img/'
+CARD_BACK_MAX_SIZE = (532, 532)
+
+STATIC_REFERENCE = re.compile(r"/static/([\w./-]+)")
+
+mimetypes.add_type('image/webp', '.webp')
+
+
+class Asset:
+    """One fingerprinted static file with its prebuilt variants"""
+
+    def __init__(self, path, body, digest, mimetype):
+        self.path = path
+        self.mimetype = mimetype
+        self.digest = digest
+        self.body = body
+        self.gzip = None
+        self.brotli = None
+        self.webp = None
+
+
+class AssetPipeline:
+    """Fingerprint, precompress and serve static files with long-lived caching"""
+
+    def __init__(self, static_dir, url_prefix='/assets'):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix
+        self.assets = {}  # fingerprinted path -> Asset
+        self.manifest = {}  # original path -> fingerprinted path
+
+    def build(self):
+        """Build every variant in memory - called once at startup"""
+        paths = []
+        for root, _, files in os.walk(self.static_dir):
+            for name in files:
+                full_path = os.path.join(root, name)
+                paths.append(os.path.relpath(full_path, self.static_dir).replace(os.sep, '/'))
+
+        # Binary assets first, so CSS/JS can reference their fingerprinted URLs
+        paths.sort(key=lambda path: (os.path.splitext(path)[1] in REWRITE_EXTENSIONS, path))
+        for path in paths:
+            with open(os.path.join(self.static_dir, path), 'rb') as f:
+                body = f.read()
+            if os.path.splitext(path)[1] in REWRITE_EXTENSIONS:
+                body = self._rewrite_references(body)
+            self._add(path, body)
+
+        print(f"[ASSETS] Built {len(self.assets)} fingerprinted assets "
+              f"(brotli: {'on' if brotli else 'off'}, webp: {'on' if Image else 'off'})")
+
+    def _rewrite_references(self, body):
+        text = body.decode('utf-8')
+        text = STATIC_REFERENCE.sub(lambda match: self.url(match.group(1)), text)
+        return text.encode('utf-8')
+
+    def _add(self, path, body):
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(path)
+        fingerprinted = f'{stem}.{digest}{ext}'
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        asset = Asset(fingerprinted, body, digest, mimetype)
+        if ext in COMPRESSIBLE_EXTENSIONS:
+            asset.gzip = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli:
+                asset.brotli = brotli.compress(body, quality=11)
+        if path.startswith(CARD_BACK_DIR) and ext in ('.jpg', '.jpeg', '.png'):
+            webp = self._build_webp(body)
+            # Small originals can come out larger as WebP - only keep real wins
+            if webp and len(webp) < len(body):
+                asset.webp = webp
+
+        self.assets[fingerprinted] = asset
+        self.manifest[path] = fingerprinted
+
+    def _build_webp(self, body):
+        if not Image:
+            return None
+        try:
+            with Image.open(io.BytesIO(body)) as image:
+                # Let the JPEG decoder downscale while decoding huge originals
+                image.draft('RGB', CARD_BACK_MAX_SIZE)
+                image.thumbnail(CARD_BACK_MAX_SIZE)
+                output = io.BytesIO()
+                image.convert('RGB').save(output, 'WEBP', quality=80, method=6)
+                return output.getvalue()
+        except Exception as e:
+            print(f"[ASSETS] WebP conversion failed: {e}")
+            return None
+
+    def url(self, path):
+        """URL for a static file - fingerprinted when known, plain /static/ otherwise"""
+        fingerprinted = self.manifest.get(path)
+        if fingerprinted:
+            return f'{self.url_prefix}/{fingerprinted}'
+        return f'/static/{path}'
+
+    def serve(self, fingerprinted, request):
+        """Build the response for a fingerprinted asset, or None if unknown"""
+        asset = self.assets.get(fingerprinted)
+        if not asset:
+            return None
+
+        # Parsed headers, so q=0 means "not acceptable" and "br" is not found inside another token.
+        # WebP must be listed by name: every browser sends */*, including ones that cannot show it
+        webp = any(value == 'image/webp' and quality > 0 for value, quality in request.accept_mimetypes)
+        encodings = request.accept_encodings
+
+        # Pick the smallest variant the client accepts
+        body, mimetype, encoding, variant = asset.body, asset.mimetype, None, 'id'
+        if asset.webp and webp:
+            body, mimetype, variant = asset.webp, 'image/webp', 'webp'
+        elif asset.brotli and encodings['br'] > 0:
+            body, encoding, variant = asset.brotli, 'br', 'br'
+        elif asset.gzip and encodings['gzip'] > 0:
+            body, encoding, variant = asset.gzip, 'gzip', 'gz'
+
+        etag = f'{asset.digest}-{variant}'
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'Vary': 'Accept' if asset.webp else 'Accept-Encoding',
+        }
+
+        # Weak comparison, as If-None-Match requires - W/"..." from a proxy and * match too
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(body, mimetype=mimetype, headers=headers)
@@ -0,0 +1,111 @@
+"""Benchmark: /admin/export throughput and peak memory as the history grows
+
+Usage: python benchmarks/bench_export.py [max_rooms]
+
+Each room has 4 players and 3 rounds (two archived, one live). Peak memory (tracemalloc)
+should stay flat across sizes: the export reads one page of rooms at a time. A second table grows
+a single long-lived room instead - flat too, since its rounds are paged as well.
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch the real game.db
+os.environ.setdefault('GAME_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.pop('DATABASE_URL', None)
+os.environ['ADMIN_TOKEN'] = 'bench'
+
+from models import Hand  # noqa: E402
+
+
+def populate(db, room_ids):
+    db.create_rooms(room_ids, 3, 3)
+    for room_id in room_ids:
+        players = [f'{room_id}-{player}' for player in range(4)]
+        for player_id in players:
+            db.add_player(player_id, room_id, player_id, f'id-{player_id}')
+        for round_number in (1, 2, 3):
+            if round_number > 1:
+                db.start_new_round(room_id)
+            hands = {player_id: Hand(range(i * 3, i * 3 + 3)) for i, player_id in enumerate(players)}
+            db.deal_hands(room_id, round_number, hands, list(range(12)))
+    db.checkpoint()
+    while db.storage.archive_rounds(1000):
+        pass
+
+
+def add_rounds(db, room_id, rounds):
+    """Play `rounds` more rounds of 4 players in one room"""
+    if not db.room_exists(room_id):
+        db.create_room(room_id, 3, 3)
+        for player in range(4):
+            db.add_player(f'{room_id}-{player}', room_id, f'Player{player + 1}', f'id-{room_id}-{player}')
+    for _ in range(rounds):
+        db.start_new_round(room_id)
+        round_number = db.get_current_round_number(room_id)
+        db.deal_hands(room_id, round_number, {f'{room_id}-{i}': Hand(range(i * 3, i * 3 + 3)) for i in range(4)},
+                      list(range(12)))
+    db.checkpoint()
+    while db.storage.archive_rounds(1000):
+        pass
+
+
+def export(client, fmt, query=''):
+    """(rows, MB, rows/s, peak KB) of one streamed export"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get(f'/admin/export?format={fmt}{query}', headers={'X-Admin-Token': 'bench'},
+                              buffered=False)
+        rows = size_bytes = 0
+        for chunk in response.response:
+            rows += chunk.count('\n') if isinstance(chunk, str) else chunk.count(b'\n')
+            size_bytes += len(chunk)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return rows, size_bytes / 1e6, rows / elapsed, peak / 1024
+
+
+def main():
+    max_rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import server
+    client = server.app.test_client()
+
+    print(f"{'rooms':>8}{'rows':>10}{'format':>8}{'rows/s':>12}{'MB':>8}{'peak KB':>10}")
+    total = 0
+    size = max_rooms // 8
+    while size <= max_rooms:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            populate(server.db, [f'X{i:06d}' for i in range(total, size)])
+        total = size
+
+        for fmt in ('ndjson', 'csv'):
+            rows, megabytes, rate, peak = export(client, fmt)
+            print(f"{size:>8}{rows:>10}{fmt:>8}{rate:>12,.0f}{megabytes:>8.1f}{peak:>10.0f}")
+        size *= 2
+
+    print()
+    print("One long-lived room")
+    print(f"{'rounds':>8}{'rows':>10}{'format':>8}{'rows/s':>12}{'MB':>8}{'peak KB':>10}")
+    total = 0
+    rounds = max_rooms // 2
+    while rounds <= max_rooms * 4:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            add_rounds(server.db, 'LONG01', rounds - total)
+        total = rounds
+        rows, megabytes, rate, peak = export(client, 'ndjson', '&room=LONG01')
+        print(f"{rounds:>8}{rows:>10}{'ndjson':>8}{rate:>12,.0f}{megabytes:>8.1f}{peak:>10.0f}")
+        rounds *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Benchmark: rooms created per second through the create_room socket handler
+
+Usage: python benchmarks/bench_room_creation.py [rooms]
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch the real game.db
+os.environ.setdefault('GAME_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import server
+        server.socketio.server.logger.disabled = True
+        server.socketio.server.eio.logger.disabled = True
+        client = server.socketio.test_client(server.app)
+
+        start = time.perf_counter()
+        for _ in range(rooms):
+            client.emit('create_room', {'mode': 3, 'max_boosts': 3, 'decks': 1})
+        elapsed = time.perf_counter() - start
+
+    created = [p for p in client.get_received() if p['name'] == 'room_created']
+    room_ids = {p['args'][0]['room_id'] for p in created}
+    assert len(room_ids) == rooms, 'duplicate or missing room IDs'
+
+    print(f"Created {rooms} rooms in {elapsed:.3f}s")
+    print(f"  {rooms / elapsed:,.0f} rooms/s, {elapsed / rooms * 1000:.2f} ms/room")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark: per-event handler latency as rooms grow from 2 to 50 players
+
+Usage: python benchmarks/bench_room_events.py [events_per_size]
+
+join_room is the acting player rejoining, as on a page refresh (game_started from the cached room view).
+
+Handler work stays flat as the room grows; delivery does not. python-socketio encodes a room event
+once per member, so a swap broadcast to 50 players costs ~1 ms of encoding where 2 players cost
+~0.15 ms. The end-to-end table also includes each test client decoding its copy - the encoding-only
+table swaps that for just the encode the server does before engine.io queues the packet.
+"""
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch the real game.db
+os.environ.setdefault('GAME_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+ROOM_SIZES = (2, 5, 10, 20, 50)
+EVENTS = (
+    ('flip_card', lambda room_id, i: {'room_id': room_id, 'card_index': i % 3, 'rotation': 180}),
+    ('update_chant_count', lambda room_id, i: {'room_id': room_id, 'chant_count': i % 4}),
+    ('swap_card', lambda room_id, i: {'room_id': room_id, 'card_index': i % 3}),
+    ('boost_swap', lambda room_id, i: {'room_id': room_id, 'card_index': i % 3, 'desired_value': 1 + i % 13,
+                                       'boost_level': 1 + i % 4}),
+    ('swap_card_positions', lambda room_id, i: {'room_id': room_id, 'from_index': i % 3, 'to_index': (i + 1) % 3}),
+    ('join_room', lambda room_id, i: {'room_id': room_id, 'player_id': f'bench_{room_id}_actor'}),
+    ('fold', lambda room_id, i: {'room_id': room_id}),
+)
+
+
+def setup_room(server, players):
+    """Create a room and fill it with test clients; returns (room_id, clients)"""
+    creator = server.socketio.test_client(server.app)
+    # Three decks so 50 players x 3 cards still leave cards to swap
+    creator.emit('create_room', {'mode': 3, 'max_boosts': 10 ** 9, 'decks': 3})
+    room_id = creator.get_received()[0]['args'][0]['room_id']
+
+    clients = [creator]
+    for i in range(players - 1):
+        client = server.socketio.test_client(server.app)
+        identifier = f'bench_{room_id}_actor' if i == players - 2 else f'bench_{room_id}_{i}'
+        client.emit('join_room', {'room_id': room_id, 'player_id': identifier})
+        clients.append(client)
+    for client in clients:
+        client.get_received()
+    return room_id, clients
+
+
+def measure(room_id, actor, clients, events_per_size):
+    """Median latency (ms) of each event sent by actor"""
+    medians = {}
+    for name, make_payload in EVENTS:
+        timings = []
+        for i in range(events_per_size):
+            start = time.perf_counter()
+            actor.emit(name, make_payload(room_id, i))
+            timings.append(time.perf_counter() - start)
+            if i % 50 == 0:
+                for client in clients:
+                    client.get_received()
+        medians[name] = statistics.median(timings) * 1000
+    return medians
+
+
+def print_table(title, results, events_per_size):
+    print(f"{title} - median ms, {events_per_size} events per cell")
+    print(f"{'players':>8}" + ''.join(f"{name:>20}" for name, _ in EVENTS))
+    for players in ROOM_SIZES:
+        print(f"{players:>8}" + ''.join(f"{results[players][name]:>20.3f}" for name, _ in EVENTS))
+    print()
+
+
+def main():
+    events_per_size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import server
+        server.socketio.server.logger.disabled = True
+        server.socketio.server.eio.logger.disabled = True
+
+        end_to_end = {}
+        server_work = {}
+        encoding = {}
+        for players in ROOM_SIZES:
+            room_id, clients = setup_room(server, players)
+            actor = clients[-1]
+            end_to_end[players] = measure(room_id, actor, clients, events_per_size)
+
+            for client in clients:
+                client.disconnect()
+
+            # Same room size with only the actor connected: the players stay in the room,
+            # so this isolates the handlers from Socket.IO delivering to each socket
+            room_id, clients = setup_room(server, players)
+            actor = clients[-1]
+            for client in clients[:-1]:
+                client.disconnect()
+            server_work[players] = measure(room_id, actor, [actor], events_per_size)
+            actor.disconnect()
+
+            # Every player connected again, but a copy is only encoded - not decoded by a test client.
+            # The test clients deliver through the same per-packet hook, so it is swapped for the run
+            room_id, clients = setup_room(server, players)
+            actor = clients[-1]
+            deliver = server.socketio.server._send_packet
+            server.socketio.server._send_packet = lambda eio_sid, pkt: pkt.encode()
+            try:
+                encoding[players] = measure(room_id, actor, clients, events_per_size)
+            finally:
+                server.socketio.server._send_packet = deliver
+            for client in clients:
+                client.disconnect()
+
+    print_table('Handler work (other players in the room, not connected)', server_work, events_per_size)
+    print_table('Encoding only (every player connected, each copy encoded but not decoded)', encoding, events_per_size)
+    print_table('End to end (every player connected, includes delivery to each socket)', end_to_end, events_per_size)
+
+
+if __name__ == '__main__':
+    main()
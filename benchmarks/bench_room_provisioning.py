@@ -0,0 +1,47 @@
+"""Benchmark: bulk room provisioning through the admin HTTP API
+
+Usage: python benchmarks/bench_room_provisioning.py [rooms_per_request] [requests]
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch the real game.db
+os.environ.setdefault('GAME_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.setdefault('ADMIN_TOKEN', 'bench')
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import server
+        client = server.app.test_client()
+
+        timings = []
+        room_ids = set()
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.post('/admin/rooms', json={'count': rooms, 'mode': 3, 'max_boosts': 3, 'decks': 1},
+                                   headers={'X-Admin-Token': os.environ['ADMIN_TOKEN']})
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 201, response.status_code
+            room_ids.update(room['room_id'] for room in response.get_json()['rooms'])
+
+    assert len(room_ids) == rooms * requests, 'duplicate or missing room IDs'
+    assert all(server.db.room_exists(room_id) for room_id in list(room_ids)[:100])
+
+    best = min(timings)
+    print(f"Provisioned {rooms} rooms per request, {requests} requests")
+    print(f"  best {best * 1000:.1f} ms/request, {rooms / best:,.0f} rooms/s")
+    print(f"  mean {sum(timings) / len(timings) * 1000:.1f} ms/request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Check: the weekly cleanup deletes only inactive rooms and forgets them everywhere
+
+Usage: python benchmarks/check_room_cleanup.py
+
+Runs clean_database with a one-second ROOM_RETENTION_DAYS: a room with a recent event is kept, an idle
+one is deleted from the database, the room ID allocator and the existence cache. Exits with code 1 on failure.
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch the real game.db
+os.environ.setdefault('GAME_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.pop('ROOM_RETENTION_DAYS', None)
+
+RETENTION_SECONDS = 1.0
+
+
+def gone(server, room_id):
+    return (room_id not in server.room_ids and not server.room_cache.exists(room_id)
+            and not server.db.room_exists(room_id))
+
+
+def main():
+    failures = []
+
+    def check(name, condition):
+        if not condition:
+            failures.append(name)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import server
+        from database import GameDatabase
+        server.socketio.server.logger.disabled = True
+        server.socketio.server.eio.logger.disabled = True
+        client = server.socketio.test_client(server.app)
+        for _ in range(2):
+            client.emit('create_room', {'mode': 3, 'max_boosts': 3, 'decks': 1})
+        active_id, idle_id = [p['args'][0]['room_id'] for p in client.get_received() if p['name'] == 'room_created']
+
+        server.clean_database()
+        check('nothing is deleted without ROOM_RETENTION_DAYS',
+              server.room_cache.exists(active_id) and server.room_cache.exists(idle_id))
+
+        time.sleep(RETENTION_SECONDS * 1.5)
+        client.emit('join_room', {'room_id': active_id, 'player_id': 'cleanup_check'})
+        server.ROOM_RETENTION_DAYS = RETENTION_SECONDS / 86400
+        server.clean_database()
+        check('a room with recent activity is kept', server.room_cache.exists(active_id) and
+              server.db.get_room_info(active_id) is not None)
+        check('an idle room is deleted and forgotten', gone(server, idle_id))
+        check('its page is gone', server.app.test_client().get(f'/{idle_id}').status_code != 200)
+
+        client.disconnect()
+        time.sleep(RETENTION_SECONDS * 1.5)
+        server.clean_database()
+        check('the other room goes once it is idle too', gone(server, active_id))
+        check('deleted rooms stay gone after a restart', not GameDatabase(server.db.storage).room_exists(idle_id))
+
+    if failures:
+        for name in failures:
+            print(f"FAILED: {name}")
+        sys.exit(1)
+    print("cleanup OK: active room kept, idle rooms deleted and forgotten by room_ids and room_cache")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Check: spectators never receive a card that is still face down
+
+Usage: python benchmarks/check_spectators.py [swaps]
+
+Two players swap and boost face-down and flipped cards, then start a new round, while a spectator
+watches. Every card the spectator receives (snapshot cards, card, new_card and the used-card lists of
+card_flipped, card_swapped, boost_completed, new_round_started) must sit at a position its owner has
+flipped. Exits with code 1 on a leak.
+"""
+import contextlib
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch the real game.db
+os.environ.setdefault('GAME_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+
+def setup_room(server):
+    """A room with two joined players and one spectator; returns (room_id, players, spectator)"""
+    creator = server.socketio.test_client(server.app)
+    creator.emit('create_room', {'mode': 3, 'max_boosts': 10 ** 9, 'decks': 1})
+    room_id = creator.get_received()[0]['args'][0]['room_id']
+    creator.emit('join_room', {'room_id': room_id, 'player_id': f'check_{room_id}_0'})
+    other = server.socketio.test_client(server.app)
+    other.emit('join_room', {'room_id': room_id, 'player_id': f'check_{room_id}_1'})
+
+    spectator = server.socketio.test_client(server.app)
+    spectator.emit('spectate_room', {'room_id': room_id})
+    return room_id, [creator, other], spectator
+
+
+def leaks(received, flipped):
+    """Cards the spectator saw at positions that were not flipped - flipped: player_id -> display positions"""
+    found = []
+    for message in received:
+        name, data = message['name'], json.loads(message['args'][0])
+        if name == 'spectator_snapshot':
+            for player in data.get('players', []):
+                found += [(name, player['player_id'], position) for position, card in enumerate(player['cards'])
+                          if card is not None and position not in flipped.get(player['player_id'], ())]
+        elif name == 'spectator_batch':
+            for event, event_data in data['events']:
+                if event == 'cards_revealed':
+                    continue  # Every hand is face up by then
+                # The used-card changes name the card taken / released as surely as new_card does
+                shown = [key for key in ('card', 'new_card', 'used_cards', 'used_cards_added', 'used_cards_removed')
+                         if event_data.get(key)]
+                position = event_data.get('card_index')
+                if shown and position not in flipped.get(event_data.get('player_id'), ()):
+                    found.append((event, event_data.get('player_id'), position, shown))
+    return found
+
+
+def main():
+    swaps = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import server
+        server.socketio.server.logger.disabled = True
+        server.socketio.server.eio.logger.disabled = True
+        server.spectators.max_backlog = 10 ** 9  # Test clients never acknowledge deliveries
+
+        room_id, players, spectator = setup_room(server)
+        player_ids = [server.socketio.server.manager.sid_from_eio_sid(client.eio_sid, '/') for client in players]
+        flipped = {player_id: set() for player_id in player_ids}
+        received = []
+
+        for i in range(swaps):
+            actor = i % len(players)
+            if i == swaps // 2:
+                # From here on the first card is face up, so its swaps may show the new card
+                for client, player_id in zip(players, player_ids):
+                    client.emit('flip_card', {'room_id': room_id, 'card_index': 0, 'rotation': 180})
+                    flipped[player_id].add(0)
+            card_index = i % 3
+            if i % 2:
+                players[actor].emit('swap_card', {'room_id': room_id, 'card_index': card_index})
+            else:
+                players[actor].emit('boost_swap', {'room_id': room_id, 'card_index': card_index,
+                                                   'desired_value': 1 + i % 13, 'boost_level': 4})
+            server.spectators.flush()
+            received += spectator.get_received()
+        # A new round deals every hand face down
+        for client in players:
+            client.emit('ready_for_new_round', {'room_id': room_id})
+        server.spectators.flush()
+        received += spectator.get_received()
+        for client in players + [spectator]:
+            client.disconnect()
+
+    events = sum(len(json.loads(message['args'][0])['events']) for message in received
+                 if message['name'] == 'spectator_batch')
+    found = leaks(received, flipped)
+    print(f"{len(received)} deliveries, {events} events to the spectator, {len(found)} face-down cards seen")
+    if found:
+        for leak in found[:10]:
+            print(f"  leaked: {leak}")
+        sys.exit(1)
+    if not events:
+        print("no spectator events were delivered - nothing was checked")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
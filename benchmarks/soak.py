@@ -0,0 +1,260 @@
+"""Soak test: hours of room churn against a real server process, failing on resource growth
+
+Usage: python benchmarks/soak.py [--minutes 240] [--rooms-per-minute 30] [--max-slope rss_mb=20 ...]
+
+server.py runs as a subprocess with the production Socket.IO setup (threading, polling only) on a
+temporary game.db. Players are plain HTTP long-poll clients: each room is created, joined by a few
+players who swap a card, then left - some players vanish without disconnecting, like closed tabs.
+Every --sample-seconds the server's RSS, open file descriptors, thread count, game.db size (with WAL)
+and p95 join/swap latency are recorded. After the warm-up, a least-squares slope per hour is fitted to
+each and the run fails if any slope is above its limit. Linux only (reads /proc).
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Growth per hour allowed once warmed up - a steady rise in any of these is a leak
+MAX_SLOPES = {'rss_mb': 20.0, 'fds': 1.0, 'threads': 1.0, 'db_mb': 50.0, 'latency_ms': 5.0}
+PLAYERS_PER_ROOM = 4
+ABANDON_EVERY = 10  # Every Nth player drops without a disconnect packet (ping timeout cleans up)
+POLL_TIMEOUT = 90  # Seconds - longer than the server's 25s ping interval
+
+
+class PollingClient:
+    """Minimal Engine.IO 4 / Socket.IO 5 client over HTTP long-polling (stdlib only)"""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=POLL_TIMEOUT)
+        self.sid = None
+
+    def _request(self, method, body=None):
+        query = 'EIO=4&transport=polling' + (f'&sid={self.sid}' if self.sid else '')
+        self.connection.request(method, f'/socket.io/?{query}&t={time.time_ns()}', body=body,
+                                headers={'Content-Type': 'text/plain;charset=UTF-8'} if body else {})
+        response = self.connection.getresponse()
+        data = response.read().decode()
+        if response.status != 200:
+            raise RuntimeError(f'{method} {response.status}: {data[:200]}')
+        return data
+
+    def connect(self):
+        handshake = self._request('GET')
+        self.sid = json.loads(handshake[1:])['sid']
+        self._request('POST', '40')
+        self.wait_for('connect')
+
+    def emit(self, event, data):
+        self._request('POST', '42' + json.dumps([event, data]))
+
+    def wait_for(self, *events):
+        """Long-poll until one of `events` arrives; returns (event, data) - answers pings on the way"""
+        while True:
+            for packet in self._request('GET').split('\x1e'):
+                if packet == '2':
+                    self._request('POST', '3')
+                elif packet.startswith('40') and 'connect' in events:
+                    return 'connect', None
+                elif packet.startswith('42'):
+                    event, *args = json.loads(packet[2:])
+                    if event in events:
+                        return event, args[0] if args else None
+                elif packet == '1':
+                    raise RuntimeError('Server closed the session')
+
+    def close(self):
+        self._request('POST', '1')
+        self.connection.close()
+
+    def abandon(self):
+        self.connection.close()
+
+
+def timed(latencies, client, event, data, *replies):
+    start = time.perf_counter()
+    client.emit(event, data)
+    reply = client.wait_for(*replies)
+    latencies.append((time.perf_counter() - start) * 1000)
+    return reply
+
+
+def churn_room(port, latencies, player_count):
+    """One room's life: create, join, swap once each, leave"""
+    players = [PollingClient(port) for _ in range(PLAYERS_PER_ROOM)]
+    for client in players:
+        client.connect()
+    creator = players[0]
+    _, created = timed(latencies, creator, 'create_room', {'mode': 3, 'max_boosts': 3}, 'room_created')
+    room_id = created['room_id']
+    for client in players:
+        identifier = f'soak-{room_id}-{client.sid}'
+        while True:
+            event, reply = timed(latencies, client, 'join_room', {'room_id': room_id, 'player_id': identifier},
+                                 'game_started', 'join_retry', 'error')
+            if event != 'join_retry':
+                break
+            time.sleep(reply['retry_after'])
+        if event == 'error':
+            raise RuntimeError(f"join {room_id}: {reply['message']}")
+    for client in players:
+        timed(latencies, client, 'swap_card', {'room_id': room_id, 'card_index': 0}, 'card_swapped', 'swap_failed')
+    for client in players:
+        player_count[0] += 1
+        if player_count[0] % ABANDON_EVERY:
+            client.close()
+        else:
+            client.abandon()
+
+
+def drive(port, rooms_per_minute, stop, latencies, errors):
+    """Start rooms at a fixed rate; a slow server shows up as latency, not as a lower rate"""
+    interval = 60 / rooms_per_minute
+    player_count = [0]
+    next_start = time.monotonic()
+    while not stop.is_set():
+        try:
+            churn_room(port, latencies, player_count)
+        except (OSError, RuntimeError, http.client.HTTPException, ValueError) as e:
+            errors.append(repr(e))
+        next_start += interval
+        stop.wait(max(0.0, next_start - time.monotonic()))
+
+
+def sample(pid, db_path, latencies):
+    """One row of server resource readings from /proc; drains the latencies seen since the last row"""
+    status = dict(line.split(':', 1) for line in open(f'/proc/{pid}/status'))
+    pending = sorted(latencies.pop() for _ in range(len(latencies)))  # pop() is atomic; drivers keep appending
+    db_bytes = sum(os.path.getsize(path) for path in (db_path, f'{db_path}-wal', f'{db_path}-shm')
+                   if os.path.exists(path))
+    return {
+        'rss_mb': int(status['VmRSS'].split()[0]) / 1024,
+        'fds': len(os.listdir(f'/proc/{pid}/fd')),
+        'threads': int(status['Threads']),
+        'db_mb': db_bytes / 1e6,
+        'latency_ms': pending[int(len(pending) * 0.95)] if pending else 0.0,
+        'events': len(pending),
+    }
+
+
+def slope_per_hour(points):
+    """Least-squares slope of (seconds, value) points, in units per hour"""
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / var * 3600 if var else 0.0
+
+
+def start_server(db_path):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, PORT=str(port), GAME_DB_PATH=db_path, FLY_APP_NAME='soak')
+    env.pop('DATABASE_URL', None)
+    env.pop('GAME_DB_SHARDS', None)
+    log = open(os.path.join(os.path.dirname(db_path), 'server.log'), 'w')
+    server = subprocess.Popen([sys.executable, 'server.py'], cwd=ROOT, env=env, stdout=log,
+                              stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            if connection.getresponse().status == 200:
+                return server, port, log.name
+        except OSError:
+            time.sleep(0.5)
+        if server.poll() is not None:
+            break
+    server.kill()
+    sys.exit(f'Server did not start - see {log.name}')
+
+
+def parse_slopes(values):
+    slopes = dict(MAX_SLOPES)
+    for value in values:
+        name, _, limit = value.partition('=')
+        if name not in MAX_SLOPES:
+            raise argparse.ArgumentTypeError(f'Unknown metric {name} (one of {", ".join(MAX_SLOPES)})')
+        slopes[name] = float(limit)
+    return slopes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Room churn soak test with resource-growth limits')
+    parser.add_argument('--minutes', type=float, default=240)
+    parser.add_argument('--rooms-per-minute', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent churn loops (the rate is split)')
+    parser.add_argument('--sample-seconds', type=float, default=60)
+    parser.add_argument('--warmup-minutes', type=float, default=10, help='Samples before this are not fitted')
+    parser.add_argument('--max-slope', nargs='*', default=[], metavar='METRIC=PER_HOUR',
+                        help=f'Override limits: {", ".join(f"{k}={v:g}" for k, v in MAX_SLOPES.items())}')
+    args = parser.parse_args()
+    limits = parse_slopes(args.max_slope)
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'soak.db')
+    server, port, log_path = start_server(db_path)
+    print(f"Server pid {server.pid} on port {port}, game.db {db_path}, log {log_path}")
+    print(f"{args.rooms_per_minute:g} rooms/min x {PLAYERS_PER_ROOM} players for {args.minutes:g} min")
+
+    stop = threading.Event()
+    latencies, errors = [], []
+    drivers = [threading.Thread(target=drive, args=(port, args.rooms_per_minute / args.workers, stop, latencies,
+                                                     errors), daemon=True) for _ in range(args.workers)]
+    for driver in drivers:
+        driver.start()
+
+    samples = []
+    start = time.monotonic()
+    print(f"{'min':>7}{'rss MB':>9}{'fds':>6}{'threads':>9}{'db MB':>8}{'p95 ms':>9}{'events':>8}{'errors':>8}")
+    try:
+        while time.monotonic() - start < args.minutes * 60 and server.poll() is None:
+            time.sleep(args.sample_seconds)
+            row = sample(server.pid, db_path, latencies)
+            samples.append((time.monotonic() - start, row))
+            print(f"{samples[-1][0] / 60:>7.1f}{row['rss_mb']:>9.1f}{row['fds']:>6}{row['threads']:>9}"
+                  f"{row['db_mb']:>8.2f}{row['latency_ms']:>9.1f}{row['events']:>8}{len(errors):>8}", flush=True)
+    except KeyboardInterrupt:
+        print("Interrupted - fitting what was sampled")
+    finally:
+        stop.set()
+        for driver in drivers:  # Let in-flight rooms finish before the server goes away
+            driver.join(POLL_TIMEOUT)
+        crashed = server.poll() is not None
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    if crashed:
+        sys.exit(f'Server exited during the soak - see {log_path}')
+    fitted = [(t, row) for t, row in samples if t >= args.warmup_minutes * 60]
+    if len(fitted) < 3:
+        sys.exit('Too few samples after warm-up to fit a slope - run longer')
+
+    print(f"\nSlopes over {len(fitted)} samples after {args.warmup_minutes:g} min warm-up:")
+    failed = []
+    for metric, limit in limits.items():
+        slope = slope_per_hour([(t, row[metric]) for t, row in fitted])
+        verdict = 'FAIL' if slope > limit else 'ok'
+        print(f"  {metric:<12}{slope:>+10.2f}/h  (limit {limit:g}/h)  {verdict}")
+        if slope > limit:
+            failed.append(metric)
+    if errors:
+        print(f"{len(errors)} churn errors, first: {errors[0]}")
+    if failed or errors:
+        sys.exit(f"Soak failed: {', '.join(failed) or 'churn errors'}")
+
+
+if __name__ == '__main__':
+    main()
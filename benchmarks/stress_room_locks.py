@@ -0,0 +1,155 @@
+"""Stress test: concurrent swaps/boosts must never deal one card to two players
+
+Usage: python benchmarks/stress_room_locks.py [swaps_per_thread] [--unlocked]
+
+Every thread is one player sending swap_card / boost_swap as fast as it can, 8 players per room,
+for 1 to 64 threads. After each run, every hand is checked: a card index owned twice is a duplicate.
+Then every player sends ready_for_new_round at once: each room must advance exactly one round; and
+again with an admin newround racing them: no round may be dealt past without everyone ready.
+--unlocked disables the room locks, to show the races they close.
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch the real game.db
+os.environ.setdefault('GAME_DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+THREAD_COUNTS = (1, 2, 4, 8, 16, 32, 64)
+PLAYERS_PER_ROOM = 8
+
+
+def setup_rooms(server, threads):
+    """Rooms of up to PLAYERS_PER_ROOM joined test clients; returns [(room_id, client)] - one per thread"""
+    players = []
+    while len(players) < threads:
+        creator = server.socketio.test_client(server.app)
+        # One deck: 8 players x 3 cards leave 28 free cards, so concurrent swaps compete for the same ones
+        creator.emit('create_room', {'mode': 3, 'max_boosts': 10 ** 9, 'decks': 1})
+        room_id = creator.get_received()[0]['args'][0]['room_id']
+        creator.emit('join_room', {'room_id': room_id, 'player_id': f'stress_{room_id}_0'})
+        players.append((room_id, creator))
+        for i in range(1, min(PLAYERS_PER_ROOM, threads - len(players) + 1)):
+            client = server.socketio.test_client(server.app)
+            client.emit('join_room', {'room_id': room_id, 'player_id': f'stress_{room_id}_{i}'})
+            players.append((room_id, client))
+    for _, client in players:
+        client.get_received()
+    return players
+
+
+def duplicates(server, room_ids):
+    """Card indices owned by more than one hand, summed over rooms, and rooms whose used_cards disagree"""
+    duplicated = inconsistent = 0
+    for room_id in room_ids:
+        room = server.db.get_room_info(room_id)
+        owned = Counter(index for player in room.players.values() for index in player.hand.indices())
+        duplicated += sum(count - 1 for count in owned.values() if count > 1)
+        inconsistent += sorted(room.used_cards) != sorted(server.db.get_owned_cards(room_id))
+    return duplicated, inconsistent
+
+
+def run(server, threads, swaps_per_thread):
+    players = setup_rooms(server, threads)
+    start_barrier = threading.Barrier(threads)
+
+    def play(room_id, client):
+        start_barrier.wait()
+        for i in range(swaps_per_thread):
+            if i % 2:
+                client.emit('swap_card', {'room_id': room_id, 'card_index': i % 3})
+            else:
+                client.emit('boost_swap', {'room_id': room_id, 'card_index': i % 3, 'desired_value': 1 + i % 13,
+                                           'boost_level': 4})
+            if i % 50 == 0:
+                client.get_received()
+
+    workers = [threading.Thread(target=play, args=player) for player in players]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    room_ids = {room_id for room_id, _ in players}
+    return threads * swaps_per_thread / elapsed, duplicates(server, room_ids), ready_race(server, players, room_ids)
+
+
+def ready_race(server, players, room_ids):
+    """Everyone readies at once; returns the rooms that did not advance exactly one round
+
+    Then everyone readies again while an admin newround hits the same rooms: that may deal once or
+    twice, but every round left behind must have had all its players ready - a skipped round did not.
+    """
+    rounds = {room_id: server.db.get_current_round_number(room_id) for room_id in room_ids}
+    race(players, lambda room_id, client: client.emit('ready_for_new_round', {'room_id': room_id}))
+    bad = {room_id for room_id in room_ids if server.db.get_current_round_number(room_id) != rounds[room_id] + 1}
+
+    first = {room_id: server.db.get_current_round_number(room_id) for room_id in room_ids}
+    race(players, lambda room_id, client: client.emit('ready_for_new_round', {'room_id': room_id}),
+         admin=lambda: server.start_new_rounds(sorted(room_ids)))
+    for room_id in room_ids:
+        for round_number in range(first[room_id], server.db.get_current_round_number(room_id)):
+            if not all(player.ready_for_new_round
+                       for player in server.db.get_room_players(room_id, round_number).values()):
+                bad.add(room_id)
+    return len(bad)
+
+
+def race(players, act, admin=None):
+    """Run act(room_id, client) for every player (and admin()) at the same moment"""
+    barrier = threading.Barrier(len(players) + (admin is not None))
+
+    def run(target, *args):
+        barrier.wait()
+        target(*args)
+
+    workers = [threading.Thread(target=run, args=(act, *player)) for player in players]
+    if admin is not None:
+        workers.append(threading.Thread(target=run, args=(admin,)))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    for _, client in players:
+        client.get_received()
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    swaps_per_thread = int(args[0]) if args else 200
+    unlocked = '--unlocked' in sys.argv
+
+    # Switch threads often, so unprotected read-modify-write windows actually interleave
+    sys.setswitchinterval(1e-5)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import server
+        server.socketio.server.logger.disabled = True
+        server.socketio.server.eio.logger.disabled = True
+        if unlocked:
+            server.room_locks.lock = lambda room_id: contextlib.nullcontext()
+
+        results = [(threads, *run(server, threads, swaps_per_thread)) for threads in THREAD_COUNTS]
+
+    print(f"{swaps_per_thread} swaps/boosts per thread, {PLAYERS_PER_ROOM} players per room, "
+          f"room locks {'OFF' if unlocked else 'on'}")
+    print(f"{'threads':>8}{'rooms':>7}{'swaps/s':>12}{'duplicate cards':>18}{'bad used_cards':>16}"
+          f"{'bad new rounds':>16}")
+    failed = False
+    for threads, rate, (duplicated, inconsistent), bad_rounds in results:
+        rooms = -(-threads // PLAYERS_PER_ROOM)
+        print(f"{threads:>8}{rooms:>7}{rate:>12,.0f}{duplicated:>18}{inconsistent:>16}{bad_rounds:>16}")
+        failed |= bool(duplicated or inconsistent or bad_rounds)
+    if failed and not unlocked:
+        sys.exit('Duplicate card ownership or extra rounds under room locks')
+
+
+if __name__ == '__main__':
+    main()
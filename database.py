@@ -1,413 +1,807 @@
-import sqlite3
 import json
+import os
 import time
+import atexit
+import threading
+from array import array
 from datetime import datetime
-
+from rng import new_seed
+from event_log import EventLog
+from archive import EVENT_RETENTION_SECONDS, RoundArchive
+from storage import open_storage
+from game_rules import available_card_indices
+from models import Hand, PlayerRound, Room
+
+# Event types that set one field of a player's round row
+PLAYER_FIELD_EVENTS = {
+    'cards_updated': 'hand',
+    'flipped_updated': 'flipped_cards',
+    'chant_updated': 'chant_count',
+    'swaps_updated': 'total_swaps',
+    'folded': 'folded',
+    'ready': 'ready_for_new_round',
+    'completion_updated': 'completion_percentage',
+    'order_updated': 'order',
+}
+
+# Events that change only one player's own fields or session - a room's cached public view survives them
+PRIVATE_EVENTS = {'flipped_updated', 'chant_updated', 'swaps_updated', 'completion_updated', 'order_updated',
+                  'positions_swapped', 'session_updated', 'identifier_updated', 'rng_drawn'}
+
+CHECKPOINT_INTERVAL = 5.0  # Seconds between materializing rooms/room_players from memory
+ROOM_IDLE_SECONDS = 15 * 60  # Checkpointed rooms unused this long leave memory (reloaded on next use)
+
+
+def utc_timestamp():
+    """Current time in SQLite CURRENT_TIMESTAMP format"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+
+def card_list(cards):
+    """Card dicts of a Hand (or a list of card dicts) - the form events are logged in"""
+    return cards.to_dicts() if isinstance(cards, Hand) else [dict(card) for card in cards]
+
+
+def round_counters(players):
+    """Folded/ready counts and owned-card multiset of one round, kept up to date by _apply"""
+    owned = {}  # card index -> number of hands holding it
+    for player in players.values():
+        count_cards(owned, player.hand, 1)
+    return {
+        'folded': sum(1 for player in players.values() if player.folded),
+        'ready': sum(1 for player in players.values() if player.ready_for_new_round),
+        'owned': owned
+    }
+
+
+def count_cards(owned, hand, delta):
+    for index in hand.indices():  # Blank cards are not owned
+        count = owned.get(index, 0) + delta
+        if count > 0:
+            owned[index] = count
+        else:
+            owned.pop(index, None)
+
+
+def update_counters(counters, field, old_value, new_value):
+    """Adjust the current round's counters for one player field change"""
+    if field == 'folded':
+        counters['folded'] += bool(new_value) - bool(old_value)
+    elif field == 'ready_for_new_round':
+        counters['ready'] += bool(new_value) - bool(old_value)
+    elif field == 'hand':
+        count_cards(counters['owned'], old_value, -1)
+        count_cards(counters['owned'], new_value, 1)
+
+
+# Every mutation is applied to in-memory room state and appended to room_events
+# (written in batches); rooms/room_players are rewritten from memory every few
+# seconds, and startup replays events after the last checkpoint on top of them.
 class GameDatabase:
-    def __init__(self, db_path='game.db'):
-        self.db_path = db_path
-        self.init_database()
-
-    def init_database(self):
-        """Create database tables if they don't exist"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS rooms (
-                    id TEXT PRIMARY KEY,
-                    mode INTEGER NOT NULL,  -- 3 or 6 cards
-                    max_boosts INTEGER NOT NULL,
-                    decks INTEGER DEFAULT 1,  -- Number of decks (1 or 2)
-                    used_cards TEXT DEFAULT '[]',  -- JSON array of used card indices
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS room_players (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_id TEXT NOT NULL,  -- session ID
-                    room_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    identifier TEXT,  -- persistent player identifier for reconnection
-                    round_number INTEGER NOT NULL DEFAULT 1,
-                    cards TEXT DEFAULT '[]',  -- JSON array of cards
-                    chant_count INTEGER DEFAULT 0,  -- Number of successful chants (also used for boost count)
-                    total_swaps INTEGER DEFAULT 0,  -- Total number of swaps done by player in this round
-                    folded INTEGER DEFAULT 0,
-                    ready_for_new_round INTEGER DEFAULT 0,
-                    flipped_cards TEXT DEFAULT '[]',  -- JSON array
-                    completion_percentage REAL DEFAULT 0.0,
-                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (room_id) REFERENCES rooms(id),
-                    UNIQUE(player_id, room_id, round_number)
-                )
-            ''')
-
-    def create_room(self, room_id, mode, max_boosts, decks=1):
+    """Room state kept in memory, event-sourced to an append-only log and checkpointed to a storage backend"""
+
+    def __init__(self, storage='game.db', event_retention=EVENT_RETENTION_SECONDS):
+        # A storage backend, or a SQLite path / DATABASE_URL-style string for one;
+        # event_retention: seconds checkpointed events are kept for get_room_events before compaction
+        self.storage = open_storage(storage) if isinstance(storage, str) else storage
+        self.db_path = self.storage.db_path  # None unless the backend is a SQLite file
+        self._rooms = {}  # room_id -> in-memory room state (loaded lazily)
+        self._dirty = {}  # room_id -> version at last mutation, until checkpointed
+        self._deleted = {}  # room_id -> deletion number, for rooms deleted and not yet checkpointed
+        self._deletions = 0
+        self._lock = threading.RLock()
+        self._checkpoint_lock = threading.RLock()
+        self._evict_listeners = []  # callback(room_ids) run after idle rooms leave memory
+        self.archive = RoundArchive(self.storage, event_retention=event_retention)
+        self.events = EventLog(self.storage)
+        self.recover()
+        self.events.start()
+        threading.Thread(target=self._run_checkpoints, daemon=True).start()
+        self.archive.start(self._checkpoint_lock)
+        atexit.register(self.close)
+
+    # --- Event sourcing ---
+
+    def recover(self):
+        """Replay events written after the last checkpoint, then checkpoint"""
+        last_seq = self.storage.last_checkpoint()
+
+        replayed = 0
+        with self._lock:
+            for seq, room_id, event_type, payload in self.events.read_since(last_seq):
+                self._apply(room_id, event_type, payload)
+                replayed += 1
+
+        if replayed:
+            print(f"[RECOVERY] Replayed {replayed} events after checkpoint {last_seq}")
+            self.checkpoint()
+
+    def _record(self, room_id, event_type, payload, coalesce_key=None):
+        """Apply an event to memory and append it to the log (caller holds the lock)
+
+        Events with a coalesce_key carry absolute values: one still waiting in the log is replaced.
+        """
+        if self._apply(room_id, event_type, payload):
+            self.events.append(room_id, event_type, payload, coalesce_key)
+
+    def _apply(self, room_id, event_type, payload):
+        """Apply one event to the in-memory state; returns False if it changed nothing"""
+        if event_type == 'room_created':
+            if room_id in self._rooms:
+                return False
+            self._deleted.pop(room_id, None)
+            self._rooms[room_id] = Room(payload['mode'], payload['max_boosts'], payload['decks'], [],
+                                        payload['rng_seed'], payload['created_at'], counters=round_counters({}))
+            self._touch(room_id)
+            return True
+
+        room = self._get_room(room_id)
+        if room is None:
+            return False
+
+        if event_type == 'room_deleted':
+            del self._rooms[room_id]
+            self._dirty.pop(room_id, None)
+            self._deletions += 1
+            self._deleted[room_id] = self._deletions
+            return True
+
+        if event_type in PLAYER_FIELD_EVENTS:
+            player = self._get_round(room, room_id, payload['round_number']).get(payload['player_id'])
+            if player is None:
+                return False
+            field = PLAYER_FIELD_EVENTS[event_type]
+            # The log keeps card dicts; in memory a hand is an array of card codes
+            value = payload['value']
+            if field == 'hand':
+                value = Hand.from_cards(value)
+            elif field == 'order':
+                value = array('B', value)
+            if payload['round_number'] == room.current_round:
+                update_counters(room.counters, field, getattr(player, field), value)
+            setattr(player, field, value)
+            room.changed.add((payload['round_number'], payload['player_id']))
+
+        elif event_type == 'player_added':
+            players = self._get_round(room, room_id, payload['round_number'])
+            if payload['player_id'] in players:
+                return False
+            players[payload['player_id']] = PlayerRound(payload['name'], payload['identifier'], payload['joined_at'])
+            room.changed.add((payload['round_number'], payload['player_id']))
+            if payload['round_number'] > room.current_round:
+                room.current_round = payload['round_number']
+                room.counters = round_counters(players)
+
+        elif event_type == 'used_cards_updated':
+            room.used_cards = list(payload['value'])
+
+        elif event_type == 'used_cards_changed':
+            # A swap or a late deal: only the cards that moved are logged, the list is updated in place
+            used_cards = room.used_cards
+            for index in payload['removed']:
+                if index in used_cards:
+                    used_cards.remove(index)
+            used_cards.extend(index for index in payload['added'] if index not in used_cards)
+
+        elif event_type == 'rng_seed_set':
+            room.rng_seed = payload['value']
+
+        elif event_type == 'rng_drawn':
+            rng_draws = (payload['round_number'], payload['draws'])
+            if room.rng_draws == rng_draws:
+                return False
+            room.rng_draws = rng_draws
+
+        elif event_type == 'session_updated':
+            old_player_id, new_player_id = payload['old_player_id'], payload['new_player_id']
+            for round_number, players in room.rounds.items():
+                if old_player_id in players and new_player_id not in players:
+                    room.rounds[round_number] = {
+                        (new_player_id if pid == old_player_id else pid): player for pid, player in players.items()
+                    }
+                    if (round_number, old_player_id) in room.changed:
+                        room.changed.discard((round_number, old_player_id))
+                        room.changed.add((round_number, new_player_id))
+            room.pending_sql.append(('session', old_player_id, new_player_id))
+
+        elif event_type == 'identifier_updated':
+            for round_number, players in room.rounds.items():
+                if payload['player_id'] in players:
+                    players[payload['player_id']].identifier = payload['identifier']
+                    room.changed.add((round_number, payload['player_id']))
+            room.pending_sql.append(('identifier', payload['player_id'], payload['identifier']))
+
+        elif event_type == 'round_started':
+            next_round = payload['round_number']
+            if next_round <= room.current_round:
+                return False
+            current_players = self._get_round(room, room_id, room.current_round)
+            room.used_cards = []
+            room.rounds[next_round] = {
+                pid: PlayerRound(player.name, player.identifier, payload['joined_at'])
+                for pid, player in current_players.items()
+            }
+            room.current_round = next_round
+            room.counters = round_counters(room.rounds[next_round])
+            room.changed.update((next_round, pid) for pid in current_players)
+
+        elif event_type == 'cards_revealed':
+            # System reveal: every player of the round folds with all cards flipped
+            counted = payload['round_number'] == room.current_round
+            players = self._get_round(room, room_id, payload['round_number'])
+            for player in players.values():
+                if counted:
+                    update_counters(room.counters, 'folded', player.folded, True)
+                player.folded = True
+                player.flipped_cards = list(range(len(player.hand)))
+            room.changed.update((payload['round_number'], pid) for pid in players)
+
+        elif event_type == 'round_ready':
+            counted = payload['round_number'] == room.current_round
+            players = self._get_round(room, room_id, payload['round_number'])
+            for player in players.values():
+                if counted:
+                    update_counters(room.counters, 'ready_for_new_round', player.ready_for_new_round, True)
+                player.ready_for_new_round = True
+            room.changed.update((payload['round_number'], pid) for pid in players)
+
+        elif event_type == 'positions_swapped':
+            # Logged before display order became order_updated: same visible result, as a permutation
+            from_index, to_index = payload['from_index'], payload['to_index']
+            players = self._get_round(room, room_id, room.current_round)
+            # Events logged before positions became per-player carry no player_id
+            if payload.get('player_id') is not None:
+                players = {payload['player_id']: players[payload['player_id']]} if payload['player_id'] in players else {}
+            for pid, player in players.items():
+                if 0 <= from_index < len(player.hand) and 0 <= to_index < len(player.hand):
+                    player.move(from_index, to_index)
+                    room.changed.add((room.current_round, pid))
+
+        else:
+            raise ValueError(f'Unknown event type: {event_type}')
+
+        self._touch(room_id, event_type in PRIVATE_EVENTS)
+        return True
+
+    def _touch(self, room_id, private=False):
+        room = self._rooms[room_id]
+        room.version += 1
+        room.active_at = time.time()
+        self._dirty[room_id] = room.version
+        if private and room.public_view is not None and room.public_view[0] == room.version - 1:
+            room.public_view = (room.version, room.public_view[1])
+
+    def checkpoint(self):
+        """Write dirty rooms from memory to rooms/room_players and advance the checkpoint"""
+        with self._checkpoint_lock:
+            # Everything up to the checkpoint must be in the log first
+            self.events.flush()
+
+            with self._lock:
+                last_seq = self.events.last_seq
+                deleted = dict(self._deleted)
+                snapshot = []
+                for room_id, version in self._dirty.items():
+                    room = self._rooms[room_id]
+                    # Only the player rows changed since the last checkpoint - one drag is not a room rewrite
+                    # (in join order: new rows get ids in that order, the tiebreak when a round is loaded)
+                    rounds = {}
+                    for round_number, players in room.rounds.items():
+                        for pid, player in players.items():
+                            if (round_number, pid) in room.changed:
+                                rounds.setdefault(round_number, []).append((pid, player.copy()))
+                    snapshot.append((room_id, version, (room.mode, room.max_boosts, room.decks, list(room.used_cards),
+                                                        room.rng_seed, room.created_at, room.active_at,
+                                                        room.rng_draws or (None, 0)),
+                                     list(room.pending_sql), rounds))
+
+            rows = []
+            for room_id, _, settings, pending_sql, rounds in snapshot:
+                mode, max_boosts, decks, used_cards, rng_seed, created_at, active_at, (rng_round, rng_draws) = settings
+                player_rows = [
+                    (pid, room_id, player.name, player.identifier, round_number, json.dumps(player.hand.to_dicts()),
+                     player.chant_count, player.total_swaps, int(player.folded), int(player.ready_for_new_round),
+                     json.dumps(player.flipped_cards), player.completion_percentage, player.joined_at,
+                     json.dumps(list(player.order)) if player.order else None)
+                    for round_number, players in rounds.items() for pid, player in players
+                ]
+                rows.append((room_id, (mode, max_boosts, decks, json.dumps(used_cards), rng_seed, created_at, active_at,
+                                       rng_round, rng_draws),
+                             pending_sql, player_rows))
+            self.storage.write_checkpoint(list(deleted), rows, last_seq)
+
+            with self._lock:
+                # Deletions are forgotten only once written (and if not deleted again meanwhile) -
+                # a failed write keeps them for the next checkpoint, like dirty rooms
+                for room_id, deletion in deleted.items():
+                    if self._deleted.get(room_id) == deletion:
+                        del self._deleted[room_id]
+                for room_id, version, _, pending_sql, _ in snapshot:
+                    room = self._rooms.get(room_id)
+                    if room is None:
+                        continue
+                    del room.pending_sql[:len(pending_sql)]
+                    if self._dirty.get(room_id) != version:
+                        # Changed since the snapshot (maybe new rounds): rounds are dropped only once written
+                        continue
+                    del self._dirty[room_id]
+                    room.changed.clear()
+                    # Past rounds are safely in room_players now - only the current one stays in memory
+                    for round_number in list(room.rounds):
+                        if round_number != room.current_round:
+                            del room.rounds[round_number]
+
+    def on_evict(self, callback):
+        """Run callback(room_ids) whenever idle rooms are evicted, to drop per-room state kept elsewhere"""
+        self._evict_listeners.append(callback)
+
+    def evict_idle_rooms(self, idle_after=ROOM_IDLE_SECONDS):
+        """Drop checkpointed rooms unused for idle_after seconds (and their cached views) from memory
+
+        Only clean rooms go - everything they hold is in storage, so the next use loads them back.
+        """
+        cutoff = time.monotonic() - idle_after
+        with self._lock:
+            evicted = [room_id for room_id, room in self._rooms.items()
+                       if room.last_used < cutoff and room_id not in self._dirty and not room.pending_sql]
+            for room_id in evicted:
+                del self._rooms[room_id]
+        if evicted:
+            for callback in self._evict_listeners:
+                callback(evicted)
+        return evicted
+
+    def export_state(self):
+        """Checkpoint, then copy the in-memory rooms for a warm-restart snapshot (None if still changing)"""
+        with self._checkpoint_lock:
+            for _ in range(3):
+                self.checkpoint()
+                with self._lock:
+                    if not self._dirty and not self._deleted:
+                        return {'seq': self.events.last_seq,
+                                'rooms': {room_id: room.to_state() for room_id, room in self._rooms.items()}}
+        return None
+
+    def import_state(self, state):
+        """Load rooms from a warm-restart snapshot; refused if events were written after it"""
+        with self._lock:
+            if state.get('seq') != self.events.last_seq:
+                return False
+            for room_id, room_state in state['rooms'].items():
+                if room_id not in self._deleted and room_id not in self._rooms:
+                    room = Room.from_state(room_state)
+                    if room.counters is None:
+                        room.counters = round_counters(room.players)
+                    self._rooms[room_id] = room
+            return True
+
+    def close(self):
+        """Flush the log and checkpoint - called on shutdown"""
+        try:
+            self.checkpoint()
+        except Exception as e:
+            print(f"[EVENTS] Final checkpoint failed: {e}")
+
+    def _run_checkpoints(self):
+        while True:
+            time.sleep(CHECKPOINT_INTERVAL)
+            try:
+                self.checkpoint()
+                evicted = self.evict_idle_rooms()
+                if evicted:
+                    print(f"[EVENTS] Evicted {len(evicted)} idle rooms from memory")
+            except Exception as e:
+                print(f"[EVENTS] Checkpoint failed: {e}")
+
+    def get_room_events(self, room_id, limit=1000):
+        """Audit trail of a room, oldest event first - events past the retention window are compacted away"""
+        return self.events.read_room(room_id, limit)
+
+    # --- Loading from the materialized tables ---
+
+    def _get_room(self, room_id):
+        """In-memory room state, loaded from the tables on first use (caller holds the lock)"""
+        room = self._rooms.get(room_id)
+        if room is None and room_id not in self._deleted:
+            room = self._load_room(room_id)
+            if room is not None:
+                self._rooms[room_id] = room
+        if room is not None:
+            room.last_used = time.monotonic()
+        return room
+
+    def _load_room(self, room_id):
+        row = self.storage.load_room(room_id)
+        if not row:
+            return None
+
+        mode, max_boosts, decks, used_cards_json, rng_seed, created_at, rng_round, rng_draws, current_round = row
+        players = self._load_round(room_id, current_round)
+        return Room(mode, max_boosts, decks, json.loads(used_cards_json) if used_cards_json else [], rng_seed,
+                    created_at, current_round, {current_round: players}, round_counters(players),
+                    rng_draws=(rng_round, rng_draws) if rng_round is not None else None)
+
+    def _load_round(self, room_id, round_number):
+        # Finished rounds come back from the archive
+        players = {}
+        for row in self.storage.load_round(room_id, round_number):
+            player_id, name, identifier, cards_json, chant_count, total_swaps, folded, ready_for_new_round, flipped_cards_json, completion_percentage, joined_at, order_json = row
+            players[player_id] = PlayerRound(
+                name, identifier, joined_at,
+                Hand.from_cards(json.loads(cards_json) if cards_json else []),
+                chant_count or 0,
+                total_swaps or 0,
+                bool(folded or 0),
+                bool(ready_for_new_round or 0),
+                json.loads(flipped_cards_json) if flipped_cards_json else [],
+                completion_percentage or 0.0,
+                json.loads(order_json) if order_json else ()
+            )
+        return players
+
+    def _get_round(self, room, room_id, round_number):
+        """Players of one round, pulling an already-checkpointed round back into memory if needed"""
+        players = room.rounds.get(round_number)
+        if players is None:
+            players = self._load_round(room_id, round_number)
+            room.rounds[round_number] = players
+        return players
+
+    def _find_player_room(self, player_id):
+        """Legacy support - the room a player joined most recently"""
+        with self._lock:
+            for room_id, room in self._rooms.items():
+                if player_id in room.rounds.get(room.current_round, {}):
+                    return room_id
+        return self.storage.find_player_room(player_id)
+
+    # --- Public API ---
+
+    def create_room(self, room_id, mode, max_boosts, decks=1, rng_seed=None):
         """Create a new room with settings"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                INSERT INTO rooms (id, mode, max_boosts, decks)
-                VALUES (?, ?, ?, ?)
-            ''', (room_id, mode, max_boosts, decks))
+        if rng_seed is None:
+            rng_seed = new_seed()
+        with self._lock:
+            self._record(room_id, 'room_created', {
+                'mode': mode,
+                'max_boosts': max_boosts,
+                'decks': decks,
+                'rng_seed': rng_seed,
+                'created_at': utc_timestamp()
+            })
+
+    def create_rooms(self, room_ids, mode, max_boosts, decks=1):
+        """Create many rooms with the same settings; their events are written in one transaction"""
+        created_at = utc_timestamp()
+        with self._lock:
+            for room_id in room_ids:
+                self._record(room_id, 'room_created', {
+                    'mode': mode,
+                    'max_boosts': max_boosts,
+                    'decks': decks,
+                    'rng_seed': new_seed(),
+                    'created_at': created_at
+                })
+        # Durable before the caller hands out join URLs
+        self.events.flush()
+
+    def get_room_seed(self, room_id):
+        """Get the room's RNG seed, assigning one to rooms created before seeds existed"""
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return new_seed()
+            if room.rng_seed is None:
+                self._record(room_id, 'rng_seed_set', {'value': new_seed()})
+            return room.rng_seed
+
+    def get_rng_draws(self, room_id, round_number):
+        """How many floats of the round's random stream have been drawn (0 for a stream not used yet)"""
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None or room.rng_draws is None or room.rng_draws[0] != round_number:
+                return 0
+            return room.rng_draws[1]
+
+    def update_rng_draws(self, room_id, round_number, draws):
+        """Record how far the round's random stream has been read, so a cold start resumes it there
+
+        Only the latest count matters: one still waiting in the log is replaced.
+        """
+        with self._lock:
+            self._record(room_id, 'rng_drawn', {'round_number': round_number, 'draws': draws},
+                         coalesce_key=(room_id, 'rng_drawn'))
+
+    def get_all_room_ids(self):
+        """Get the IDs of every room in the database"""
+        room_ids = self.storage.room_ids()
+        with self._lock:
+            return list((room_ids | set(self._rooms)) - self._deleted.keys())
+
+    def measure_rooms(self, size_of, sample):
+        """(rooms in memory, rooms measured, their total size_of) - up to `sample` rooms, walked under the lock"""
+        with self._lock:
+            measured = list(self._rooms.values())[:sample]
+            return len(self._rooms), len(measured), sum(size_of(room) for room in measured)
+
+    def room_exists(self, room_id):
+        """Check whether a room exists without loading its players"""
+        with self._lock:
+            if room_id in self._rooms:
+                return True
+            if room_id in self._deleted:
+                return False
+        return self.storage.room_exists(room_id)
 
     def add_player(self, player_id, room_id, name, identifier=None):
-        """Add a player to a room"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Create initial room player entry for round 1
-            conn.execute('''
-                INSERT OR IGNORE INTO room_players (player_id, room_id, name, identifier, round_number)
-                VALUES (?, ?, ?, ?, 1)
-            ''', (player_id, room_id, name, identifier))
+        """Add a player to the current round of a room"""
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return
+            self._record(room_id, 'player_added', {
+                'player_id': player_id,
+                'name': name,
+                'identifier': identifier,
+                'round_number': room.current_round,
+                'joined_at': utc_timestamp()
+            })
 
     def get_room_info(self, room_id):
         """Get room information"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT mode, max_boosts, decks, used_cards
-                FROM rooms
-                WHERE id = ?
-            ''', (room_id,))
-            row = cursor.fetchone()
-
-            if row:
-                mode, max_boosts, decks, used_cards_json = row
-                current_round = self.get_current_round_number(room_id)
-                players = self.get_room_players(room_id, current_round)
-                used_cards = json.loads(used_cards_json) if used_cards_json else []
-
-                return {
-                    'mode': mode,
-                    'max_boosts': max_boosts,
-                    'decks': decks,
-                    'current_round': current_round,
-                    'used_cards': used_cards,
-                    'players': players
-                }
-            return None
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return None
+
+            self._get_round(room, room_id, room.current_round)
+            return room.view()
+
+    def get_room_player(self, room_id, player_id, used_cards=True):
+        """Room settings plus one player's current-round state (room.players.get(player_id)), without copying the others
+
+        used_cards=False leaves the room's used cards out of the copy (None) - see get_available_cards.
+        """
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return None
+
+            self._get_round(room, room_id, room.current_round)
+            return room.view(player_id, used_cards)
+
+    def get_available_cards(self, room_id, total_cards):
+        """Card indices below total_cards that are not used in the room, in index order"""
+        with self._lock:
+            room = self._get_room(room_id)
+            return available_card_indices(total_cards, room.used_cards if room else ())
+
+    def get_player_identifiers(self, room_id):
+        """{player_id: identifier} of the current round (None if the room does not exist), without copying players"""
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return None
+            players = self._get_round(room, room_id, room.current_round)
+            return {pid: player.identifier for pid, player in players.items()}
+
+    def get_player_view(self, room_id, player_id, build_public):
+        """(public payload, copy of player_id's current-round state or None) - None if the room does not exist
+
+        The public part is build_public(room), cached on the room and reused until its version changes (events
+        in PRIVATE_EVENTS carry it forward), so a rejoin costs one player copy however busy the room is.
+        build_public may only read the room's settings, counters and player count; the payload is shared.
+        """
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return None
+            players = self._get_round(room, room_id, room.current_round)
+            if room.public_view is None or room.public_view[0] != room.version:
+                room.public_view = (room.version, build_public(room))
+            player = players.get(player_id)
+            return room.public_view[1], player.copy() if player else None
+
+    def get_room_stats(self, room_id):
+        """Player, folded and ready counts of the current round, from the maintained counters"""
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return None
+            counters = room.counters
+            return {
+                'total_players': len(self._get_round(room, room_id, room.current_round)),
+                'folded_count': counters['folded'],
+                'ready_count': counters['ready']
+            }
+
+    def get_owned_cards(self, room_id):
+        """Card indices held by players in the current round"""
+        with self._lock:
+            room = self._get_room(room_id)
+            return list(room.counters['owned']) if room else []
 
     def get_room_players(self, room_id, round_number=1):
         """Get all players in a room for a specific round"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT player_id, name, identifier, cards, chant_count, total_swaps, folded,
-                       ready_for_new_round, flipped_cards, completion_percentage
-                FROM room_players
-                WHERE room_id = ? AND round_number = ?
-                ORDER BY joined_at ASC
-            ''', (room_id, round_number))
-            rows = cursor.fetchall()
-
-            players = {}
-            for row in rows:
-                player_id, name, identifier, cards_json, chant_count, total_swaps, folded, ready_for_new_round, flipped_cards_json, completion_percentage = row
-                cards = json.loads(cards_json) if cards_json else []
-                flipped_cards = json.loads(flipped_cards_json) if flipped_cards_json else []
-                players[player_id] = {
-                    'name': name,
-                    'identifier': identifier,
-                    'cards': cards,
-                    'chant_count': chant_count or 0,
-                    'total_swaps': total_swaps or 0,
-                    'folded': bool(folded or 0),
-                    'ready_for_new_round': bool(ready_for_new_round or 0),
-                    'flipped_cards': flipped_cards,
-                    'completion_percentage': completion_percentage or 0.0
-                }
-            return players
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return {}
+            players = room.rounds.get(round_number)
+            if players is None:
+                players = self._load_round(room_id, round_number)
+            return {pid: player.copy() for pid, player in players.items()}
+
+    def _update_player_field(self, event_type, player_id, value, room_id, round_number):
+        if not room_id:
+            # Legacy support - find room_id from room_players
+            room_id = self._find_player_room(player_id)
+            if not room_id:
+                return
+        with self._lock:
+            self._record(room_id, event_type, {'player_id': player_id, 'round_number': round_number, 'value': value})
 
     def update_player_cards(self, player_id, cards, room_id=None, round_number=1):
-        """Update player's cards for a specific round"""
-        with sqlite3.connect(self.db_path) as conn:
-            if room_id:
-                conn.execute('''
-                    UPDATE room_players
-                    SET cards = ?
-                    WHERE player_id = ? AND room_id = ? AND round_number = ?
-                ''', (json.dumps(cards), player_id, room_id, round_number))
-            else:
-                # Legacy support - find room_id from room_players table
-                cursor = conn.cursor()
-                cursor.execute('SELECT room_id FROM room_players WHERE player_id = ? ORDER BY joined_at DESC LIMIT 1', (player_id,))
-                row = cursor.fetchone()
-                if row:
-                    room_id = row[0]
-                    conn.execute('''
-                        UPDATE room_players
-                        SET cards = ?
-                        WHERE player_id = ? AND room_id = ? AND round_number = ?
-                    ''', (json.dumps(cards), player_id, room_id, round_number))
-
+        """Update player's cards (a Hand or card dicts) for a specific round"""
+        self._update_player_field('cards_updated', player_id, card_list(cards), room_id, round_number)
 
     def update_room_used_cards(self, room_id, used_cards):
         """Update used cards for a room (cards that are owned by players)"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                UPDATE rooms
-                SET used_cards = ?
-                WHERE id = ?
-            ''', (json.dumps(used_cards), room_id))
+        with self._lock:
+            self._record(room_id, 'used_cards_updated', {'value': list(used_cards)})
+
+    def change_room_used_cards(self, room_id, added=(), removed=()):
+        """Mark a few cards used / no longer used - logs just those indices, not the room's whole list"""
+        with self._lock:
+            self._record(room_id, 'used_cards_changed', {'added': list(added), 'removed': list(removed)})
 
     def update_player_flipped_cards(self, player_id, flipped_cards, room_id=None, round_number=1):
         """Update player's flipped cards for a specific round"""
-        with sqlite3.connect(self.db_path) as conn:
-            if room_id:
-                conn.execute('''
-                    UPDATE room_players
-                    SET flipped_cards = ?
-                    WHERE player_id = ? AND room_id = ? AND round_number = ?
-                ''', (json.dumps(flipped_cards), player_id, room_id, round_number))
-            else:
-                # Legacy support
-                cursor = conn.cursor()
-                cursor.execute('SELECT room_id FROM players WHERE id = ?', (player_id,))
-                row = cursor.fetchone()
-                if row:
-                    room_id = row[0]
-                    conn.execute('''
-                        UPDATE room_players
-                        SET flipped_cards = ?
-                        WHERE player_id = ? AND room_id = ? AND round_number = ?
-                    ''', (json.dumps(flipped_cards), player_id, room_id, round_number))
-
+        self._update_player_field('flipped_updated', player_id, list(flipped_cards), room_id, round_number)
 
     def update_player_chant_count(self, player_id, chant_count, room_id=None, round_number=1):
         """Update player's chant count for a specific round"""
-        with sqlite3.connect(self.db_path) as conn:
-            if room_id:
-                conn.execute('''
-                    UPDATE room_players
-                    SET chant_count = ?
-                    WHERE player_id = ? AND room_id = ? AND round_number = ?
-                ''', (chant_count, player_id, room_id, round_number))
-            else:
-                # Legacy support
-                cursor = conn.cursor()
-                cursor.execute('SELECT room_id FROM room_players WHERE player_id = ? ORDER BY joined_at DESC LIMIT 1', (player_id,))
-                row = cursor.fetchone()
-                if row:
-                    room_id = row[0]
-                    conn.execute('''
-                        UPDATE room_players
-                        SET chant_count = ?
-                        WHERE player_id = ? AND room_id = ? AND round_number = ?
-                    ''', (chant_count, player_id, room_id, round_number))
+        self._update_player_field('chant_updated', player_id, chant_count, room_id, round_number)
 
     def update_player_total_swaps(self, player_id, total_swaps, room_id=None, round_number=1):
         """Update player's total swaps count for a specific round"""
-        with sqlite3.connect(self.db_path) as conn:
-            if room_id:
-                conn.execute('''
-                    UPDATE room_players
-                    SET total_swaps = ?
-                    WHERE player_id = ? AND room_id = ? AND round_number = ?
-                ''', (total_swaps, player_id, room_id, round_number))
-            else:
-                # Legacy support
-                cursor = conn.cursor()
-                cursor.execute('SELECT room_id FROM room_players WHERE player_id = ? ORDER BY joined_at DESC LIMIT 1', (player_id,))
-                row = cursor.fetchone()
-                if row:
-                    room_id = row[0]
-                    conn.execute('''
-                        UPDATE room_players
-                        SET total_swaps = ?
-                        WHERE player_id = ? AND room_id = ? AND round_number = ?
-                    ''', (total_swaps, player_id, room_id, round_number))
+        self._update_player_field('swaps_updated', player_id, total_swaps, room_id, round_number)
 
     def update_player_session(self, old_player_id, new_player_id, room_id):
         """Update player session ID when reconnecting"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                UPDATE room_players
-                SET player_id = ?
-                WHERE player_id = ? AND room_id = ?
-            ''', (new_player_id, old_player_id, room_id))
-            conn.commit()
+        if old_player_id == new_player_id:  # Rejoin from the same socket
+            return
+        with self._lock:
+            self._record(room_id, 'session_updated', {'old_player_id': old_player_id, 'new_player_id': new_player_id})
 
     def update_player_identifier(self, player_id, new_identifier, room_id):
         """Update player identifier"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                UPDATE room_players
-                SET identifier = ?
-                WHERE player_id = ? AND room_id = ?
-            ''', (new_identifier, player_id, room_id))
-            conn.commit()
+        with self._lock:
+            self._record(room_id, 'identifier_updated', {'player_id': player_id, 'identifier': new_identifier})
 
     def fold_player(self, player_id, folded=True, room_id=None, round_number=1):
         """Mark player as folded for a specific round"""
-        with sqlite3.connect(self.db_path) as conn:
-            if room_id:
-                conn.execute('''
-                    UPDATE room_players
-                    SET folded = ?
-                    WHERE player_id = ? AND room_id = ? AND round_number = ?
-                ''', (folded, player_id, room_id, round_number))
-            else:
-                # Legacy support
-                cursor = conn.cursor()
-                cursor.execute('SELECT room_id FROM room_players WHERE player_id = ? ORDER BY joined_at DESC LIMIT 1', (player_id,))
-                row = cursor.fetchone()
-                if row:
-                    room_id = row[0]
-                    conn.execute('''
-                        UPDATE room_players
-                        SET folded = ?
-                        WHERE player_id = ? AND room_id = ? AND round_number = ?
-                    ''', (folded, player_id, room_id, round_number))
+        self._update_player_field('folded', player_id, bool(folded), room_id, round_number)
 
     def ready_player_for_new_round(self, player_id, ready=True, room_id=None, round_number=1):
         """Mark player as ready for new round"""
-        with sqlite3.connect(self.db_path) as conn:
-            if room_id:
-                conn.execute('''
-                    UPDATE room_players
-                    SET ready_for_new_round = ?
-                    WHERE player_id = ? AND room_id = ? AND round_number = ?
-                ''', (ready, player_id, room_id, round_number))
-            else:
-                # Legacy support
-                cursor = conn.cursor()
-                cursor.execute('SELECT room_id FROM room_players WHERE player_id = ? ORDER BY joined_at DESC LIMIT 1', (player_id,))
-                row = cursor.fetchone()
-                if row:
-                    room_id = row[0]
-                    conn.execute('''
-                        UPDATE room_players
-                        SET ready_for_new_round = ?
-                        WHERE player_id = ? AND room_id = ? AND round_number = ?
-                    ''', (ready, player_id, room_id, round_number))
+        self._update_player_field('ready', player_id, bool(ready), room_id, round_number)
 
     def start_new_round(self, room_id):
         """Start a new round for the room - create new round entries"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Reset room data
-            conn.execute('''
-                UPDATE rooms
-                SET used_cards = '[]'
-                WHERE id = ?
-            ''', (room_id,))
-
-            # Get current max round number
-            cursor = conn.cursor()
-            cursor.execute('SELECT MAX(round_number) FROM room_players WHERE room_id = ?', (room_id,))
-            row = cursor.fetchone()
-            current_round = row[0] if row[0] else 0
-            next_round = current_round + 1
-
-            # Create new round entries for all current players
-            cursor.execute('SELECT player_id, name, identifier FROM room_players WHERE room_id = ? AND round_number = ? GROUP BY player_id', (room_id, current_round))
-            current_players = cursor.fetchall()
-
-            for player_id, name, identifier in current_players:
-                conn.execute('''
-                    INSERT INTO room_players (player_id, room_id, name, identifier, round_number, cards, chant_count, total_swaps, folded, ready_for_new_round, flipped_cards, completion_percentage)
-                    VALUES (?, ?, ?, ?, ?, '[]', 0, 0, 0, 0, '[]', 0.0)
-                ''', (player_id, room_id, name, identifier, next_round))
+        with self._lock:
+            room = self._get_room(room_id)
+            if room is None:
+                return
+            self._record(room_id, 'round_started', {
+                'round_number': room.current_round + 1,
+                'joined_at': utc_timestamp()
+            })
+
+    def deal_hands(self, room_id, round_number, hands, used_cards):
+        """Set every dealt hand of a round and the room's used cards under one lock"""
+        with self._lock:
+            for player_id, hand in hands.items():
+                self._record(room_id, 'cards_updated', {'player_id': player_id, 'round_number': round_number,
+                                                        'value': card_list(hand)})
+            self._record(room_id, 'used_cards_updated', {'value': list(used_cards)})
+
+    def reveal_rooms(self, room_ids):
+        """Fold every player and flip every card in each room's current round - one event per room"""
+        revealed = {}  # room_id -> {player_id: cards}
+        with self._lock:
+            for room_id in room_ids:
+                room = self._get_room(room_id)
+                if room is None:
+                    continue
+                round_number = room.current_round
+                self._record(room_id, 'cards_revealed', {'round_number': round_number})
+                revealed[room_id] = {pid: player.cards()
+                                     for pid, player in self._get_round(room, room_id, round_number).items()}
+        return revealed
+
+    def ready_rooms(self, room_ids):
+        """Mark every player of each room ready for a new round - one event per room
+
+        Returns {room_id: the round readied}, so a caller can tell whether the round moved on since.
+        """
+        ready = {}
+        with self._lock:
+            for room_id in room_ids:
+                room = self._get_room(room_id)
+                if room is None:
+                    continue
+                self._record(room_id, 'round_ready', {'round_number': room.current_round})
+                ready[room_id] = room.current_round
+        return ready
 
     def update_player_completion(self, player_id, percentage, room_id=None, round_number=1):
         """Update player's completion percentage for a specific round"""
-        with sqlite3.connect(self.db_path) as conn:
-            if room_id:
-                conn.execute('''
-                    UPDATE room_players
-                    SET completion_percentage = ?
-                    WHERE player_id = ? AND room_id = ? AND round_number = ?
-                ''', (percentage, player_id, room_id, round_number))
-            else:
-                # Legacy support
-                cursor = conn.cursor()
-                cursor.execute('SELECT room_id FROM players WHERE id = ?', (player_id,))
-                row = cursor.fetchone()
-                if row:
-                    room_id = row[0]
-                    conn.execute('''
-                        UPDATE room_players
-                        SET completion_percentage = ?
-                        WHERE player_id = ? AND room_id = ? AND round_number = ?
-                    ''', (percentage, player_id, room_id, round_number))
+        self._update_player_field('completion_updated', player_id, percentage, room_id, round_number)
+
+    def update_player_completions(self, rows):
+        """Batch-update completion percentages for the current round: rows of (percentage, player_id, room_id)"""
+        with self._lock:
+            for percentage, player_id, room_id in rows:
+                room = self._get_room(room_id)
+                if room is not None:
+                    self._record(room_id, 'completion_updated', {
+                        'player_id': player_id,
+                        'round_number': room.current_round,
+                        'value': percentage
+                    })
 
     def get_player_round_info(self, player_id, room_id, round_number=1):
         """Get specific player round information"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT cards, chant_count, total_swaps, folded, ready_for_new_round, flipped_cards, completion_percentage
-                FROM room_players
-                WHERE player_id = ? AND room_id = ? AND round_number = ?
-            ''', (player_id, room_id, round_number))
-            row = cursor.fetchone()
-
-            if row:
-                cards_json, chant_count, total_swaps, folded, ready_for_new_round, flipped_cards_json, completion_percentage = row
-                cards = json.loads(cards_json) if cards_json else []
-                flipped_cards = json.loads(flipped_cards_json) if flipped_cards_json else []
-
-                return {
-                    'cards': cards,
-                    'chant_count': chant_count,
-                    'total_swaps': total_swaps,
-                    'folded': bool(folded),
-                    'ready_for_new_round': bool(ready_for_new_round),
-                    'flipped_cards': flipped_cards,
-                    'completion_percentage': completion_percentage
-                }
-            return None
+        return self.get_room_players(room_id, round_number).get(player_id)
 
     def get_current_round_number(self, room_id):
         """Get the current round number for a room"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT MAX(round_number) FROM room_players WHERE room_id = ?', (room_id,))
-            row = cursor.fetchone()
-            return row[0] if row[0] else 1
-
-    def cleanup_old_rooms(self, hours=24):
-        """Delete rooms older than specified hours"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                DELETE FROM rooms
-                WHERE created_at < datetime('now', '-' || ? || ' hours')
-            ''', (hours,))
-
-    def swap_card_positions(self, room_id, from_index, to_index):
-        """Swap card positions for all players in a room"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Get current cards for the room
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT player_id, cards, flipped_cards
-                FROM room_players
-                WHERE room_id = ? AND round_number = (
-                    SELECT MAX(round_number) FROM room_players WHERE room_id = ?
-                )
-            ''', (room_id, room_id))
-
-            players = cursor.fetchall()
-
-            for player_id, cards_json, flipped_cards_json in players:
-                cards = json.loads(cards_json) if cards_json else []
-                flipped_cards = json.loads(flipped_cards_json) if flipped_cards_json else []
-
-                # Swap card positions
-                if 0 <= from_index < len(cards) and 0 <= to_index < len(cards):
-                    cards[from_index], cards[to_index] = cards[to_index], cards[from_index]
-
-                    # Update flipped cards indices
-                    if from_index in flipped_cards:
-                        flipped_cards[flipped_cards.index(from_index)] = to_index
-                    if to_index in flipped_cards:
-                        flipped_cards[flipped_cards.index(to_index)] = from_index
-
-                    # Update database
-                    conn.execute('''
-                        UPDATE room_players
-                        SET cards = ?, flipped_cards = ?
-                        WHERE player_id = ? AND room_id = ?
-                    ''', (json.dumps(cards), json.dumps(flipped_cards), player_id, room_id))
-
-# Global database instance
-db = GameDatabase()
+        with self._lock:
+            room = self._get_room(room_id)
+            return room.current_round if room else 1
+
+    def cleanup_inactive_rooms(self, days):
+        """Delete rooms with no event and no use for `days` days, returning the deleted room IDs
+
+        Activity is the room's last change (creation counts), stored with the room at each checkpoint, so a
+        long-running room is kept however old it is. Rooms still in memory must also be unused for that long.
+        """
+        self.checkpoint()  # Rooms not written yet and events still queued must be in storage
+        room_ids = self.storage.rooms_inactive_since(time.time() - days * 86400)
+        unused_since = time.monotonic() - days * 86400
+
+        with self._lock:
+            room_ids = {room_id for room_id in room_ids if room_id not in self._deleted and
+                        (room_id not in self._rooms or self._rooms[room_id].last_used < unused_since)}
+            for room_id in room_ids:
+                self._record(room_id, 'room_deleted', {})
+        self.checkpoint()
+        return list(room_ids)
+
+    def swap_card_positions(self, room_id, from_index, to_index, player_id=None):
+        """Swap two display positions of a player's cards (every player in the room if player_id is None)
+
+        Only the player's display permutation changes. The logged order_updated carries the whole
+        permutation, so a burst of drags still waiting in the log is coalesced into one event.
+        """
+        with self._lock:
+            if player_id is None:
+                self._record(room_id, 'positions_swapped', {'from_index': from_index, 'to_index': to_index})
+                return
+            room = self._get_room(room_id)
+            player = room and room.players.get(player_id)
+            if player is None or not (0 <= from_index < len(player.hand) and 0 <= to_index < len(player.hand)):
+                return
+            moved = player.copy()
+            moved.move(from_index, to_index)
+            self._record(room_id, 'order_updated',
+                         {'player_id': player_id, 'round_number': room.current_round, 'value': list(moved.order)},
+                         coalesce_key=(room_id, 'order_updated', player_id, room.current_round))
+
+# Global database instance - DATABASE_URL (postgresql://..., memory://) overrides the SQLite file,
+# GAME_DB_SHARDS > 1 splits the SQLite file into that many shards by room,
+# EVENT_RETENTION_HOURS is how long checkpointed events are kept as each room's audit trail
+db = GameDatabase(open_storage(os.environ.get('DATABASE_URL') or os.environ.get('GAME_DB_PATH', 'game.db'),
+                               shards=int(os.environ.get('GAME_DB_SHARDS', '1'))),
+                  event_retention=float(os.environ.get('EVENT_RETENTION_HOURS', EVENT_RETENTION_SECONDS / 3600)) * 3600)
@@ -0,0 +1,207 @@
+import os
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from array import array
+
+from models import Hand, PlayerRound, Room
+
+MEMORY_TRACE_FRAMES = 12  # Frames kept per allocation - enough to see past stdlib into the caller
+MEMORY_SNAPSHOTS_KEPT = 10  # Labelled snapshots held for diffs (oldest dropped)
+MEMORY_ROOM_SAMPLE = 500  # Rooms walked per report - the walk holds the game lock
+SOCKET_PACKAGES = ('engineio', 'socketio', 'flask_socketio', 'simple_websocket', 'wsproto')  # Per-sid state
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STDLIB = sysconfig.get_paths()['stdlib']
+
+
+def module_of(filename):
+    """Owner of an allocation site: a repo file (server.py), a package (engineio), or None for stdlib"""
+    if filename.startswith(ROOT) and 'site-packages' not in filename:
+        return os.path.relpath(filename, ROOT)
+    if 'site-packages' in filename:
+        return filename.split('site-packages' + os.sep, 1)[1].split(os.sep, 1)[0].split('.', 1)[0]
+    if filename.startswith(STDLIB) or filename.startswith('<'):
+        return None
+    return filename
+
+
+def owner(traceback):
+    """Innermost non-stdlib frame's module - json.dumps called from engineio counts as engineio"""
+    for frame in reversed(traceback):  # Oldest frame first, so walk back from the allocation
+        module = module_of(frame.filename)
+        if module is not None:
+            return module
+    return 'stdlib'
+
+
+def by_module(snapshot):
+    """{module: [bytes, blocks]} over every trace of a snapshot"""
+    modules = {}
+    for stat in snapshot.statistics('traceback'):
+        totals = modules.setdefault(owner(stat.traceback), [0, 0])
+        totals[0] += stat.size
+        totals[1] += stat.count
+    return modules
+
+
+def deep_size(obj, seen=None):
+    """Bytes held by a room's object graph: containers, arrays, strings and the __slots__ models"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif isinstance(obj, (Room, PlayerRound, Hand)):
+        size += sum(deep_size(getattr(obj, slot), seen) for slot in obj.__slots__)
+    elif not isinstance(obj, (str, bytes, int, float, bool, array, type(None))):
+        raise TypeError(f'deep_size does not walk {type(obj).__name__}')
+    return size
+
+
+def rss_bytes():
+    """Resident set size from /proc (None where unavailable)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryProfiler:
+    """tracemalloc on demand: per-module totals, top allocation sites, labelled snapshots and their diffs
+
+    Snapshots record the rooms in memory and connected sids, so growth can be put per room / per sid.
+    `measure_rooms(size_of, sample)` sizes the in-memory rooms directly (GameDatabase.measure_rooms).
+    """
+
+    def __init__(self, measure_rooms, count_sids, frames=MEMORY_TRACE_FRAMES, kept=MEMORY_SNAPSHOTS_KEPT):
+        self.measure_rooms = measure_rooms
+        self.count_sids = count_sids
+        self.frames = frames
+        self.kept = kept
+        self._snapshots = []  # (id, label, taken_at, counts, snapshot)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start tracing (no-op if already on); only allocations made after this are seen"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            print(f"[MEMORY] tracemalloc started ({self.frames} frames)")
+
+    def stop(self):
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+        print("[MEMORY] tracemalloc stopped")
+
+    def _take(self):
+        self.start()
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def counts(self):
+        return {'rooms': self.measure_rooms(deep_size, 0)[0], 'sids': self.count_sids()}
+
+    def room_sizes(self, sample=MEMORY_ROOM_SAMPLE):
+        """Direct measurement: bytes held by (a sample of) the in-memory rooms"""
+        in_memory, measured, total = self.measure_rooms(deep_size, sample)
+        per_room = total / measured if measured else None
+        return {'in_memory': in_memory, 'measured': measured,
+                'bytes_per_room': round(per_room) if measured else None,
+                'bytes_estimate': round(per_room * in_memory) if measured else 0}
+
+    def summary(self, limit=20):
+        """Current totals by module, top sites and per-room / per-sid estimates"""
+        snapshot = self._take()
+        counts = self.counts()
+        modules = by_module(snapshot)
+        socket_bytes = sum(modules.get(package, [0])[0] for package in SOCKET_PACKAGES)
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'rss_bytes': rss_bytes(),
+            **counts,
+            'room_memory': self.room_sizes(),
+            # Attribution, not measurement: socket-library allocations spread over connected sids
+            'bytes_per_sid_estimate': round(socket_bytes / counts['sids']) if counts['sids'] else None,
+            'modules': self._module_table(modules, limit),
+            'top_sites': [self._site(stat) for stat in snapshot.statistics('lineno')[:limit]],
+        }
+
+    def snapshot(self, label=''):
+        """Keep a labelled snapshot for later diffs; returns its listing entry"""
+        snapshot = self._take()
+        with self._lock:
+            entry = (self._next_id, label, time.time(), self.counts(), snapshot)
+            self._next_id += 1
+            self._snapshots.append(entry)
+            del self._snapshots[:-self.kept]
+        print(f"[MEMORY] Snapshot {entry[0]} '{label}' taken")
+        return self._listing(entry)
+
+    def snapshots(self):
+        with self._lock:
+            return [self._listing(entry) for entry in self._snapshots]
+
+    def diff(self, base_id, target_id=None, limit=20):
+        """Growth from snapshot base_id to target_id (or now), by module and by site, per room/sid churned"""
+        with self._lock:
+            kept = {entry[0]: entry for entry in self._snapshots}
+        if base_id not in kept or (target_id is not None and target_id not in kept):
+            return None
+        _, _, base_time, base_counts, base = kept[base_id]
+        if target_id is None:
+            target, target_counts, target_time = self._take(), self.counts(), time.time()
+        else:
+            _, _, target_time, target_counts, target = kept[target_id]
+
+        base_modules, target_modules = by_module(base), by_module(target)
+        growth = {module: [target_modules.get(module, [0, 0])[0] - base_modules.get(module, [0, 0])[0],
+                           target_modules.get(module, [0, 0])[1] - base_modules.get(module, [0, 0])[1]]
+                  for module in set(base_modules) | set(target_modules)}
+        total = sum(size for size, _ in growth.values())
+        rooms_delta = target_counts['rooms'] - base_counts['rooms']
+        sids_delta = target_counts['sids'] - base_counts['sids']
+        return {
+            'base': base_id,
+            'target': target_id or 'now',
+            'seconds': round(target_time - base_time, 1),
+            'bytes': total,
+            'rooms_delta': rooms_delta,
+            'sids_delta': sids_delta,
+            'bytes_per_room_delta': round(total / rooms_delta) if rooms_delta else None,
+            'bytes_per_sid_delta': round(total / sids_delta) if sids_delta else None,
+            'modules': self._module_table(growth, limit, key=lambda item: -abs(item[1][0])),
+            'top_sites': [{
+                'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'module': module_of(stat.traceback[0].filename) or 'stdlib',
+                'bytes': stat.size_diff,
+                'blocks': stat.count_diff,
+            } for stat in target.compare_to(base, 'lineno')[:limit]],
+        }
+
+    @staticmethod
+    def _module_table(modules, limit, key=lambda item: -item[1][0]):
+        return [{'module': module, 'bytes': size, 'blocks': blocks}
+                for module, (size, blocks) in sorted(modules.items(), key=key)[:limit]]
+
+    @staticmethod
+    def _site(stat):
+        frame = stat.traceback[0]
+        return {'site': f'{frame.filename}:{frame.lineno}', 'module': module_of(frame.filename) or 'stdlib',
+                'bytes': stat.size, 'blocks': stat.count}
+
+    @staticmethod
+    def _listing(entry):
+        snapshot_id, label, taken_at, counts, snapshot = entry
+        return {'id': snapshot_id, 'label': label,
+                'taken_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(taken_at)),
+                'traced_bytes': sum(stat.size for stat in snapshot.statistics('filename')), **counts}
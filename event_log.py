@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+
+
+class EventLog:
+    """Append-only room event log, written to the storage backend in sequential batches"""
+
+    def __init__(self, storage, flush_interval=0.05):
+        self.storage = storage
+        self.flush_interval = flush_interval  # Max delay before an event is durable
+        self._pending = []  # (seq, room_id, type, payload_json, created_at) not yet written, None if replaced
+        self._coalescing = {}  # coalesce key -> position in _pending of the event it replaces
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._started = False
+
+        self.last_seq = storage.max_event_seq()
+
+    def start(self):
+        """Start the background writer (once)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def append(self, room_id, event_type, payload, coalesce_key=None):
+        """Queue an event and return its sequence number
+
+        An event with the same coalesce_key that is still queued is dropped - for events carrying an absolute
+        value, where only the latest matters. The new one still gets the next sequence number: a checkpoint
+        may already cover the old one's, and replay would skip an event written under it.
+        """
+        with self._lock:
+            position = self._coalescing.get(coalesce_key) if coalesce_key is not None else None
+            if position is not None:
+                self._pending[position] = None
+            self.last_seq += 1
+            self._pending.append((self.last_seq, room_id, event_type, json.dumps(payload), time.time()))
+            if coalesce_key is not None:
+                self._coalescing[coalesce_key] = len(self._pending) - 1
+            return self.last_seq
+
+    def flush(self):
+        """Write every queued event in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch = [event for event in self._pending if event is not None]
+                self._pending = []
+                self._coalescing.clear()
+            if not batch:
+                return
+            try:
+                self.storage.append_events(batch)
+            except Exception:
+                # Keep the batch (in order) for the next attempt
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._coalescing.clear()  # Positions moved
+                raise
+
+    def read_since(self, seq):
+        """Yield (seq, room_id, type, payload) for every event after seq, in order"""
+        for event_seq, room_id, event_type, payload in self.storage.read_events_since(seq):
+            yield event_seq, room_id, event_type, json.loads(payload)
+
+    def read_room(self, room_id, limit=1000):
+        """History of one room, oldest first"""
+        self.flush()
+        return [{'seq': seq, 'type': event_type, 'payload': json.loads(payload), 'created_at': created_at}
+                for seq, event_type, payload, created_at in self.storage.read_room_events(room_id, limit)]
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[EVENTS] Error while writing event log: {e}")
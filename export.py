@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+
+EXPORT_PAGE_ROOMS = 200  # Rooms read per keyset page
+EXPORT_PAGE_ROUNDS = 500  # Rounds (with all their player rows) read per page within those rooms
+
+EXPORT_COLUMNS = ['room_id', 'mode', 'max_boosts', 'decks', 'room_created_at', 'round_number', 'player_id', 'name',
+                  'identifier', 'cards', 'chant_count', 'total_swaps', 'folded', 'ready_for_new_round',
+                  'flipped_cards', 'completion_percentage', 'joined_at', 'card_order']
+
+
+def history_records(storage, since=None, until=None, room_id=None, page_rooms=EXPORT_PAGE_ROOMS,
+                    page_rounds=EXPORT_PAGE_ROUNDS):
+    """Yield one dict per player per round, room by room, reading the storage one page of rooms at a time"""
+    after = ''
+    while True:
+        # Keyset pagination: each page starts after the last room ID seen, so no page rescans earlier rows
+        rooms = storage.export_rooms(after, page_rooms, since, until, room_id)
+        if not rooms:
+            return
+        settings = {room[0]: room[1:] for room in rooms}
+        # ... and the rounds of those rooms are paged by (room_id, round_number), however long-lived the rooms
+        after_round = ('', 0)
+        while True:
+            rounds = storage.export_rounds(list(settings), after_round, page_rounds)
+            for room, round_number, rows in rounds:
+                for row in rows:
+                    yield history_record(room, settings[room], round_number, row)
+            if len(rounds) < page_rounds:
+                break
+            after_round = rounds[-1][:2]
+        if len(rooms) < page_rooms:
+            return
+        after = rooms[-1][0]
+
+
+def history_record(room, settings, round_number, row):
+    mode, max_boosts, decks, created_at = settings
+    (player_id, name, identifier, cards, chant_count, total_swaps, folded, ready, flipped, completion,
+     joined_at, card_order) = row
+    return {
+        'room_id': room,
+        'mode': mode,
+        'max_boosts': max_boosts,
+        'decks': decks,
+        'room_created_at': created_at,
+        'round_number': round_number,
+        'player_id': player_id,
+        'name': name,
+        'identifier': identifier,
+        'cards': json.loads(cards or '[]'),
+        'chant_count': chant_count,
+        'total_swaps': total_swaps,
+        'folded': bool(folded),
+        'ready_for_new_round': bool(ready),
+        'flipped_cards': json.loads(flipped or '[]'),
+        'completion_percentage': completion,
+        'joined_at': joined_at,
+        'card_order': json.loads(card_order) if card_order else []  # Display position -> index in cards
+    }
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def csv_lines(records):
+    """CSV with a header row; list columns (cards, flipped_cards) are JSON-encoded"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for record in records:
+        record['cards'] = json.dumps(record['cards'], separators=(',', ':'))
+        record['flipped_cards'] = json.dumps(record['flipped_cards'])
+        record['card_order'] = json.dumps(record['card_order'])
+        writer.writerow(record)
+        # One reused buffer: each yield hands over just the lines written since the last one
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # Header only, for an empty export
@@ -0,0 +1,112 @@
+# Card selection rules shared by the socket handlers and simulator.py
+
+BLANK_CARD = -1  # Lá trắng - the swap does nothing
+CARDS_PER_DECK = 52
+
+# Chance (%) of a "good" card on top of the chant boost when swapping
+GOOD_CARD_BONUS = 20
+
+
+def card_value(card_index):
+    """Card value 1-13 for a card index"""
+    return (card_index % 13) + 1
+
+
+def available_card_indices(total_cards, used_cards):
+    """Card indices nobody owns, in index order"""
+    used = set(used_cards)
+    return [i for i in range(total_cards) if i not in used]
+
+
+def chant_boost_percentage(chant_count):
+    """Swap boost (%) earned by chanting: 1 chant = 10%, 2 = 20%, 3+ = 30%"""
+    if chant_count >= 3:
+        return 30
+    elif chant_count >= 2:
+        return 20
+    elif chant_count >= 1:
+        return 10
+    return 0
+
+
+def swap_tiers(available_indices, current_value):
+    """Split available cards into better (higher value) and good (same or one lower) tiers"""
+    better_cards = []
+    good_cards = []
+    for idx in available_indices:
+        value = card_value(idx)
+        if value > current_value:
+            better_cards.append(idx)
+        elif value >= current_value - 1:  # Same or slightly worse
+            good_cards.append(idx)
+    return better_cards, good_cards
+
+
+def pick_swap_card(rng, available_indices, current_value, chant_count):
+    """Pick the card for a regular swap, returning (card_index, 'better' | 'good' | 'normal')"""
+    # Chanting gives boost% for a better card, then a further 20% for a good one
+    if not available_indices:
+        return BLANK_CARD, 'normal'
+
+    boost_percentage = chant_boost_percentage(chant_count)
+    if boost_percentage == 0:
+        return rng.choice(available_indices), 'normal'
+
+    better_cards, good_cards = swap_tiers(available_indices, current_value)
+    rand = rng.random() * 100
+
+    if rand < boost_percentage and better_cards:
+        return rng.choice(better_cards), 'better'
+    elif rand < boost_percentage + GOOD_CARD_BONUS and good_cards:
+        return rng.choice(good_cards), 'good'
+    return rng.choice(available_indices), 'normal'
+
+
+def boost_pool_size(boost_level):
+    """Minimum pool size for a boost swap: 10 cards at 1%/10%, 5 at 20%, 3 at 30%"""
+    if boost_level == 3:
+        return 5
+    elif boost_level == 4:
+        return 3
+    return 10
+
+
+def desired_card_indices(available_indices, desired_value):
+    """Available cards of the desired value (the four suits of the first deck)"""
+    available = set(available_indices)
+    return [(desired_value - 1) + suit * 13 for suit in range(4)
+            if (desired_value - 1) + suit * 13 in available]
+
+
+def _pick_padded(rng, cards, pool_size):
+    # Pools smaller than pool_size are padded with blank cards
+    if len(cards) >= pool_size:
+        return rng.choice(cards)
+    return rng.choice(list(cards) + [BLANK_CARD] * (pool_size - len(cards)))
+
+
+def pick_boost_card(rng, available_indices, boost_level, desired_value=None):
+    """Pick the card for a boost swap - may return BLANK_CARD"""
+    # Level 1 draws from everything available; higher levels pool the desired cards,
+    # topped up with random other cards (then blanks), so smaller pools mean better odds
+    pool_size = boost_pool_size(boost_level)
+    if boost_level == 1 or not desired_value:
+        return _pick_padded(rng, available_indices, pool_size)
+
+    desired_cards = desired_card_indices(available_indices, desired_value)
+    if not desired_cards:
+        return _pick_padded(rng, available_indices, pool_size)
+
+    pool = desired_cards[:]
+    desired = set(desired_cards)
+    non_desired_available = [idx for idx in available_indices if idx not in desired]
+    remaining_needed = max(0, pool_size - len(pool))
+
+    if len(non_desired_available) >= remaining_needed:
+        pool.extend(rng.sample(non_desired_available, remaining_needed))
+    else:
+        # Not enough other cards - add them all, then fill with blanks
+        pool.extend(non_desired_available)
+        pool.extend([BLANK_CARD] * (pool_size - len(pool)))
+
+    return rng.choice(pool)
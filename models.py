@@ -0,0 +1,218 @@
+import time
+from array import array
+
+# Blank cards (index -1) keep the value and suit they replaced: stored as BLANK | (suit * 13 + value - 1)
+BLANK = 0x8000
+
+
+def card_code(card):
+    """Card dict -> its code in a Hand"""
+    if card.get('index', -1) >= 0:
+        return card['index']
+    return BLANK | (card['suit'] * 13 + card['value'] - 1)
+
+
+def card_dict(code):
+    """Code in a Hand -> the card dict clients receive"""
+    if code & BLANK:
+        code &= ~BLANK
+        return {'value': (code % 13) + 1, 'suit': code // 13, 'index': -1}
+    return {'value': (code % 13) + 1, 'suit': code // 13, 'index': code, 'deck': code // 52 + 1}
+
+
+class Hand:
+    """A player's cards as an array('H') of card indices (plus BLANK codes)"""
+    __slots__ = ('codes',)
+
+    def __init__(self, codes=()):
+        self.codes = array('H', codes)
+
+    @classmethod
+    def from_cards(cls, cards):
+        return cls(card_code(card) for card in cards)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __eq__(self, other):
+        return isinstance(other, Hand) and self.codes == other.codes
+
+    def copy(self):
+        return Hand(self.codes)
+
+    def index(self, position):
+        """Card index at a position, -1 for a blank card"""
+        code = self.codes[position]
+        return -1 if code & BLANK else code
+
+    def value(self, position):
+        return ((self.codes[position] & ~BLANK) % 13) + 1
+
+    def indices(self):
+        """Indices of the cards the hand owns - blank cards own nothing"""
+        return [code for code in self.codes if not code & BLANK]
+
+    def values(self):
+        """Values of the owned cards"""
+        return [(code % 13) + 1 for code in self.codes if not code & BLANK]
+
+    def replace(self, position, card_index):
+        self.codes[position] = card_index
+
+    def blank(self, position):
+        """Turn a card blank - it keeps its value and suit but is no longer owned"""
+        self.codes[position] |= BLANK
+
+    def swap(self, from_index, to_index):
+        codes = self.codes
+        codes[from_index], codes[to_index] = codes[to_index], codes[from_index]
+
+    def card(self, position):
+        return card_dict(self.codes[position])
+
+    def to_dicts(self):
+        return [card_dict(code) for code in self.codes]
+
+
+class PlayerRound:
+    """One player's state in one round
+
+    The hand and flipped_cards are in dealt-slot order. Drag-and-drop only changes `order`, the display
+    permutation (display position -> slot, empty while untouched); clients always see and send positions.
+    """
+    __slots__ = ('name', 'identifier', 'hand', 'chant_count', 'total_swaps', 'folded',
+                 'ready_for_new_round', 'flipped_cards', 'completion_percentage', 'joined_at', 'order')
+
+    def __init__(self, name, identifier, joined_at, hand=None, chant_count=0, total_swaps=0, folded=False,
+                 ready_for_new_round=False, flipped_cards=None, completion_percentage=0.0, order=()):
+        self.name = name
+        self.identifier = identifier
+        self.hand = hand if hand is not None else Hand()
+        self.chant_count = chant_count
+        self.total_swaps = total_swaps
+        self.folded = folded
+        self.ready_for_new_round = ready_for_new_round
+        self.flipped_cards = flipped_cards if flipped_cards is not None else []
+        self.completion_percentage = completion_percentage
+        self.joined_at = joined_at
+        self.order = array('B', order)
+
+    def copy(self):
+        """Copy that callers may mutate freely"""
+        return PlayerRound(self.name, self.identifier, self.joined_at, self.hand.copy(), self.chant_count,
+                           self.total_swaps, self.folded, self.ready_for_new_round, list(self.flipped_cards),
+                           self.completion_percentage, self.order)
+
+    def slot(self, position):
+        """Hand slot shown at a display position"""
+        return self.order[position] if self.order else position
+
+    def slots(self):
+        """Hand slots in display order"""
+        return list(self.order) if self.order else list(range(len(self.hand)))
+
+    def move(self, from_position, to_position):
+        """Swap two display positions - the hand itself is untouched"""
+        if not self.order:
+            self.order = array('B', range(len(self.hand)))
+        order = self.order
+        order[from_position], order[to_position] = order[to_position], order[from_position]
+
+    def cards(self):
+        """Card dicts in display order - what clients receive"""
+        return [self.hand.card(slot) for slot in self.slots()]
+
+    def flipped_positions(self):
+        """Display positions of the flipped cards"""
+        flipped = set(self.flipped_cards)
+        return [position for position, slot in enumerate(self.slots()) if slot in flipped]
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'identifier': self.identifier,
+            'cards': self.hand.to_dicts(),
+            'chant_count': self.chant_count,
+            'total_swaps': self.total_swaps,
+            'folded': self.folded,
+            'ready_for_new_round': self.ready_for_new_round,
+            'flipped_cards': list(self.flipped_cards),
+            'completion_percentage': self.completion_percentage,
+            'joined_at': self.joined_at,
+            'order': list(self.order)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['identifier'], data.get('joined_at'), Hand.from_cards(data['cards']),
+                   data['chant_count'], data['total_swaps'], data['folded'], data['ready_for_new_round'],
+                   list(data['flipped_cards']), data['completion_percentage'], data.get('order', ()))
+
+
+class Room:
+    """A room's settings and its rounds (round_number -> {player_id: PlayerRound})"""
+    __slots__ = ('mode', 'max_boosts', 'decks', 'used_cards', 'rng_seed', 'created_at', 'current_round',
+                 'rounds', 'counters', 'pending_sql', 'version', 'changed', 'public_view', 'last_used', 'active_at',
+                 'rng_draws')
+
+    def __init__(self, mode, max_boosts, decks, used_cards, rng_seed, created_at, current_round=1, rounds=None,
+                 counters=None, pending_sql=None, version=0, rng_draws=None):
+        self.mode = mode
+        self.max_boosts = max_boosts
+        self.decks = decks
+        self.used_cards = used_cards
+        self.rng_seed = rng_seed
+        self.rng_draws = rng_draws  # (round_number, draws) - how far that round's random stream has been read
+        self.created_at = created_at
+        self.current_round = current_round
+        self.rounds = rounds if rounds is not None else {current_round: {}}
+        self.counters = counters  # Current round only, maintained by GameDatabase
+        self.pending_sql = pending_sql if pending_sql is not None else []  # Updates spanning rounds not in memory
+        self.version = version
+        self.changed = set()  # (round_number, player_id) rows to write at the next checkpoint, maintained by GameDatabase
+        self.public_view = None  # (version, payload) - what every player is sent on join, rebuilt when version moves on
+        self.last_used = time.monotonic()  # Last access, for idle eviction by GameDatabase
+        self.active_at = time.time()  # Epoch time of the last change, stored at checkpoints for inactive-room cleanup
+
+    @property
+    def players(self):
+        """Players of the current round"""
+        return self.rounds[self.current_round]
+
+    def view(self, player_id=None, used_cards=True):
+        """Copy of the settings and current-round players (only player_id's if given) for a handler to use
+
+        used_cards=False skips copying the used cards (the view's used_cards is None).
+        """
+        players = self.players
+        if player_id is not None:
+            players = {player_id: players[player_id]} if player_id in players else {}
+        return Room(self.mode, self.max_boosts, self.decks, list(self.used_cards) if used_cards else None,
+                    self.rng_seed, self.created_at, self.current_round, {self.current_round: {pid: player.copy() for pid, player in players.items()}})
+
+    def to_state(self):
+        """Plain-data form for warm-restart snapshots"""
+        return {
+            'mode': self.mode,
+            'max_boosts': self.max_boosts,
+            'decks': self.decks,
+            'used_cards': list(self.used_cards),
+            'rng_seed': self.rng_seed,
+            'created_at': self.created_at,
+            'current_round': self.current_round,
+            'rounds': {round_number: {pid: player.to_dict() for pid, player in players.items()}
+                       for round_number, players in self.rounds.items()},
+            'counters': self.counters,
+            'pending_sql': list(self.pending_sql),
+            'version': self.version,
+            'rng_draws': self.rng_draws
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        rounds = {round_number: {pid: PlayerRound.from_dict(player) for pid, player in players.items()}
+                  for round_number, players in state['rounds'].items()}
+        return cls(state['mode'], state['max_boosts'], state['decks'], list(state['used_cards']), state['rng_seed'],
+                   state['created_at'], state['current_round'], rounds, state.get('counters'),
+                   list(state.get('pending_sql', [])), state.get('version', 0),
+                   tuple(state['rng_draws']) if state.get('rng_draws') else None)
@@ -0,0 +1,192 @@
+import functools
+import json
+import threading
+import time
+import urllib.request
+
+# Histogram upper bounds in seconds (Prometheus style, +Inf implied)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUEUE_ALERT_SECONDS = 0.25  # Queueing delay that fires the alert hook
+ALERT_COOLDOWN = 60  # Seconds between two alerts
+
+
+class Histogram:
+    """Thread-safe bucketed timings: count, sum and max, exported as a Prometheus histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        slot = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        with self._lock:
+            self.counts[slot] += 1
+            self.count += 1
+            self.sum += seconds
+            self.max = max(self.max, seconds)
+
+    def render(self, name, labels=''):
+        """Prometheus text lines (cumulative buckets) for this histogram"""
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        sep = ',' if labels else ''
+        lines, cumulative = [], 0
+        for bound, bucket in zip((*self.buckets, '+Inf'), counts):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+def webhook_alert(url):
+    """Alert hook that POSTs the alert as JSON to url, off the handler thread"""
+    def post(alert):
+        request = urllib.request.Request(url, data=json.dumps(alert).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError as e:
+            print(f"[ALERT] Webhook failed: {e}")
+
+    return lambda alert: threading.Thread(target=post, args=(alert,), daemon=True).start()
+
+
+class EventMonitor:
+    """Per-event queueing delay (arrival -> handler start) and handler time, in threading mode
+
+    Handlers registered through on() are timed from start to finish under the name they were registered
+    with. python-socketio starts one thread per incoming event from the thread that read the packet;
+    instrument() stamps each such thread with that start time, which is the packet's arrival. Queueing
+    delay is thread start-up plus waiting for the GIL - it grows when too many threads are alive at once.
+    Handler time includes room-lock and SQLite waits.
+    """
+
+    def __init__(self, alert_after=QUEUE_ALERT_SECONDS, on_alert=None, cooldown=ALERT_COOLDOWN):
+        self.alert_after = alert_after
+        self.on_alert = on_alert
+        self.cooldown = cooldown
+        self.queue_delay = {}  # event -> Histogram
+        self.handler_time = {}  # event -> Histogram
+        self.alerts = Counter()
+        self.in_flight = 0
+        self.peak_threads = threading.active_count()
+        self._last_alert = 0.0
+        self._lock = threading.Lock()
+        self._arrival = threading.local()  # .at: perf_counter when python-socketio started this thread
+
+    def on(self, socketio, event, namespace=None):
+        """socketio.on(event, namespace), with the handler timed under the event's name"""
+        def decorator(handler):
+            socketio.on(event, namespace)(self._timed(handler, event))
+            return handler
+
+        return decorator
+
+    def instrument(self, sio):
+        """Stamp every task a python-socketio Server starts with its start time
+
+        With async_handlers (the default) python-socketio 5.x - pinned in requirements.txt - runs each event
+        in a task started through the public start_background_task, right after reading the packet; that is
+        the only place arrival can be seen. The stamp is generic: which handler runs is left to on().
+        """
+        start_task = sio.start_background_task
+
+        def start_background_task(target, *args, **kwargs):
+            return start_task(self._stamped(target, time.perf_counter()), *args, **kwargs)
+
+        sio.start_background_task = start_background_task
+
+    def _stamped(self, target, arrived):
+        @functools.wraps(target)
+        def run(*args, **kwargs):
+            self._arrival.at = arrived
+            try:
+                return target(*args, **kwargs)
+            finally:
+                self._arrival.at = None
+
+        return run
+
+    def _histograms(self, event):
+        with self._lock:
+            if event not in self.queue_delay:
+                self.queue_delay[event] = Histogram()
+                self.handler_time[event] = Histogram()
+            return self.queue_delay[event], self.handler_time[event]
+
+    def _timed(self, target, event):
+        @functools.wraps(target)
+        def run(*args, **kwargs):
+            started = time.perf_counter()
+            # Events handled inline (async_handlers off, as in test clients) have no queue
+            arrived = getattr(self._arrival, 'at', None) or started
+            threads = threading.active_count()
+            with self._lock:
+                self.in_flight += 1
+                self.peak_threads = max(self.peak_threads, threads)
+            try:
+                return target(*args, **kwargs)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.in_flight -= 1
+                queue_delay, handler_time = self._histograms(event)
+                queue_delay.observe(started - arrived)
+                handler_time.observe(finished - started)
+                if started - arrived > self.alert_after:
+                    self._alert(event, started - arrived, threads)
+
+        return run
+
+    def _alert(self, event, delay, threads):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_alert < self.cooldown:
+                return
+            self._last_alert = now
+        self.alerts.inc()
+        alert = {'alert': 'socketio_queue_delay', 'event': event, 'queue_ms': round(delay * 1000, 1),
+                 'threshold_ms': round(self.alert_after * 1000, 1), 'threads': threads, 'in_flight': self.in_flight}
+        print(f"[ALERT] '{event}' waited {alert['queue_ms']} ms before its handler ran "
+              f"({threads} threads, {self.in_flight} handlers running)")
+        if self.on_alert:
+            self.on_alert(alert)
+
+    def render(self, lock_waits=()):
+        """Prometheus text exposition; lock_waits is [(labels, Histogram, timeouts Counter)] of SQLite files"""
+        lines = ['# HELP socketio_event_queue_seconds Packet arrival to handler start',
+                 '# TYPE socketio_event_queue_seconds histogram']
+        for event, histogram in sorted(self.queue_delay.items()):
+            lines += histogram.render('socketio_event_queue_seconds', f'event="{event}"')
+        lines += ['# HELP socketio_event_handler_seconds Handler start to finish',
+                  '# TYPE socketio_event_handler_seconds histogram']
+        for event, histogram in sorted(self.handler_time.items()):
+            lines += histogram.render('socketio_event_handler_seconds', f'event="{event}"')
+        lines += ['# TYPE socketio_events_in_flight gauge', f'socketio_events_in_flight {self.in_flight}',
+                  '# TYPE process_threads gauge', f'process_threads {threading.active_count()}',
+                  '# TYPE process_threads_peak gauge', f'process_threads_peak {self.peak_threads}',
+                  '# TYPE socketio_queue_alerts_total counter', f'socketio_queue_alerts_total {self.alerts.value}']
+        if lock_waits:
+            lines += ['# HELP sqlite_lock_wait_seconds Wait for the write lock (BEGIN IMMEDIATE)',
+                      '# TYPE sqlite_lock_wait_seconds histogram']
+            for labels, histogram, _ in lock_waits:
+                lines += histogram.render('sqlite_lock_wait_seconds', labels)
+            lines += ['# HELP sqlite_lock_timeouts_total Write transactions that failed with database is locked',
+                      '# TYPE sqlite_lock_timeouts_total counter']
+            lines += [f'sqlite_lock_timeouts_total{{{labels}}} {timeouts.value}' for labels, _, timeouts in lock_waits]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,101 @@
+import threading
+import time
+
+
+class ProgressAggregator:
+    """Keep the latest rub-energy progress per player and coalesce DB writes and broadcasts"""
+
+    def __init__(self, db, socketio, flush_interval=1.0, broadcast_interval=0.25):
+        self.db = db
+        self.socketio = socketio
+        self.flush_interval = flush_interval  # Max one batched DB write per interval
+        self.broadcast_interval = broadcast_interval  # Max one snapshot per room per interval
+        self._latest = {}  # room_id -> {player_id: percentage}
+        self._dirty_writes = set()  # (room_id, player_id) changed since last flush
+        self._dirty_rooms = set()  # rooms with changes since last broadcast
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Keeps a slow flush from landing after a round reset
+        self._started = False
+
+    def start(self):
+        """Start the background flush/broadcast loop (once)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def report(self, room_id, player_id, percentage):
+        """Record a progress sample - in memory only, never touches the DB"""
+        percentage = max(0.0, min(100.0, float(percentage)))
+        with self._lock:
+            room = self._latest.setdefault(room_id, {})
+            if room.get(player_id) == percentage:
+                return
+            room[player_id] = percentage
+            self._dirty_writes.add((room_id, player_id))
+            self._dirty_rooms.add(room_id)
+
+    def reset_room(self, room_id):
+        """Drop progress for a room, e.g. when a new round starts"""
+        with self._flush_lock, self._lock:
+            self._latest.pop(room_id, None)
+            self._dirty_rooms.discard(room_id)
+            self._dirty_writes = {key for key in self._dirty_writes if key[0] != room_id}
+
+    def forget_player(self, room_id, player_id):
+        """Drop a socket's sample when it leaves (disconnect, or a reconnect under a new sid)
+
+        A sample not written yet is written first, so the player keeps their saved progress;
+        the room gets a fresh snapshot without the old sid.
+        """
+        with self._flush_lock:
+            with self._lock:
+                room = self._latest.get(room_id, {})
+                if player_id not in room:
+                    return
+                percentage = room.pop(player_id)
+                unwritten = (room_id, player_id) in self._dirty_writes
+                self._dirty_writes.discard((room_id, player_id))
+                self._dirty_rooms.add(room_id)
+            if unwritten:
+                self.db.update_player_completions([(percentage, player_id, room_id)])
+
+    def forget_rooms(self, room_ids):
+        """Drop the samples kept for idle rooms - skipped for a room whose latest sample is not written yet"""
+        with self._flush_lock, self._lock:
+            pending = {room_id for room_id, _ in self._dirty_writes} | self._dirty_rooms
+            for room_id in room_ids:
+                if room_id not in pending:
+                    self._latest.pop(room_id, None)
+
+    def flush(self):
+        """Write every pending sample to the DB in one batch"""
+        with self._flush_lock:
+            with self._lock:
+                rows = [(self._latest[room_id][player_id], player_id, room_id)
+                        for room_id, player_id in self._dirty_writes
+                        if player_id in self._latest.get(room_id, {})]
+                self._dirty_writes = set()
+            if rows:
+                self.db.update_player_completions(rows)
+
+    def broadcast(self):
+        """Send one progress snapshot to each room that changed"""
+        with self._lock:
+            snapshots = {room_id: dict(self._latest.get(room_id, {})) for room_id in self._dirty_rooms}
+            self._dirty_rooms = set()
+        for room_id, players in snapshots.items():
+            self.socketio.emit('progress_snapshot', {'players': players}, room=room_id)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(self.broadcast_interval)
+            try:
+                self.broadcast()
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    last_flush = time.monotonic()
+                    self.flush()
+            except Exception as e:
+                print(f"[PROGRESS] Error while flushing progress: {e}")
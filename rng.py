@@ -0,0 +1,143 @@
+import random
+import threading
+from collections import deque
+
+PREFETCH_SIZE = 64  # Floats drawn ahead of time for each round stream
+
+
+def new_seed():
+    """Fresh 63-bit seed for a new room"""
+    return random.SystemRandom().getrandbits(63)
+
+
+class RoomRandom:
+    """Seeded random stream for one round of one room"""
+
+    def __init__(self, seed, on_draw=None):
+        self._rng = random.Random(seed)
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self.draws = 0  # Floats handed out so far - enough to rebuild the stream at the same point
+        self.on_draw = on_draw  # callback(draws) after every draw, in draw order
+
+    def prefetch(self, count=PREFETCH_SIZE):
+        """Top up the buffer so the next `count` draws need no generator calls"""
+        with self._lock:
+            missing = count - len(self._buffer)
+            if missing > 0:
+                self._buffer.extend(self._rng.random() for _ in range(missing))
+
+    def draw_batch(self, count):
+        """Return the next `count` floats in [0, 1) from the stream"""
+        # Prefetched floats come first, so batching never changes what a replay draws
+        with self._lock:
+            batch = [self._buffer.popleft() for _ in range(min(count, len(self._buffer)))]
+            batch.extend(self._rng.random() for _ in range(count - len(batch)))
+            self.draws += count
+            if self.on_draw is not None:
+                self.on_draw(self.draws)
+            return batch
+
+    def skip(self, count):
+        """Advance the stream past `count` floats, as if they had been drawn"""
+        with self._lock:
+            for _ in range(count):
+                self._rng.random()
+            self.draws += count
+
+    def getstate(self):
+        with self._lock:
+            return self._rng.getstate(), list(self._buffer), self.draws
+
+    def setstate(self, state):
+        rng_state, buffer = state[:2]
+        with self._lock:
+            self._rng.setstate(rng_state)
+            self._buffer = deque(buffer)
+            self.draws = state[2] if len(state) > 2 else 0  # Snapshots taken before draws were counted
+
+    def random(self):
+        return self.draw_batch(1)[0]
+
+    def randbelow(self, n):
+        return min(int(self.random() * n), n - 1)
+
+    def choice(self, seq):
+        if not seq:
+            raise IndexError('Cannot choose from an empty sequence')
+        return seq[self.randbelow(len(seq))]
+
+    def sample(self, population, k):
+        """Pick k distinct items with a partial Fisher-Yates shuffle"""
+        pool = list(population)
+        if not 0 <= k <= len(pool):
+            raise ValueError('Sample larger than population')
+        draws = self.draw_batch(k)
+        for i in range(k):
+            j = i + min(int(draws[i] * (len(pool) - i)), len(pool) - i - 1)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+
+class RoomRandomRegistry:
+    """One RoomRandom per room, re-seeded from the room's persisted seed at every round
+
+    Every draw saves the stream's draw count with the room. A stream that is not in memory - the room
+    was evicted, or the process restarted - is rebuilt from the seed and skips that many draws, so it
+    carries on where it stopped instead of repeating its first cards.
+    """
+
+    def __init__(self, get_seed, get_draws=None, save_draws=None):
+        self._get_seed = get_seed  # room_id -> seed persisted on the rooms row
+        self._get_draws = get_draws  # (room_id, round_number) -> persisted draw count
+        self._save_draws = save_draws  # (room_id, round_number, draws), after every draw
+        self._streams = {}  # room_id -> (round_number, RoomRandom)
+        self._lock = threading.Lock()
+
+    def get(self, room_id, round_number):
+        with self._lock:
+            cached = self._streams.get(room_id)
+            if cached and cached[0] == round_number:
+                return cached[1]
+
+        seed = self._get_seed(room_id)
+        stream = RoomRandom(f'{seed}:{round_number}')
+        if self._get_draws is not None:
+            stream.skip(self._get_draws(room_id, round_number))
+        stream.prefetch()
+
+        with self._lock:
+            cached = self._streams.get(room_id)
+            if cached and cached[0] == round_number:
+                return cached[1]
+            self._streams[room_id] = (round_number, self._saving(stream, room_id, round_number))
+            return stream
+
+    def _saving(self, stream, room_id, round_number):
+        """Have the stream save its draw count after every draw"""
+        if self._save_draws is not None:
+            stream.on_draw = lambda draws: self._save_draws(room_id, round_number, draws)
+        return stream
+
+    def evict(self, room_id):
+        """Drop an idle room's stream - its position is saved with the room, so get() resumes it"""
+        with self._lock:
+            self._streams.pop(room_id, None)
+
+    def discard(self, room_id):
+        with self._lock:
+            self._streams.pop(room_id, None)
+
+    def export_state(self):
+        """Position of every live stream, for a warm-restart snapshot"""
+        with self._lock:
+            return {room_id: (round_number, stream.getstate())
+                    for room_id, (round_number, stream) in self._streams.items()}
+
+    def import_state(self, states):
+        """Resume streams exactly where a snapshot left them"""
+        with self._lock:
+            for room_id, (round_number, state) in states.items():
+                stream = RoomRandom(0)
+                stream.setstate(state)
+                self._streams.setdefault(room_id, (round_number, self._saving(stream, room_id, round_number)))
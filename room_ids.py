@@ -0,0 +1,128 @@
+import math
+import random
+import string
+import threading
+import time
+from collections import OrderedDict
+
+ROOM_ID_ALPHABET = string.ascii_uppercase + string.digits
+ROOM_ID_LENGTH = 6
+ROOM_ID_SPACE = len(ROOM_ID_ALPHABET) ** ROOM_ID_LENGTH  # 36^6 possible IDs
+
+
+def encode_room_id(number):
+    """Encode an integer in [0, ROOM_ID_SPACE) as a 6-character room ID"""
+    chars = []
+    for _ in range(ROOM_ID_LENGTH):
+        number, digit = divmod(number, len(ROOM_ID_ALPHABET))
+        chars.append(ROOM_ID_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class RoomIdAllocator:
+    """Hand out unique room IDs from a permuted counter instead of probing the database"""
+
+    def __init__(self, live_ids=(), seed=None):
+        rng = random.Random(seed) if seed is not None else random.SystemRandom()
+
+        # x -> (a * x + b) mod N visits every ID exactly once when gcd(a, N) == 1,
+        # so a plain counter becomes a sequence that doesn't look sequential
+        multiplier = rng.randrange(ROOM_ID_SPACE // 2, ROOM_ID_SPACE)
+        while math.gcd(multiplier, ROOM_ID_SPACE) != 1:
+            multiplier += 1
+        self._multiplier = multiplier
+        self._offset = rng.randrange(ROOM_ID_SPACE)
+        # Random start so a restart doesn't walk the same sequence again
+        self._counter = rng.randrange(ROOM_ID_SPACE)
+
+        self._live = set(live_ids)
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        """Return a new room ID that is not live, and mark it live"""
+        with self._lock:
+            if len(self._live) >= ROOM_ID_SPACE:
+                raise RuntimeError('Room ID space exhausted')
+            while True:
+                self._counter = (self._counter + 1) % ROOM_ID_SPACE
+                room_id = encode_room_id((self._multiplier * self._counter + self._offset) % ROOM_ID_SPACE)
+                # Only IDs left over from before a restart can collide here
+                if room_id not in self._live:
+                    self._live.add(room_id)
+                    return room_id
+
+    def allocate_many(self, count):
+        """Return `count` new room IDs in one pass under the lock"""
+        with self._lock:
+            if len(self._live) + count > ROOM_ID_SPACE:
+                raise RuntimeError('Room ID space exhausted')
+            room_ids = []
+            while len(room_ids) < count:
+                self._counter = (self._counter + 1) % ROOM_ID_SPACE
+                room_id = encode_room_id((self._multiplier * self._counter + self._offset) % ROOM_ID_SPACE)
+                if room_id not in self._live:
+                    self._live.add(room_id)
+                    room_ids.append(room_id)
+            return room_ids
+
+    def add(self, room_id):
+        """Mark an externally created room ID as live"""
+        with self._lock:
+            self._live.add(room_id)
+
+    def discard(self, room_id):
+        """Release a room ID after its room is deleted"""
+        with self._lock:
+            self._live.discard(room_id)
+
+    def __contains__(self, room_id):
+        return room_id in self._live
+
+    def __len__(self):
+        return len(self._live)
+
+
+class RoomExistenceCache:
+    """Answer "does this room exist?" from memory, with a short-lived negative cache for misses"""
+
+    def __init__(self, live_ids, lookup, negative_ttl=30, max_negative=10000):
+        self._live = live_ids  # shared with the allocator, updated by create_room and cleanup
+        self._lookup = lookup  # fallback for rooms created outside this process
+        self._negative_ttl = negative_ttl
+        self._max_negative = max_negative
+        self._negative = OrderedDict()  # room_id -> expiry time
+        self._lock = threading.Lock()
+
+    def exists(self, room_id):
+        """Return True if the room exists, touching the database at most once per TTL for unknown IDs"""
+        if room_id in self._live:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._negative.get(room_id)
+            if expires_at is not None:
+                if expires_at > now:
+                    return False
+                del self._negative[room_id]
+
+        if self._lookup(room_id):
+            self.add(room_id)
+            return True
+
+        with self._lock:
+            self._negative[room_id] = now + self._negative_ttl
+            self._negative.move_to_end(room_id)
+            while len(self._negative) > self._max_negative:
+                self._negative.popitem(last=False)
+        return False
+
+    def add(self, room_id):
+        """Record a newly created room"""
+        self._live.add(room_id)
+        with self._lock:
+            self._negative.pop(room_id, None)
+
+    def discard(self, room_id):
+        """Forget a deleted room"""
+        self._live.discard(room_id)
@@ -0,0 +1,18 @@
+import threading
+
+ROOM_LOCK_STRIPES = 64  # Locks shared by all rooms - rooms on different stripes never wait for each other
+
+
+class RoomLocks:
+    """Striped per-room locks: read-modify-write of one room's cards runs one at a time, other rooms in parallel
+
+    A fixed table keyed by hash(room_id), so there is nothing to create or clean up per room. Two rooms
+    may share a stripe and then briefly wait on each other; the locks are reentrant, so a handler holding
+    its room's lock can call helpers that take it again. Never hold one room's lock while taking another's.
+    """
+
+    def __init__(self, stripes=ROOM_LOCK_STRIPES):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def lock(self, room_id):
+        return self._locks[hash(room_id) % len(self._locks)]
@@ -1,14 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for
-from flask_socketio import SocketIO, join_room, leave_room, emit
+from flask import Flask, Response, render_template, request, redirect, url_for, abort, jsonify, stream_with_context
+from flask_socketio import SocketIO, join_room, leave_room, emit, rooms
 import random
 import string
 import json
+import hmac
 import sqlite3
 import socket
 from database import db
+from room_ids import RoomIdAllocator, RoomExistenceCache
+from assets import AssetPipeline
+from progress import ProgressAggregator
+from rng import RoomRandomRegistry
+from snapshot import write_snapshot, read_snapshot
+from admission import JoinAdmission, RoomLoadCoalescer
+from room_locks import RoomLocks
+from spectators import SpectatorHub
+from stats import PlayerStats, LEADERBOARD_COLUMNS
+from models import Hand
+from export import history_records, ndjson_lines, csv_lines
+from diagnostics import MemoryProfiler
+from monitor import EventMonitor, webhook_alert, QUEUE_ALERT_SECONDS
+from game_rules import available_card_indices, chant_boost_percentage, pick_swap_card, pick_boost_card
 import schedule
 import time
 import threading
+import os
 
 def get_local_ip():
     """Get the local IP address of this machine"""
@@ -23,9 +39,18 @@ def get_local_ip():
         print(f"Could not get local IP: {e}")
         return "localhost"
 
+# Host shown in room URLs - resolved once at startup, never per request
+LOCAL_IP = 'localhost'
+PORT = int(os.environ.get('PORT', 5000))
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
+# Fingerprint and precompress static files once at startup; templates use asset_url()
+assets = AssetPipeline(app.static_folder)
+assets.build()
+app.jinja_env.globals['asset_url'] = assets.url
+
 # Add CORS headers for all routes
 @app.after_request
 def after_request(response):
@@ -35,7 +60,6 @@ def after_request(response):
     return response
 
 # Use threading for both production and development (more compatible with Fly.io)
-import os
 if os.environ.get('FLY_APP_NAME') or os.environ.get('VERCEL'):
     # Production on Fly.io or Vercel - use threading with polling only (more stable)
     socketio = SocketIO(
@@ -66,52 +90,314 @@ else:
         engineio_logger=True
     )
 
+# Every event is timed from packet arrival to handler start (queueing) and to handler end; scraped at
+# /admin/metrics. A queueing delay above QUEUE_ALERT_MS is logged and POSTed to ALERT_WEBHOOK_URL if set
+alert_webhook = os.environ.get('ALERT_WEBHOOK_URL')
+event_monitor = EventMonitor(
+    alert_after=float(os.environ.get('QUEUE_ALERT_MS', QUEUE_ALERT_SECONDS * 1000)) / 1000,
+    on_alert=webhook_alert(alert_webhook) if alert_webhook else None)
+event_monitor.instrument(socketio.server)
+
+def on(event):
+    """@socketio.on(event), with the handler timed by event_monitor"""
+    return event_monitor.on(socketio, event)
+
+# Live room IDs are loaded once; new IDs come from a permuted counter, not a DB probe loop
+room_ids = RoomIdAllocator(db.get_all_room_ids())
+# Existence checks for page loads and joins: live set first, short negative cache for unknown IDs
+room_cache = RoomExistenceCache(room_ids, db.room_exists)
+
+# Each room draws from its own seeded stream (seed persisted on rooms, re-derived per round)
+room_rngs = RoomRandomRegistry(db.get_room_seed, db.get_rng_draws, db.update_rng_draws)
+
+# Leaderboard and warm snapshots stay in a local file whichever backend holds the rooms
+LOCAL_DB_PATH = db.db_path or os.environ.get('GAME_DB_PATH', 'game.db')
+
+# Leaderboard: per-identifier aggregates folded in at every round end
+player_stats = PlayerStats(LOCAL_DB_PATH)
+
+# Rub-energy progress: latest sample per player in memory, batched DB writes, throttled snapshots
+progress = ProgressAggregator(db, socketio)
+
+# Rooms idle past ROOM_IDLE_SECONDS leave the database's memory after a checkpoint; per-room state
+# kept here goes with them and is rebuilt on the next use
+def forget_idle_rooms(room_ids):
+    for room_id in room_ids:
+        room_rngs.evict(room_id)
+    progress.forget_rooms(room_ids)
+
+db.on_evict(forget_idle_rooms)
+
+# The weekly cleanup deletes rooms with no activity for this many days - unset (0) keeps every room
+ROOM_RETENTION_DAYS = float(os.environ.get('ROOM_RETENTION_DAYS', 0))
+
+# Admin HTTP API (bulk provisioning, ...) - disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+MAX_PROVISIONED_ROOMS = 10000  # Per request
+
+# Warm restarts: live state is snapshotted on shutdown and memory-mapped back in on startup
+WARM_SNAPSHOT_PATH = os.environ.get('WARM_SNAPSHOT_PATH', f'{LOCAL_DB_PATH}.snapshot')
+sessions = {}  # sid -> (room_id, identifier) of every joined socket
+expected_reconnects = {}  # identifier -> room_id of players connected when the snapshot was taken
+
+# Reconnect storms: simultaneous joins share one room load, only a few run at once
+# (reconnects first), and the overflow is told to retry after a jittered delay
+room_loads = RoomLoadCoalescer(db.get_player_identifiers)
+
+# Handlers that read a room's used cards and then write them back (joins, swaps, boosts, deals) hold
+# that room's lock, so two players can never be dealt the same card; folds and readies hold it from
+# their update to the all-folded / all-ready decision, so a round is dealt once; other rooms are not blocked
+room_locks = RoomLocks()
+join_admission = JoinAdmission(room_locks=room_locks)
+
+# Memory diagnostics (admin): tracemalloc starts on the first /admin/memory call, or at boot with MEMORY_TRACE=1
+memory_profiler = MemoryProfiler(db.measure_rooms, lambda: len(socketio.server.eio.sockets))
+if os.environ.get('MEMORY_TRACE'):
+    memory_profiler.start()
+
+def spectator_snapshot(room_id):
+    """Public view of a room for spectators - hands stay hidden until flipped"""
+    room_info = db.get_room_info(room_id)
+    if not room_info:
+        return {'room_id': room_id, 'closed': True}
+    return {
+        'room_id': room_id,
+        'round': room_info.current_round,
+        'mode': room_info.mode,
+        'players': [{
+            'player_id': pid,
+            'name': player.name,
+            'folded': player.folded,
+            'ready': player.ready_for_new_round,
+            'cards': [player.hand.card(slot) if slot in player.flipped_cards else None for slot in player.slots()]
+        } for pid, player in room_info.players.items()],
+        'spectators': spectators.count(room_id),
+        **get_room_stats(room_id)
+    }
+
+# Spectators watch read-only on their own channel: events are batched, serialized
+# once per tick and conflated or skipped for slow watchers, never on the players' path
+spectators = SpectatorHub(socketio, spectator_snapshot)
+
+def emit_to_room(event, data, room_id, spectator_data=None):
+    """Emit to the room's players and queue the same event for its spectators"""
+    socketio.emit(event, data, room=room_id)
+    spectators.publish(room_id, event, data if spectator_data is None else spectator_data)
+
+# Event fields that name cards in someone's hand: the dealt / taken card, and the used-card changes
+# (the card added is the one taken, so these give a face-down card away as surely as new_card)
+HAND_FIELDS = ('new_card', 'used_cards', 'used_cards_added', 'used_cards_removed')
+
+def spectator_copy(data, face_up=False):
+    """Spectators' copy of an event - cards it deals or moves only if their position is already flipped"""
+    return data if face_up else {key: value for key, value in data.items() if key not in HAND_FIELDS}
+
 def generate_room_id():
     """Generate a unique 6-character room ID"""
-    while True:
-        room_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        if not db.get_room_info(room_id):
-            return room_id
-
-def generate_cards(num_cards, used_cards, decks=1):
-    """Generate random cards for a player, avoiding used cards"""
-    cards = []
+    return room_ids.allocate()
+
+def generate_cards(num_cards, used_cards, decks=1, rng=random):
+    """Generate a random Hand for a player, avoiding used cards"""
     total_cards = 52 * decks  # 52 cards per deck
-    available_indices = [i for i in range(total_cards) if i not in used_cards]
+    available_indices = available_card_indices(total_cards, used_cards)
 
     if len(available_indices) < num_cards:
         # If not enough cards available, reset used cards (this shouldn't happen in normal play)
         available_indices = list(range(total_cards))
 
-    selected_indices = random.sample(available_indices, num_cards)
-
-    for card_index in selected_indices:
-        value = (card_index % 13) + 1
-        suit = card_index // 13
-        deck = card_index // 52 + 1  # Deck number (1 or 2)
-        cards.append({'value': value, 'suit': suit, 'index': card_index, 'deck': deck})
-
-    return cards
+    # Value, suit and deck all follow from the card index
+    return Hand(rng.sample(available_indices, num_cards))
 
 @app.route('/')
 def lobby():
     """Lobby page for creating/joining rooms"""
     return render_template('lobby.html')
 
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Serve fingerprinted static files with immutable caching and precompressed variants"""
+    response = assets.serve(filename, request)
+    if response is None:
+        abort(404)
+    return response
+
+def require_admin():
+    """Abort unless the request carries the admin token in the X-Admin-Token header
+
+    Never a query parameter: URLs end up in access logs, proxies and browser history. The comparison
+    takes the same time wherever the first wrong character is.
+    """
+    if not ADMIN_TOKEN:
+        abort(404)
+    token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        abort(403)
+
+@app.route('/admin/rooms', methods=['POST'])
+def provision_rooms():
+    """Create N empty rooms with the same settings in one go, returning their join URLs"""
+    require_admin()
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object body'}), 400
+    try:
+        count = int(data.get('count', 1))
+        mode = int(data.get('mode', 3))
+        max_boosts = int(data.get('max_boosts', 3))
+        decks = int(data.get('decks', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count, mode, max_boosts and decks must be integers'}), 400
+    if not 1 <= count <= MAX_PROVISIONED_ROOMS or mode not in (3, 6) or max_boosts < 0 or not 1 <= decks <= 3:
+        return jsonify({'error': f'Expected 1-{MAX_PROVISIONED_ROOMS} rooms, mode 3 or 6, max_boosts >= 0, decks 1-3'}), 400
+
+    # IDs come from the permuted counter in one pass; the rooms are logged in one transaction
+    new_room_ids = room_ids.allocate_many(count)
+    db.create_rooms(new_room_ids, mode, max_boosts, decks)
+    for room_id in new_room_ids:
+        room_cache.add(room_id)
+
+    print(f"[ADMIN] Provisioned {count} rooms (mode {mode}, max_boosts {max_boosts}, decks {decks})")
+    base_url = request.host_url
+    return jsonify({
+        'rooms': [{'room_id': room_id, 'url': f'{base_url}{room_id}'} for room_id in new_room_ids]
+    }), 201
+
+def parse_export_time(value):
+    """'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' (UTC, like rooms.created_at) -> the stored format; None if absent"""
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return time.strftime('%Y-%m-%d %H:%M:%S', time.strptime(value, fmt))
+        except ValueError:
+            pass
+    raise ValueError(value)
+
+@app.route('/admin/export')
+def export_history():
+    """Stream rooms and their round history - ?format=ndjson|csv&since=&until=&room=
+
+    since/until filter on room creation time (until is exclusive). Pages are read from storage as the
+    response is sent, so memory stays flat and the game lock is never taken; data is as of the last checkpoint.
+    """
+    require_admin()
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        since = parse_export_time(request.args.get('since'))
+        until = parse_export_time(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since/until must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS'}), 400
+    room_filter = request.args.get('room')
+
+    print(f"[ADMIN] Exporting history as {fmt} (since {since}, until {until}, room {room_filter})")
+    records = history_records(db.storage, since, until, room_filter.upper() if room_filter else None)
+    lines = ndjson_lines(records) if fmt == 'ndjson' else csv_lines(records)
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    return Response(stream_with_context(lines), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=history.{fmt}'})
+
+@app.route('/admin/metrics')
+def metrics():
+    """Prometheus text: per-event queueing delay and handler time, threads, SQLite write-lock waits"""
+    require_admin()
+    storage = db.storage
+    files = getattr(storage, 'shards', [storage])
+    lock_waits = [(f'file="{os.path.basename(f.db_path)}"', f.lock_waits, f.lock_timeouts)
+                  for f in files if hasattr(f, 'lock_waits')]
+    return Response(event_monitor.render(lock_waits), mimetype='text/plain; version=0.0.4')
+
+def parse_limit(default=20):
+    try:
+        return max(1, min(int(request.args.get('limit', default)), 200))
+    except ValueError:
+        abort(400)
+
+@app.route('/admin/memory')
+def memory_report():
+    """Traced memory by module (server.py, database.py, engineio, ...), top allocation sites, bytes per room/sid"""
+    require_admin()
+    return jsonify(memory_profiler.summary(parse_limit()))
+
+@app.route('/admin/memory', methods=['DELETE'])
+def memory_stop():
+    """Stop tracing (it costs CPU and memory on every allocation) and drop the kept snapshots"""
+    require_admin()
+    memory_profiler.stop()
+    return '', 204
+
+@app.route('/admin/memory/snapshots', methods=['GET', 'POST'])
+def memory_snapshots():
+    """POST {label} keeps a snapshot to diff against later; GET lists the kept ones"""
+    require_admin()
+    if request.method == 'POST':
+        label = str((request.get_json(silent=True) or {}).get('label', ''))[:100]
+        return jsonify(memory_profiler.snapshot(label)), 201
+    return jsonify({'snapshots': memory_profiler.snapshots()})
+
+@app.route('/admin/memory/diff')
+def memory_diff():
+    """Growth from snapshot ?base= to ?target= (default: now) by module and site, per room/sid churned"""
+    require_admin()
+    try:
+        base = int(request.args['base'])
+        target = int(request.args['target']) if request.args.get('target') else None
+    except (KeyError, ValueError):
+        return jsonify({'error': 'base (and optional target) must be snapshot ids'}), 400
+    diff = memory_profiler.diff(base, target, parse_limit())
+    if diff is None:
+        return jsonify({'error': 'Unknown snapshot id'}), 404
+    return jsonify(diff)
+
+@app.route('/api/leaderboard')
+def leaderboard():
+    """Top players - ?by=hand|best|rounds|swaps|boost&limit=10&min_rounds=1"""
+    by = request.args.get('by', 'hand')
+    if by not in LEADERBOARD_COLUMNS:
+        return jsonify({'error': f'by must be one of {", ".join(LEADERBOARD_COLUMNS)}'}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    min_rounds = max(request.args.get('min_rounds', 1, type=int), 0)
+    return jsonify({'by': by, 'players': player_stats.leaderboard(by, limit, min_rounds)})
+
+@app.route('/api/players/<identifier>/stats')
+def player_stats_view(identifier):
+    """Aggregates of one player, looked up by the persistent identifier the client holds"""
+    stats = player_stats.get(identifier)
+    if stats is None:
+        abort(404)
+    return jsonify(stats)
+
 @app.route('/<room_id>')
 def join_via_url(room_id):
     """Join room directly via URL - always show game page"""
     room_id = room_id.upper()
-    room_info = db.get_room_info(room_id)
-    if room_info:
+    if room_cache.exists(room_id):
         return render_template('game.html', room_id=room_id)
     else:
         return redirect(url_for('lobby'))
 
+@app.route('/<room_id>/spectate')
+def spectate_via_url(room_id):
+    """Read-only spectator page for a room"""
+    room_id = room_id.upper()
+    if room_cache.exists(room_id):
+        return render_template('spectate.html', room_id=room_id)
+    else:
+        return redirect(url_for('lobby'))
+
 @app.route('/<room_id>/systemcall/<command>')
 def system_call(room_id, command):
     """Handle system calls for special game commands"""
     room_id = room_id.upper()
+    if not room_cache.exists(room_id):
+        return redirect(url_for('join_via_url', room_id=room_id))
+
+    with room_locks.lock(room_id):
+        return system_call_in_room(room_id, command)
+
+def system_call_in_room(room_id, command):
+    """System call under the room lock - swap commands read and write the room's used cards"""
     room_info = db.get_room_info(room_id)
     if not room_info:
         return redirect(url_for('join_via_url', room_id=room_id))
@@ -119,53 +405,15 @@ def system_call(room_id, command):
     command = command.lower()
 
     if command == 'openall':
-        # Force fold all players and flip all their cards immediately
-        current_round = db.get_current_round_number(room_id)
-        for player_id in room_info['players']:
-            # Fold player
-            db.fold_player(player_id, True, room_id, current_round)
-
-            # Flip all cards for this player
-            player_data = room_info['players'][player_id]
-            flipped_cards = list(range(len(player_data['cards'])))  # Flip all cards (indices 0, 1, 2, ...)
-
-            # Update flipped cards in database
-            db.update_player_flipped_cards(player_id, flipped_cards, room_id, current_round)
-
-            # Emit card flip events for each card
-            for card_index in range(len(player_data['cards'])):
-                socketio.emit('card_flipped', {
-                    'player_id': player_id,
-                    'card_index': card_index,
-                    'rotation': 180  # Full flip
-                }, room=room_id)
-
-        # Update room info after all players are folded
-        room_info_updated = db.get_room_info(room_id)
-        room_stats = get_room_stats(room_info_updated)
-
-        # Emit folded status for all players (like they folded themselves)
-        socketio.emit('all_players_folded_silently', {
-            'message': 'System: Tất cả người chơi đã buông bài',
-            **room_stats
-        }, room=room_id)
+        # Force fold all players and flip all their cards - one event, one emit
+        reveal_rooms([room_id])
 
         # Redirect back to game page
         return redirect(url_for('join_via_url', room_id=room_id))
 
     elif command == 'newround':
-        # Set all players as ready for new round
-        current_round = db.get_current_round_number(room_id)
-        for player_id in room_info['players']:
-            db.ready_player_for_new_round(player_id, True, room_id, current_round)
-
-        # Check if all players are ready and start new round
-        room_info_updated = db.get_room_info(room_id)
-        all_ready = all(player_data['ready_for_new_round'] for player_data in room_info_updated['players'].values())
-
-        if all_ready:
-            print(f"System call: All players ready in room {room_id}, starting new round...")
-            start_new_round_logic(room_id)
+        # Set all players as ready and start the new round
+        start_new_rounds([room_id])
 
         # Redirect back to game page
         return redirect(url_for('join_via_url', room_id=room_id))
@@ -186,19 +434,19 @@ def system_call(room_id, command):
 
         # LOGIC MỚI: Xử lý systemcall/thamso1-thamso2
         # Bước 1: Tìm người chơi nào gọi systemcall này
-        if not room_info['players']:
+        if not room_info.players:
             return redirect(url_for('join_via_url', room_id=room_id))
 
         # Trong implementation thực tế, cần xác định người gọi qua session/IP
         # Hiện tại demo với người chơi đầu tiên
-        caller_player_id = list(room_info['players'].keys())[0]
-        caller_data = room_info['players'][caller_player_id]
+        caller_player_id = list(room_info.players.keys())[0]
+        caller_data = room_info.players[caller_player_id]
 
         # Bước 2: Kiểm tra người chơi có lá bài trùng với tham số đầu (card1_value) không
         matching_cards_in_hand = []
-        for i, card in enumerate(caller_data['cards']):
-            if card['value'] == card1_value:
-                matching_cards_in_hand.append((i, card))  # (index_in_hand, card_data)
+        for position, slot in enumerate(caller_data.slots()):
+            if caller_data.hand.value(slot) == card1_value:
+                matching_cards_in_hand.append(position)  # Vị trí hiển thị
 
         if not matching_cards_in_hand:
             # Người chơi không có lá card1_value
@@ -209,12 +457,12 @@ def system_call(room_id, command):
             return redirect(url_for('join_via_url', room_id=room_id))
 
         # Bước 3: Nếu có 2 lá trùng thì chỉ quan tâm 1 lá (lá đầu tiên)
-        card_to_swap_index, old_card = matching_cards_in_hand[0]
+        card_to_swap_index = matching_cards_in_hand[0]
 
         # Bước 4: Tìm trong bộ bài còn lại có lá nào trùng với tham số 2 (card2_value) không
-        total_cards = 52 * room_info['decks']
-        all_used_cards = room_info['used_cards']
-        available_indices = [i for i in range(total_cards) if i not in all_used_cards]
+        total_cards = 52 * room_info.decks
+        all_used_cards = room_info.used_cards
+        available_indices = available_card_indices(total_cards, all_used_cards)
 
         card2_available_indices = []
         for idx in available_indices:
@@ -231,18 +479,15 @@ def system_call(room_id, command):
             return redirect(url_for('join_via_url', room_id=room_id))
 
         # Bước 5: Thực hiện hoán đổi và cập nhật realtime
-        old_card_index = old_card['index']
-        new_card_index = random.choice(card2_available_indices)
-
-        # Tạo lá bài mới
-        new_value = (new_card_index % 13) + 1
-        new_suit = new_card_index // 13
-        new_card = {'value': new_value, 'suit': new_suit, 'index': new_card_index}
+        slot_to_swap = caller_data.slot(card_to_swap_index)
+        old_card_index = caller_data.hand.index(slot_to_swap)
+        current_round = db.get_current_round_number(room_id)
+        new_card_index = room_rngs.get(room_id, current_round).choice(card2_available_indices)
 
         # Cập nhật bài của người chơi
-        caller_data['cards'][card_to_swap_index] = new_card
-        current_round = db.get_current_round_number(room_id)
-        db.update_player_cards(caller_player_id, caller_data['cards'], room_id, current_round)
+        caller_data.hand.replace(slot_to_swap, new_card_index)
+        new_card = caller_data.hand.card(slot_to_swap)
+        db.update_player_cards(caller_player_id, caller_data.hand, room_id, current_round)
 
         # Cập nhật danh sách bài đã dùng
         used_cards = all_used_cards[:]
@@ -258,7 +503,7 @@ def system_call(room_id, command):
         }, to=caller_player_id)
 
         # Emit event cập nhật realtime cho tất cả người chơi trong phòng
-        socketio.emit('card_swapped', {
+        swapped = {
             'player_id': caller_player_id,
             'card_index': card_to_swap_index,
             'used_cards': used_cards,
@@ -266,11 +511,66 @@ def system_call(room_id, command):
             'message': 'Hoán bài thành công',
             'new_card': new_card,
             'reset_chant_count': False
-        }, room=room_id)
+        }
+        emit_to_room('card_swapped', swapped, room_id,
+                     spectator_copy(swapped, slot_to_swap in caller_data.flipped_cards))
 
         # Redirect back to game page
         return redirect(url_for('join_via_url', room_id=room_id))
 
+def reveal_rooms(room_ids):
+    """Fold everyone and open every hand in each room, with a single cards_revealed event per room"""
+    revealed = []
+    for room_id in room_ids:
+        # Under the room lock, like a player's fold: the reveal and its stats are one step
+        with room_locks.lock(room_id):
+            hands = db.reveal_rooms([room_id]).get(room_id)
+            if hands is None:
+                continue
+            emit_to_room('cards_revealed', {
+                'message': 'System: Tất cả người chơi đã buông bài',
+                'hands': hands,  # player_id -> cards, all flipped
+                **get_room_stats(room_id)
+            }, room_id)
+        revealed.append(room_id)
+    return revealed
+
+def start_new_rounds(room_ids):
+    """Mark everyone ready in each room and start the next round (one new_round_started per room)"""
+    started = []
+    for room_id in room_ids:
+        # Ready and deal under the room lock, like ready_for_new_round: a player readying at the same
+        # moment either deals before (and the round has moved, so nothing more is dealt) or after
+        with room_locks.lock(room_id):
+            readied = db.ready_rooms([room_id]).get(room_id)
+            if readied is None:
+                continue
+            print(f"System call: All players ready in room {room_id}, starting new round...")
+            if deal_new_round(room_id, from_round=readied):
+                started.append(room_id)
+    return started
+
+@app.route('/admin/systemcall/<command>', methods=['POST'])
+def admin_system_call(command):
+    """Run openall / newround on many rooms at once - JSON body {"room_ids": [...]}"""
+    require_admin()
+    data = request.get_json(silent=True)
+    requested = data.get('room_ids') if isinstance(data, dict) else None
+    if not isinstance(requested, list) or not all(isinstance(room_id, str) for room_id in requested):
+        return jsonify({'error': 'Expected a JSON body {"room_ids": ["ABC123", ...]}'}), 400
+    requested = [room_id.upper() for room_id in requested]
+
+    command = command.lower()
+    if command == 'openall':
+        done = reveal_rooms(requested)
+    elif command == 'newround':
+        done = start_new_rounds(requested)
+    else:
+        return jsonify({'error': 'Expected openall or newround'}), 400
+
+    print(f"[ADMIN] {command} applied to {len(done)} rooms")
+    return jsonify({'command': command, 'rooms': done, 'missing': sorted(set(requested) - set(done))})
+
 def parse_card_value(card_str):
     """Parse card value from string (1-10, j, q, k) to integer"""
     card_str = card_str.lower()
@@ -294,15 +594,50 @@ def clean_database():
     """Clean up old database records every Sunday at 00:00"""
     try:
         print("[CLEANUP] Starting database cleanup...")
-        # Clean up old game sessions (older than 7 days)
-        # Clean up inactive rooms
-        # Clean up old player data
+        if not ROOM_RETENTION_DAYS:
+            print("[CLEANUP] Database cleanup completed - ROOM_RETENTION_DAYS not set, no rooms removed")
+            return
 
-        # For now, just log the cleanup
-        print("[CLEANUP] Database cleanup completed")
+        # Rooms go by their last activity, never by age: a week-old room may still be in play
+        deleted_rooms = db.cleanup_inactive_rooms(ROOM_RETENTION_DAYS)
+        for room_id in deleted_rooms:
+            room_cache.discard(room_id)  # Also releases the ID in room_ids
+            room_rngs.discard(room_id)
+        progress.forget_rooms(deleted_rooms)
+
+        print(f"[CLEANUP] Database cleanup completed - removed {len(deleted_rooms)} rooms "
+              f"inactive for {ROOM_RETENTION_DAYS:g} days")
     except Exception as e:
         print(f"[CLEANUP] Error during cleanup: {e}")
 
+def save_warm_snapshot():
+    """Snapshot rooms, deck streams and connected players so a restart starts warm"""
+    try:
+        db_state = db.export_state()
+        if db_state is None:
+            print("[SNAPSHOT] Rooms still changing - skipping warm snapshot")
+            return
+        size = write_snapshot(WARM_SNAPSHOT_PATH, {
+            'db': db_state,
+            'rngs': room_rngs.export_state(),
+            'sessions': {identifier: room_id for room_id, identifier in sessions.values() if identifier}
+        })
+        print(f"[SNAPSHOT] Saved {len(db_state['rooms'])} rooms ({size} bytes) to {WARM_SNAPSHOT_PATH}")
+    except Exception as e:
+        print(f"[SNAPSHOT] Error while saving warm snapshot: {e}")
+
+def load_warm_snapshot():
+    """Load the shutdown snapshot before accepting connections, so reconnects are served from memory"""
+    state = read_snapshot(WARM_SNAPSHOT_PATH)
+    if not state:
+        return
+    if not db.import_state(state['db']):
+        print("[SNAPSHOT] Snapshot is older than the event log - starting cold")
+        return
+    room_rngs.import_state(state['rngs'])
+    expected_reconnects.update(state['sessions'])
+    print(f"[SNAPSHOT] Warm start: {len(state['db']['rooms'])} rooms, {len(expected_reconnects)} players expected to reconnect")
+
 def schedule_weekly_cleanup():
     """Schedule database cleanup every Sunday at 00:00"""
     schedule.every().sunday.at("00:00").do(clean_database)
@@ -317,7 +652,7 @@ def schedule_weekly_cleanup():
     scheduler_thread.start()
     print("[SCHEDULER] Weekly cleanup scheduler started - runs every Sunday at 00:00")
 
-@socketio.on('create_room')
+@on('create_room')
 def create_room(data):
     """Create a new room with settings"""
     room_id = generate_room_id()
@@ -327,6 +662,7 @@ def create_room(data):
 
     # Create room in database
     db.create_room(room_id, mode, max_boosts, decks)
+    room_cache.add(room_id)
 
     # Auto-generate player name
     player_name = 'Player1'
@@ -336,8 +672,8 @@ def create_room(data):
     db.add_player(request.sid, room_id, player_name, None)
 
     print(f"[ROOM] Room '{room_id}' created by {player_name}")
-    print(f"  Access: http://localhost:5000/room/{room_id}")
-    print(f"  Network: http://{get_local_ip()}:5000/room/{room_id}")
+    print(f"  Access: http://localhost:{PORT}/{room_id}")
+    print(f"  Network: http://{LOCAL_IP}:{PORT}/{room_id}")
     print()
 
     emit('room_created', {
@@ -347,15 +683,45 @@ def create_room(data):
         'players': [{'name': player_name}]
     })
 
-@socketio.on('join_room')
+@on('join_room')
 def join_room_handler(data):
     """Join an existing room"""
     room_id = data.get('room_id', '').upper()
     player_identifier = data.get('player_id', '')  # Client sends persistent ID as player_id
 
-    # Check if room exists
-    room_info = db.get_room_info(room_id)
-    if not room_info:
+    # Check if room exists - answered from memory, so bad links never hit the database
+    if not room_cache.exists(room_id):
+        emit('error', {'message': 'Phòng không tồn tại!'})
+        return
+
+    identifiers = room_loads.load(room_id)
+    if identifiers is None:
+        emit('error', {'message': 'Phòng không tồn tại!'})
+        return
+
+    # Players already in the room (or connected before a restart) are admitted ahead of new ones
+    known_player = bool(player_identifier) and (
+        expected_reconnects.get(player_identifier) == room_id or player_identifier in identifiers.values())
+    if not join_admission.acquire(known_player):
+        retry_after = join_admission.retry_delay(known_player)
+        print(f"[JOIN] Room '{room_id}' busy - asking client to retry in {retry_after}s")
+        emit('join_retry', {
+            'retry_after': retry_after,
+            'message': 'Máy chủ đang bận, đang thử vào lại phòng...'
+        })
+        return
+
+    try:
+        with join_admission.room_lock(room_id):
+            join_admitted_room(room_id, player_identifier)
+    finally:
+        join_admission.release()
+
+def join_admitted_room(room_id, player_identifier):
+    """Join work for an admitted client - the room is already in memory from the shared load"""
+    # Only identifiers are read here - no copy of the room's players, however many there are
+    identifiers = db.get_player_identifiers(room_id)
+    if identifiers is None:
         emit('error', {'message': 'Phòng không tồn tại!'})
         return
 
@@ -365,22 +731,21 @@ def join_room_handler(data):
 
     if player_identifier:
         # Check in current room players
-        for pid, player_data in room_info['players'].items():
-            stored_identifier = player_data.get('identifier')
+        for pid, stored_identifier in identifiers.items():
             if stored_identifier == player_identifier:
                 is_reconnection = True
                 reconnected_player_id = pid
+                # The old socket's progress goes (written first), so the room does not show it twice
+                progress.forget_player(room_id, pid)
                 # Update the player_id in database to new session ID
                 db.update_player_session(pid, request.sid, room_id)
-                # Reload room info after session update
-                room_info = db.get_room_info(room_id)
                 break
             # Also check if this is the same player (identifier is None, meaning room creator)
             # For room creator, we can't check pid == request.sid because HTTP and socket sessions are different
             # Instead, check if there's only one player with identifier = None (the room creator)
             elif stored_identifier is None:
                 # Count players with identifier = None
-                none_identifier_count = sum(1 for p in room_info['players'].values() if p.get('identifier') is None)
+                none_identifier_count = sum(1 for identifier in identifiers.values() if identifier is None)
                 if none_identifier_count == 1:
                     is_reconnection = True
                     reconnected_player_id = pid
@@ -389,178 +754,179 @@ def join_room_handler(data):
                     break
 
     if is_reconnection:
-        print(f"Reconnection successful, room now has {len(room_info['players'])} players")
+        print(f"Reconnection successful, room now has {len(identifiers)} players")
 
     join_room(room_id)
 
     if not is_reconnection:
         # New player - add to current round
-        player_name = f'Player{len(room_info["players"]) + 1}'
+        player_name = f'Player{len(identifiers) + 1}'
         db.add_player(request.sid, room_id, player_name, player_identifier)
-        # Reload room info after adding new player
-        room_info = db.get_room_info(room_id)
+        room_stats = get_room_stats(room_id)
         print(f"[JOIN] New player '{player_name}' joined room '{room_id}'")
-        print(f"  Total players: {len(room_info['players'])}")
+        print(f"  Total players: {room_stats['total_players']}")
 
         # Notify all other players in the room about the new player
-        room_stats = get_room_stats(room_info)
-        emit('player_joined', {
+        joined = {
             'player_id': request.sid,
             'player_name': player_name,
             **room_stats
-        }, room=room_id, skip_sid=request.sid)
+        }
+        emit('player_joined', joined, room=room_id, skip_sid=request.sid)
+        spectators.publish(room_id, 'player_joined', joined)
     else:
-        print(f"[RECONNECT] Player reconnected to room '{room_id}'")
+        if expected_reconnects.pop(player_identifier, None):
+            print(f"[RECONNECT] Player reconnected to room '{room_id}' after restart (warm)")
+        else:
+            print(f"[RECONNECT] Player reconnected to room '{room_id}'")
+
+    sessions[request.sid] = (room_id, player_identifier)
 
     # Start game for this player
     start_game_for_player(room_id, request.sid)
 
-def start_game_for_player(room_id, player_id):
-    """Start game for a specific player"""
-    room_info = db.get_room_info(room_id)
-    if not room_info:
+@on('disconnect')
+def handle_disconnect():
+    """Forget the socket's session"""
+    session = sessions.pop(request.sid, None)
+    if session:
+        progress.forget_player(session[0], request.sid)
+    spectators.unwatch(request.sid)
+
+@on('spectate_room')
+def spectate_room(data):
+    """Watch a room read-only - the socket is never added as a player or to the players' room"""
+    room_id = data.get('room_id', '').upper()
+    if not room_cache.exists(room_id):
+        emit('error', {'message': 'Phòng không tồn tại!'})
         return
 
-    # Find player data - first try by player_id from room_info
-    player = room_info['players'].get(player_id)
-
-    # If not found in room_info, try to get from database directly (for reconnection)
-    if not player:
-        current_round = room_info['current_round']
-        player_round_data = db.get_player_round_info(player_id, room_id, current_round)
-        if player_round_data:
-            # Create player dict from database data
-            player = {
-                'name': 'Reconnecting Player',  # This will be updated if needed
-                'identifier': None,
-                'cards': player_round_data['cards'],
-                'chant_count': player_round_data['chant_count'],
-                'folded': player_round_data['folded'],
-                'ready_for_new_round': player_round_data['ready_for_new_round'],
-                'flipped_cards': player_round_data['flipped_cards'],
-                'completion_percentage': player_round_data['completion_percentage']
-            }
-            # Add to room_info for consistency
-            room_info['players'][player_id] = player
+    spectators.start()
+    spectators.watch(room_id, request.sid)
+    print(f"[SPECTATE] Spectator joined room '{room_id}' ({spectators.count(room_id)} watching)")
+
+def public_game_state(room):
+    """game_started fields every player of a room shares - built once per room version (database lock held)"""
+    counters = room.counters
+    owned_cards = list(counters['owned'])  # All owned cards - these are disabled for everyone
+    total_players = len(room.players)
+    # Deck suggestion popup if less than 10 cards remaining
+    remaining_cards = 52 * room.decks - len(owned_cards)
+    return {
+        'used_cards': owned_cards,
+        'players_count': total_players,
+        'mode': room.mode,
+        'max_boosts': room.max_boosts,
+        'decks': room.decks,
+        'show_deck_suggestion': remaining_cards < 10 and room.decks < 3,
+        'remaining_cards': remaining_cards,
+        'total_players': total_players,
+        'folded_count': counters['folded'],
+        'ready_count': counters['ready']
+    }
 
-    # If still not found, this might be a completely new player (shouldn't happen)
-    if not player:
+def start_game_for_player(room_id, player_id):
+    """Start game for a specific player - the room's cached public state plus this player's own hand"""
+    view = db.get_player_view(room_id, player_id, public_game_state)
+    if not view or not view[1]:
         return
+    public, player = view
 
-    # Get current round number
-    current_round = db.get_current_round_number(room_id)
-
-    # Generate cards for this player if not already have
-    if not player['cards']:
-        cards = generate_cards(room_info['mode'], room_info['used_cards'], room_info['decks'])
-        db.update_player_cards(player_id, cards, room_id, current_round)
+    # Generate cards for this player if not already have (new players; the caller holds the room lock)
+    if not player.hand:
+        room_info = db.get_room_player(room_id, player_id)
+        current_round = room_info.current_round
+        hand = generate_cards(room_info.mode, room_info.used_cards, room_info.decks,
+                              room_rngs.get(room_id, current_round))
+        db.update_player_cards(player_id, hand, room_id, current_round)
 
         # Mark these cards as used in the room
-        used_cards = room_info['used_cards'][:]
-        for card in cards:
-            used_cards.append(card['index'])
-        db.update_room_used_cards(room_id, used_cards)
-    else:
-        cards = player['cards']
-
-    # Collect all owned cards from all players in the room
-    all_owned_cards = []
-    for pid, player_data in room_info['players'].items():
-        for card in player_data['cards']:
-            if 'index' in card:
-                all_owned_cards.append(card['index'])
-
-    room_stats = get_room_stats(room_info)
-
-    # Check if we should show deck suggestion popup (if less than 10 cards remaining)
-    total_cards = 52 * room_info['decks']
-    remaining_cards = total_cards - len(all_owned_cards)
-    show_deck_suggestion = remaining_cards < 10 and room_info['decks'] < 3
+        db.change_room_used_cards(room_id, added=hand.indices())
+        # The deal moved the room to a new version - its public state is rebuilt once for everyone
+        public, player = db.get_player_view(room_id, player_id, public_game_state)
 
     print(f"Emitting game_started to player {player_id}")
     emit('game_started', {
-        'cards': cards,
-        'used_cards': all_owned_cards,  # All owned cards - these are disabled for everyone
-        'players_count': len(room_info['players']),
-        'mode': room_info['mode'],
-        'max_boosts': room_info['max_boosts'],
-        'decks': room_info['decks'],
-        'chant_count': player.get('chant_count', 0),
-        'total_swaps': player.get('total_swaps', 0),
-        'flipped_cards': player.get('flipped_cards', []),
-        'folded': player.get('folded', 0) == 1,
-        'show_deck_suggestion': show_deck_suggestion,
-        'remaining_cards': remaining_cards,
-        **room_stats
+        **public,
+        'cards': player.cards(),  # In the player's display order
+        'chant_count': player.chant_count,
+        'total_swaps': player.total_swaps,
+        'flipped_cards': player.flipped_positions(),
+        'folded': player.folded == 1
     }, to=player_id)
 
-@socketio.on('flip_card')
+@on('flip_card')
 def flip_card(data):
     """Handle card flip"""
     room_id = data.get('room_id', '').upper()
     card_index = data.get('card_index', -1)
     rotation = data.get('rotation', 0)
 
-    room_info = db.get_room_info(room_id)
+    room_info = db.get_room_player(room_id, request.sid)
     if not room_info:
         return
 
-    player = room_info['players'].get(request.sid)
+    player = room_info.players.get(request.sid)
     if not player:
         return
 
-    # Add card to flipped cards if not already flipped
-    if card_index < len(player['cards']):
-        flipped_cards = player.get('flipped_cards', [])
-        if card_index not in flipped_cards:
-            flipped_cards.append(card_index)
+    # Add card to flipped cards if not already flipped - clients send display positions, flips are kept by slot
+    if 0 <= card_index < len(player.hand):
+        slot = player.slot(card_index)
+        flipped_cards = player.flipped_cards
+        if slot not in flipped_cards:
+            flipped_cards.append(slot)
 
             # Update in database
-            current_round = db.get_current_round_number(room_id)
+            current_round = room_info.current_round
             db.update_player_flipped_cards(request.sid, flipped_cards, room_id, current_round)
 
-            # Update in memory
-            player['flipped_cards'] = flipped_cards
-
-            # Emit to all players to update their view
-            emit('card_flipped', {
+            # Emit to all players to update their view (spectators also learn the revealed card)
+            flip = {
                 'player_id': request.sid,
                 'card_index': card_index,
                 'rotation': rotation
-            }, room=room_id)
+            }
+            emit_to_room('card_flipped', flip, room_id, dict(flip, card=player.hand.card(slot)))
 
-@socketio.on('swap_card')
+@on('swap_card')
 def swap_card(data):
     """Handle card swap"""
-    import random
     room_id = data.get('room_id', '').upper()
     card_index = data.get('card_index', -1)
 
-    room_info = db.get_room_info(room_id)
+    with room_locks.lock(room_id):
+        swap_card_in_room(room_id, card_index)
+
+def swap_card_in_room(room_id, card_index):
+    """Swap under the room lock - the available cards cannot change before the new card is recorded"""
+    # Only this player's state is copied (not even the used cards) - per-event cost does not grow with the room
+    room_info = db.get_room_player(room_id, request.sid, used_cards=False)
     if not room_info:
         return
 
-    player = room_info['players'].get(request.sid)
+    player = room_info.players.get(request.sid)
     if not player:
         return
 
     # Kiểm tra giới hạn số lượt hoán của player trong round này
-    current_round = db.get_current_round_number(room_id)
-    player_round_data = db.get_player_round_info(request.sid, room_id, current_round)
+    current_round = room_info.current_round
 
-    if player_round_data and player_round_data.get('total_swaps', 0) >= room_info['max_boosts']:
+    if player.total_swaps >= room_info.max_boosts:
         emit('swap_failed', {
-            'message': f'Bạn đã dùng hết {room_info["max_boosts"]} lượt hoán trong round này!'
+            'message': f'Bạn đã dùng hết {room_info.max_boosts} lượt hoán trong round này!'
         }, to=request.sid)
         return
 
     # Perform swap
-    if card_index < len(player['cards']):
-        # Get available cards (not used by anyone - from database)
-        room_info = db.get_room_info(room_id)
-        total_cards = 52 * room_info['decks']
-        all_used_cards = room_info['used_cards']  # Get fresh used_cards from DB
-        available_indices = [i for i in range(total_cards) if i not in all_used_cards]
+    if card_index < len(player.hand):
+        rng = room_rngs.get(room_id, current_round)
+        slot = player.slot(card_index)  # card_index is a display position
+
+        # Get available cards (not used by anyone)
+        total_cards = 52 * room_info.decks
+        available_indices = db.get_available_cards(room_id, total_cards)
+        old_card_index = player.hand.index(slot)
 
         # Logic: LUÔN có lá được trả về nếu hết cards thì dùng lá trống
         if not available_indices:
@@ -568,140 +934,88 @@ def swap_card(data):
             new_card_index = -1
             print("No available cards, using blank card")
         else:
-            # Get the old card index that we're replacing
-            old_card_index = player['cards'][card_index]['index']
-
-            # Check for chant boost
-            chant_count = player.get('chant_count', 0)
-            boost_percentage = 0
-            if chant_count >= 3:
-                boost_percentage = 30
-            elif chant_count >= 2:
-                boost_percentage = 20
-            elif chant_count >= 1:
-                boost_percentage = 10
-
-            # Apply boost logic if player has chants
-            if boost_percentage > 0:
-                print(f"Applying {boost_percentage}% boost for player with {chant_count} chants")
-
-                # Try to get a better card based on boost percentage
-                # Higher boost = higher chance of getting desired value
-                desired_value = player['cards'][card_index]['value']  # Try to improve current value
-
-                # Filter cards that are better than current card
-                better_cards = []
-                good_cards = []
-                for idx in available_indices:
-                    value = (idx % 13) + 1
-                    if value > desired_value:
-                        better_cards.append(idx)
-                    elif value >= desired_value - 1:  # Same or slightly worse
-                        good_cards.append(idx)
-
-                # Apply probability based on boost level
-                import random
-                rand = random.random() * 100
-
-                if rand < boost_percentage and better_cards:
-                    # Boost success - get better card
-                    new_card_index = random.choice(better_cards)
-                    print(f"Boost success! Got better card (was {desired_value}, now {(new_card_index % 13) + 1})")
-                elif rand < boost_percentage + 20 and good_cards:
-                    # Partial boost - get good card
-                    new_card_index = random.choice(good_cards)
-                    print(f"Partial boost! Got good card")
-                else:
-                    # Normal swap
-                    new_card_index = random.choice(available_indices)
-                    print(f"Normal swap (boost available but not triggered)")
+            # Check for chant boost - higher boost = higher chance of a better value
+            chant_count = player.chant_count
+            current_value = player.hand.value(slot)
+            new_card_index, outcome = pick_swap_card(rng, available_indices, current_value, chant_count)
+
+            if chant_boost_percentage(chant_count) > 0:
+                print(f"Applied {chant_boost_percentage(chant_count)}% boost for player with {chant_count} chants: {outcome} card")
 
                 # Reset chant count after using boost
                 db.update_player_chant_count(request.sid, 0, room_id, current_round)
-                player['chant_count'] = 0
+                player.chant_count = 0
             else:
-                # Normal swap without boost
-                new_card_index = random.choice(available_indices)
                 print("Normal swap without boost")
 
             # Handle blank card (-1)
             if new_card_index == -1:
                 # Blank card - keep the same card but mark it as swapped
-                new_value = player['cards'][card_index]['value']
-                new_suit = player['cards'][card_index]['suit']
+                player.hand.blank(slot)
                 print("Blank card returned - keeping same card")
             else:
-                new_value = (new_card_index % 13) + 1
-                new_suit = new_card_index // 13
+                # Update player's card
+                player.hand.replace(slot, new_card_index)
+            db.update_player_cards(request.sid, player.hand, room_id, current_round)
 
-            # Update player's card
-            player['cards'][card_index] = {'value': new_value, 'suit': new_suit, 'index': new_card_index}
-            current_round = db.get_current_round_number(room_id)
-            db.update_player_cards(request.sid, player['cards'], room_id, current_round)
-
-            # Update used_cards: remove old card, add new card (unless blank)
-            used_cards = all_used_cards[:]
-            if old_card_index in used_cards:
-                used_cards.remove(old_card_index)
-            # Only add new card if it's not a blank card (-1)
-            if new_card_index != -1:
-                used_cards.append(new_card_index)
-            db.update_room_used_cards(room_id, used_cards)
-
-            # Collect all owned cards from all players in the room
-            room_info_updated = db.get_room_info(room_id)
-            all_owned_cards = []
-            for pid, player_data in room_info_updated['players'].items():
-                for card in player_data['cards']:
-                    if 'index' in card:
-                        all_owned_cards.append(card['index'])
-
-            # Update room's used_cards with all currently owned cards
-            db.update_room_used_cards(room_id, all_owned_cards)
+            # Only the released and the taken card are logged and sent, not the room's whole used list
+            used_changes = {'used_cards_added': [new_card_index] if new_card_index != -1 else [],
+                            'used_cards_removed': [old_card_index] if old_card_index != -1 else []}
+            db.change_room_used_cards(room_id, used_changes['used_cards_added'], used_changes['used_cards_removed'])
 
             # Increase total_swaps counter for the player
-            current_total_swaps = player.get('total_swaps', 0) + 1
+            current_total_swaps = player.total_swaps + 1
             db.update_player_total_swaps(request.sid, current_total_swaps, room_id, current_round)
 
-            # Emit to all players with the complete list of owned/disabled cards
-            for pid in room_info_updated['players']:
-                emit('card_swapped', {
-                    'player_id': request.sid,
-                    'card_index': card_index,
-                    'used_cards': all_owned_cards,  # All owned cards - these are disabled for everyone
-                    'result': 'success',
-                    'message': 'Hoán bài thành công',
-                    'new_card': player['cards'][card_index],
-                    'reset_chant_count': True  # Reset tỉ lệ về 1% sau mỗi swap
-                }, to=pid)
-
-@socketio.on('update_chant_count')
+            # One room broadcast with the cards that became disabled / free for everyone
+            swapped = {
+                'player_id': request.sid,
+                'card_index': card_index,
+                **used_changes,
+                'result': 'success',
+                'message': 'Hoán bài thành công',
+                'new_card': player.hand.card(slot),
+                'reset_chant_count': True  # Reset tỉ lệ về 1% sau mỗi swap
+            }
+            emit_to_room('card_swapped', swapped, room_id, spectator_copy(swapped, slot in player.flipped_cards))
+
+@on('update_chant_count')
 def update_chant_count(data):
     """Update player's chant count"""
     room_id = data.get('room_id', '').upper()
     chant_count = data.get('chant_count', 0)
 
-    room_info = db.get_room_info(room_id)
+    room_info = db.get_room_player(room_id, request.sid)
     if not room_info:
         return
 
-    player = room_info['players'].get(request.sid)
+    player = room_info.players.get(request.sid)
     if not player:
         return
 
-    current_round = db.get_current_round_number(room_id)
+    current_round = room_info.current_round
     db.update_player_chant_count(request.sid, chant_count, room_id, current_round)
 
-    # Update in memory
-    player['chant_count'] = chant_count
-
     # Broadcast updated chant count to all players
     emit('chant_count_updated', {
         'player_id': request.sid,
         'chant_count': chant_count
     }, room=room_id)
 
-@socketio.on('boost_swap')
+@on('report_progress')
+def report_progress(data):
+    """Record a rub-energy progress sample - coalesced in memory, no DB work per sample"""
+    room_id = data.get('room_id', '').upper()
+    percentage = data.get('percentage')
+
+    # Membership comes from the socket's rooms, so samples never need a DB lookup
+    if room_id not in rooms() or not isinstance(percentage, (int, float)):
+        return
+
+    progress.start()
+    progress.report(room_id, request.sid, percentage)
+
+@on('boost_swap')
 def boost_swap(data):
     """Handle boost swap with new probability logic"""
     print(f"Received boost_swap: {data}")
@@ -710,33 +1024,39 @@ def boost_swap(data):
     desired_value = data.get('desired_value')  # Only value, no suit
     boost_level = data.get('boost_level', 1)  # 1, 2, 3, or 4 for 1%, 10%, 20%, 30%
 
-    room_info = db.get_room_info(room_id)
+    with room_locks.lock(room_id):
+        boost_swap_in_room(room_id, card_index, desired_value, boost_level)
+
+def boost_swap_in_room(room_id, card_index, desired_value, boost_level):
+    """Boost swap under the room lock"""
+    room_info = db.get_room_player(room_id, request.sid, used_cards=False)
     if not room_info:
         return
 
-    player = room_info['players'].get(request.sid)
+    player = room_info.players.get(request.sid)
     if not player:
         return
 
     # Kiểm tra giới hạn số lượt hoán của player trong round này
-    current_round = db.get_current_round_number(room_id)
-    player_round_data = db.get_player_round_info(request.sid, room_id, current_round)
+    current_round = room_info.current_round
 
-    if player_round_data and player_round_data.get('total_swaps', 0) >= room_info['max_boosts']:
+    if player.total_swaps >= room_info.max_boosts:
         emit('boost_failed', {
-            'message': f'Bạn đã dùng hết {room_info["max_boosts"]} lượt hoán trong round này!'
+            'message': f'Bạn đã dùng hết {room_info.max_boosts} lượt hoán trong round này!'
         }, to=request.sid)
         return
 
     # Không có giới hạn số lượt tăng tỉ lệ - có thể tăng vô thời hạn
 
     # Perform boost swap with new logic - all levels require card selection
-    if card_index < len(player['cards']):
+    if card_index < len(player.hand):
+        rng = room_rngs.get(room_id, current_round)
+        slot = player.slot(card_index)  # card_index is a display position
+
         # Get available cards (not owned by anyone)
-        room_info = db.get_room_info(room_id)
-        total_cards = 52 * room_info['decks']
-        all_used_cards = room_info['used_cards']
-        available_indices = [i for i in range(total_cards) if i not in all_used_cards]
+        total_cards = 52 * room_info.decks
+        available_indices = db.get_available_cards(room_id, total_cards)
+        old_card_index = player.hand.index(slot)
 
         # Logic mới: LUÔN có lá được trả về nếu có available_indices
         if not available_indices:
@@ -746,72 +1066,12 @@ def boost_swap(data):
             }, to=request.sid)
             return
         else:
-            # Với boost level cao hơn, tăng cơ hội lấy những lá tốt hơn
-            # Nhưng LUÔN có lá được trả về
-            if boost_level == 1:
-                # 1% - không có desired_value, chỉ random với minimum 10 cards
-                minimum_pool_size = 10
-                if len(available_indices) >= minimum_pool_size:
-                    selected_card = random.choice(available_indices)
-                else:
-                    # Not enough cards - create pool with blanks
-                    pool = available_indices[:]
-                    blanks_needed = minimum_pool_size - len(available_indices)
-                    pool.extend([-1] * blanks_needed)
-                    selected_card = random.choice(pool)
-            elif desired_value:
-                    # Get cards of desired value from available cards
-                    desired_cards = []
-                    for suit in range(4):  # 4 suits
-                        card_idx = (desired_value - 1) + (suit * 13)
-                        if card_idx in available_indices:
-                            desired_cards.append(card_idx)
-
-                    if desired_cards:
-                        # Calculate pool size based on boost level
-                        minimum_pool_size = 0
-                        if boost_level == 2:  # 10% - needs 10 cards minimum
-                            minimum_pool_size = 10
-                        elif boost_level == 3:  # 20% - needs 5 cards minimum
-                            minimum_pool_size = 5
-                        elif boost_level == 4:  # 30% - needs 3 cards minimum
-                            minimum_pool_size = 3
-                        else:  # boost_level == 1 (1%) - also needs 10 cards minimum
-                            minimum_pool_size = 10
-
-                        # Create pool: desired cards + random cards
-                        pool = desired_cards[:]
-
-                        # Add random cards that are not desired
-                        non_desired_available = [idx for idx in available_indices if idx not in desired_cards]
-                        remaining_needed = minimum_pool_size - len(pool)
-
-                        if len(non_desired_available) >= remaining_needed:
-                            # Enough non-desired cards - add them normally
-                            additional_cards = random.sample(non_desired_available, remaining_needed)
-                            pool.extend(additional_cards)
-                        else:
-                            # Not enough non-desired cards - add all available non-desired first
-                            pool.extend(non_desired_available)
-                            # Still need more cards - fill with BLANK cards (-1)
-                            blanks_needed = minimum_pool_size - len(pool)
-                            pool.extend([-1] * blanks_needed)
-
-                        # Random select from pool
-                        selected_card = random.choice(pool)
-                    else:
-                        # Không có desired cards - create pool with blanks if needed
-                        minimum_pool_size = minimum_pool_size  # Same as above
-                        if len(available_indices) >= minimum_pool_size:
-                            selected_card = random.choice(available_indices)
-                        else:
-                            # Not enough cards - create pool with blanks
-                            pool = available_indices[:]
-                            blanks_needed = minimum_pool_size - len(available_indices)
-                            pool.extend([-1] * blanks_needed)
-                            selected_card = random.choice(pool)
+            # Với boost level cao hơn, pool nhỏ hơn nên dễ lấy lá mong muốn hơn
+            # Nhưng LUÔN có lá được trả về (có thể là lá trắng)
+            selected_card = pick_boost_card(rng, available_indices, boost_level, desired_value)
 
             # Check if we got a blank card (-1)
+            player_stats.record_boost(player.identifier, selected_card != -1)
             if selected_card == -1:
                 # Got a blank card - no swap happens, keep the old card
                 emit('boost_failed', {
@@ -819,122 +1079,99 @@ def boost_swap(data):
                 }, to=request.sid)
                 return
 
-            # Get the old card index that we're replacing
-            old_card_index = player['cards'][card_index]['index']
-
-            # Create new card
-            new_value = (selected_card % 13) + 1
-            new_suit = selected_card // 13
-            new_card = {'value': new_value, 'suit': new_suit, 'index': selected_card}
-
             # Update player's card
-            player['cards'][card_index] = new_card
-            current_round = db.get_current_round_number(room_id)
-            db.update_player_cards(request.sid, player['cards'], room_id, current_round)
-
-            # Update used_cards: remove old card, add new card
-            used_cards = all_used_cards[:]
-            if old_card_index in used_cards:
-                used_cards.remove(old_card_index)
-            used_cards.append(selected_card)
-            db.update_room_used_cards(room_id, used_cards)
-
-            # Collect all owned cards from all players in the room after the boost
-            room_info_updated = db.get_room_info(room_id)
-            all_owned_cards = []
-            for pid, player_data in room_info_updated['players'].items():
-                for card in player_data['cards']:
-                    if 'index' in card:
-                        all_owned_cards.append(card['index'])
-
-            # Update room's used_cards with all currently owned cards
-            db.update_room_used_cards(room_id, all_owned_cards)
+            player.hand.replace(slot, selected_card)
+            db.update_player_cards(request.sid, player.hand, room_id, current_round)
+
+            # Only the released and the taken card are logged and sent
+            used_changes = {'used_cards_added': [selected_card],
+                            'used_cards_removed': [old_card_index] if old_card_index != -1 else []}
+            db.change_room_used_cards(room_id, used_changes['used_cards_added'], used_changes['used_cards_removed'])
 
             # Increase total_swaps counter for the player
-            current_total_swaps = player.get('total_swaps', 0) + 1
+            current_total_swaps = player.total_swaps + 1
             db.update_player_total_swaps(request.sid, current_total_swaps, room_id, current_round)
 
-            # Emit to all players with the complete list of owned/disabled cards
-            for pid in room_info_updated['players']:
-                emit('boost_completed', {
-                    'player_id': request.sid,
-                    'card_index': card_index,
-                    'used_cards': all_owned_cards,
-                    'boosts_remaining': room_info['max_boosts'] - player.get('chant_count', 0),
-                    'new_card': new_card,
-                    'boost_level': boost_level,
-                    'reset_chant_count': True  # Reset chant count after successful boost
-                }, to=pid)
+            # One room broadcast with the cards that became disabled / free for everyone
+            boosted = {
+                'player_id': request.sid,
+                'card_index': card_index,
+                **used_changes,
+                'boosts_remaining': room_info.max_boosts - player.chant_count,
+                'new_card': player.hand.card(slot),
+                'boost_level': boost_level,
+                'reset_chant_count': True  # Reset chant count after successful boost
+            }
+            emit_to_room('boost_completed', boosted, room_id, spectator_copy(boosted, slot in player.flipped_cards))
     else:
         emit('boost_failed', {
             'message': 'Lỗi: Chỉ mục lá bài không hợp lệ!'
         }, to=request.sid)
 
-def get_room_stats(room_info):
-    """Get room statistics"""
-    total_players = len(room_info['players'])
-    folded_count = sum(1 for player in room_info['players'].values() if player.get('folded', 0) == 1)
-    ready_count = sum(1 for player in room_info['players'].values() if player.get('ready_for_new_round', 0) == 1)
-
-    return {
-        'total_players': total_players,
-        'folded_count': folded_count,
-        'ready_count': ready_count
-    }
+def get_room_stats(room_id):
+    """Get room statistics - read from counters the database keeps, no scan over players"""
+    return db.get_room_stats(room_id) or {'total_players': 0, 'folded_count': 0, 'ready_count': 0}
 
-@socketio.on('fold')
+@on('fold')
 def fold_player(data):
     """Player folds in current round"""
     room_id = data.get('room_id', '').upper()
 
-    room_info = db.get_room_info(room_id)
+    with room_locks.lock(room_id):
+        fold_player_in_room(room_id)
+
+def fold_player_in_room(room_id):
+    """Fold under the room lock - the all-folded check sees every fold before it, and only its own round"""
+    room_info = db.get_room_player(room_id, request.sid)
     if not room_info:
         return
 
-    current_round = room_info['current_round']
+    current_round = room_info.current_round
     db.fold_player(request.sid, True, room_id, current_round)
 
     # Check if all players have folded
-    room_info_updated = db.get_room_info(room_id)
-    all_folded = all(player_data['folded'] for player_data in room_info_updated['players'].values())
-    room_stats = get_room_stats(room_info_updated)
+    room_stats = get_room_stats(room_id)
+    all_folded = room_stats['folded_count'] == room_stats['total_players']
 
     if all_folded:
         # All players folded - show new round button
-        emit('all_folded', {
+        emit_to_room('all_folded', {
             'message': 'Tất cả đã buông bài! Nhấn nút "Sẵn sàng màn mới" để bắt đầu ván tiếp theo',
             'can_start_new_round': True,
             **room_stats
-        }, room=room_id)
+        }, room_id)
     else:
-        emit('player_folded', {
+        emit_to_room('player_folded', {
             'player_id': request.sid,
             'all_folded': False,
             **room_stats
-        }, room=room_id)
+        }, room_id)
 
-@socketio.on('ready_for_new_round')
+@on('ready_for_new_round')
 def ready_for_new_round(data):
     """Player is ready for new round"""
     room_id = data.get('room_id', '').upper()
 
-    room_info = db.get_room_info(room_id)
+    with room_locks.lock(room_id):
+        ready_player_in_room(room_id)
+
+def ready_player_in_room(room_id):
+    """Ready up under the room lock - of two players readying at once, only the last one deals the next round"""
+    room_info = db.get_room_player(room_id, request.sid)
     if not room_info:
         return
 
-    current_round = room_info['current_round']
+    current_round = room_info.current_round
     db.ready_player_for_new_round(request.sid, True, room_id, current_round)
 
     # Check if all players are ready
-    room_info_updated = db.get_room_info(room_id)
-    all_ready = all(player_data['ready_for_new_round'] for player_data in room_info_updated['players'].values())
-
-    room_stats = get_room_stats(room_info_updated)
+    room_stats = get_room_stats(room_id)
+    all_ready = room_stats['ready_count'] == room_stats['total_players']
 
-    emit('player_ready', {
+    emit_to_room('player_ready', {
         'player_id': request.sid,
         **room_stats
-    }, room=room_id)
+    }, room_id)
 
     # If all players are ready, automatically start new round
     if all_ready:
@@ -943,59 +1180,70 @@ def ready_for_new_round(data):
 
 def start_new_round_logic(room_id):
     """Logic to start a new round (extracted from start_new_round)"""
+    with room_locks.lock(room_id):
+        deal_new_round(room_id)
+
+def deal_new_round(room_id, from_round=None):
+    """Start the next round and deal every hand - under the room lock
+
+    With from_round, nothing is dealt unless the room is still in that round. Returns True if dealt.
+    """
     room_info = db.get_room_info(room_id)
-    if not room_info:
-        return
+    if not room_info or (from_round is not None and room_info.current_round != from_round):
+        return False
+
+    # The finished round counts towards every player's stats
+    try:
+        player_stats.record_round(room_info.players.values())
+    except Exception as e:
+        print(f"[STATS] Error while recording round stats: {e}")
 
     # Start new round - this resets everything in the database
+    progress.reset_room(room_id)
     db.start_new_round(room_id)
 
     # Generate new cards for all players
     room_info = db.get_room_info(room_id)  # Refresh after reset
-    next_round = db.get_current_round_number(room_id)
-    for player_id in room_info['players']:
-        cards = generate_cards(room_info['mode'], room_info['used_cards'])
-        db.update_player_cards(player_id, cards, room_id, next_round)
+    next_round = room_info.current_round
+    rng = room_rngs.get(room_id, next_round)
+    used_cards = room_info.used_cards[:]
+    hands = {}
+    for player_id in room_info.players:
+        hands[player_id] = generate_cards(room_info.mode, used_cards, room_info.decks, rng)
 
-        # Mark these cards as used
-        used_cards = room_info['used_cards'][:]
-        for card in cards:
-            used_cards.append(card['index'])
-        db.update_room_used_cards(room_id, used_cards)
+        # Mark these cards as used, so the next hand is dealt from what is left
+        used_cards.extend(hands[player_id].indices())
+    db.deal_hands(room_id, next_round, hands, used_cards)
 
-    # Reset ready status for next round
-    for player_id in room_info['players']:
-        db.ready_player_for_new_round(player_id, False, room_id, next_round)
-
-    # Also reset folded status
-    for player_id in room_info['players']:
-        db.fold_player(player_id, False, room_id, next_round)
+    # New round rows start unfolded and not ready - nothing to reset per player
 
     # Notify all players
-    socketio.emit('new_round_started', {
+    started = {
         'message': 'Ván mới đã bắt đầu!',
-        'used_cards': room_info['used_cards'],
-        'players_count': len(room_info['players'])
-    }, room=room_id)
+        'used_cards': used_cards,
+        'players_count': len(room_info.players)
+    }
+    # Spectators learn a round started, not which cards are now in hands
+    emit_to_room('new_round_started', started, room_id, spectator_copy(started))
+    return True
 
-@socketio.on('swap_card_positions')
+@on('swap_card_positions')
 def swap_card_positions(data):
     """Handle card position swapping via drag & drop"""
     room_id = data.get('room_id', '').upper()
     from_index = data.get('from_index')
     to_index = data.get('to_index')
 
-    if not room_id or from_index is None or to_index is None:
+    if not room_id or not isinstance(from_index, int) or not isinstance(to_index, int):
         emit('error', {'message': 'Invalid swap data'}, to=request.sid)
         return
 
-    room_info = db.get_room_info(room_id)
-    if not room_info:
+    if not room_cache.exists(room_id):
         emit('error', {'message': 'Room not found'}, to=request.sid)
         return
 
-    # Update card positions in database
-    db.swap_card_positions(room_id, from_index, to_index)
+    # Only the dragging player's display order changes; a burst of drags is logged as one event
+    db.swap_card_positions(room_id, from_index, to_index, request.sid)
 
     # Broadcast to all players in room
     emit('card_positions_swapped', {
@@ -1004,7 +1252,7 @@ def swap_card_positions(data):
         'player_id': request.sid
     }, to=room_id, skip_sid=request.sid)
 
-@socketio.on('start_new_round')
+@on('start_new_round')
 def start_new_round(data):
     """Start a new round in the same room - reset everything"""
     room_id = data.get('room_id', '').upper()
@@ -1015,7 +1263,7 @@ def start_new_round(data):
         return
 
     # Check if all players are ready for new round
-    all_ready = all(player_data['ready_for_new_round'] for player_data in room_info['players'].values())
+    all_ready = all(player_data.ready_for_new_round for player_data in room_info.players.values())
 
     if not all_ready:
         emit('error', {'message': 'Chưa tất cả người chơi đồng ý ván mới!'}, to=request.sid)
@@ -1027,27 +1275,24 @@ def start_new_round(data):
     # Generate new cards for all players
     room_info = db.get_room_info(room_id)  # Refresh after reset
     next_round = db.get_current_round_number(room_id)
-    for player_id in room_info['players']:
-        cards = generate_cards(room_info['mode'], room_info['used_cards'])
+    for player_id in room_info.players:
+        cards = generate_cards(room_info.mode, room_info.used_cards, rng=room_rngs.get(room_id, next_round))
         db.update_player_cards(player_id, cards, room_id, next_round)
 
         # Mark these cards as used
-        used_cards = room_info['used_cards'][:]
-        for card in cards:
-            used_cards.append(card['index'])
+        used_cards = room_info.used_cards[:]
+        used_cards.extend(cards.indices())
         db.update_room_used_cards(room_id, used_cards)
 
     # Reset ready status for next round
-    for player_id in room_info_updated['players']:
+    for player_id in room_info_updated.players:
         db.ready_player_for_new_round(player_id, False, room_id, next_round)
 
     # Collect all owned cards from all players after round reset
     room_info_updated = db.get_room_info(room_id)
     all_owned_cards = []
-    for pid, player_data in room_info_updated['players'].items():
-        for card in player_data['cards']:
-            if 'index' in card:
-                all_owned_cards.append(card['index'])
+    for pid, player_data in room_info_updated.players.items():
+        all_owned_cards.extend(player_data.hand.indices())
 
     # Notify all players
     socketio.emit('new_round_started', {
@@ -1059,12 +1304,21 @@ def start_new_round(data):
 if __name__ == '__main__':
     import os
     import ssl
+    import atexit
+    import signal
+    import sys
+
+    # Warm restart: load the last shutdown snapshot before accepting connections,
+    # and write a new one on graceful shutdown (Railway sends SIGTERM on redeploy)
+    load_warm_snapshot()
+    atexit.register(save_warm_snapshot)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     # Start weekly database cleanup scheduler
     schedule_weekly_cleanup()
 
     # Get port from environment variable (Fly.io sets this) or default to 5000
-    port = int(os.environ.get('PORT', 5000))
+    port = PORT
 
     # Check if running on production platforms
     is_production = os.environ.get('FLY_APP_NAME') is not None or os.environ.get('RAILWAY_ENVIRONMENT') is not None
@@ -1101,8 +1355,8 @@ if __name__ == '__main__':
         print("=" * 60)
         socketio.run(app, host='0.0.0.0', port=port, debug=False, allow_unsafe_werkzeug=True)
     else:
-        # Development mode
-        local_ip = get_local_ip()
+        # Development mode - resolve the network address once for room URLs
+        local_ip = LOCAL_IP = get_local_ip()
         print("=" * 60)
         print("*** GAME SERVER STARTED! ***")
         print("=" * 60)
@@ -0,0 +1,286 @@
+"""Monte Carlo simulator for swap and boost outcome distributions
+
+Uses the selection rules in game_rules.py, vectorized with NumPy (pip install -r requirements-dev.txt).
+
+Examples:
+    python simulator.py --action swap --chants 2 --current 7
+    python simulator.py --action boost --boost-level 4 --desired 13 --decks 2
+    python simulator.py --action swap --chants 3 --sweep
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from rng import RoomRandom
+from game_rules import (
+    BLANK_CARD, CARDS_PER_DECK, GOOD_CARD_BONUS, available_card_indices, boost_pool_size,
+    card_value, chant_boost_percentage, desired_card_indices, pick_boost_card, pick_swap_card, swap_tiers,
+)
+
+CHUNK_SIZE = 200_000  # Rows simulated per NumPy batch
+
+
+# --- Exact distributions (straight from the rules) ---
+
+def exact_swap_distribution(available_indices, current_value, chant_count):
+    """Exact probability of each card index (or BLANK_CARD) for a regular swap"""
+    if not available_indices:
+        return {BLANK_CARD: 1.0}
+
+    boost = chant_boost_percentage(chant_count) / 100
+    probabilities = dict.fromkeys(available_indices, 0.0)
+    if boost == 0:
+        p_better = p_good = 0.0
+    else:
+        better_cards, good_cards = swap_tiers(available_indices, current_value)
+        p_better = boost if better_cards else 0.0
+        p_good = (boost + GOOD_CARD_BONUS / 100 - p_better) if good_cards else 0.0
+        for idx in better_cards:
+            probabilities[idx] += p_better / len(better_cards)
+        for idx in good_cards:
+            probabilities[idx] += p_good / len(good_cards)
+
+    p_normal = 1.0 - p_better - p_good
+    for idx in available_indices:
+        probabilities[idx] += p_normal / len(available_indices)
+    return probabilities
+
+
+def exact_boost_distribution(available_indices, boost_level, desired_value):
+    """Exact probability of each card index (or BLANK_CARD) for a boost swap"""
+    pool_size = boost_pool_size(boost_level)
+    desired_cards = []
+    if boost_level != 1 and desired_value:
+        desired_cards = desired_card_indices(available_indices, desired_value)
+
+    probabilities = {}
+    if not desired_cards:
+        # Draw from everything available, padded with blanks up to the pool size
+        pool = max(pool_size, len(available_indices))
+        for idx in available_indices:
+            probabilities[idx] = 1 / pool
+        blanks = pool - len(available_indices)
+    else:
+        desired = set(desired_cards)
+        others = [idx for idx in available_indices if idx not in desired]
+        fill = min(len(others), max(0, pool_size - len(desired_cards)))
+        pool = max(pool_size, len(desired_cards))
+        for idx in desired_cards:
+            probabilities[idx] = 1 / pool
+        for idx in others:
+            probabilities[idx] = fill / pool / len(others)
+        blanks = pool - len(desired_cards) - fill
+
+    if blanks > 0:
+        probabilities[BLANK_CARD] = blanks / pool
+    return probabilities
+
+
+# --- Vectorized Monte Carlo ---
+
+def pick_in_mask(rng, mask):
+    """Pick one True column uniformly per row; rows with no True get -1"""
+    cumulative = np.cumsum(mask, axis=1, dtype=np.int16)  # Small dtype keeps the batch cache-friendly
+    counts = cumulative[:, -1]
+    k = (rng.random(len(mask), dtype=np.float32) * counts).astype(np.int16)
+    picked = (cumulative <= k[:, None]).sum(axis=1)
+    return np.where(counts > 0, picked, BLANK_CARD)
+
+
+def simulate_swaps(rng, available, current_values, chant_count):
+    """Simulate one regular swap per row of `available` (rows x cards bool mask)"""
+    boost = chant_boost_percentage(chant_count)
+    if boost == 0:
+        return pick_in_mask(rng, available)
+
+    values = np.arange(available.shape[1]) % 13 + 1
+    current = current_values[:, None]
+    better = available & (values > current)
+    good = available & (values <= current) & (values >= current - 1)
+
+    rand = rng.random(len(available)) * 100
+    use_better = (rand < boost) & better.any(axis=1)
+    use_good = ~use_better & (rand < boost + GOOD_CARD_BONUS) & good.any(axis=1)
+    chosen = np.where(use_better[:, None], better, np.where(use_good[:, None], good, available))
+    return pick_in_mask(rng, chosen)
+
+
+def simulate_boosts(rng, available, boost_level, desired_value):
+    """Simulate one boost swap per row of `available` (rows x cards bool mask)"""
+    pool_size = boost_pool_size(boost_level)
+    rows, total_cards = available.shape
+
+    desired = np.zeros_like(available)
+    if boost_level != 1 and desired_value:
+        # Desired cards only come from the first deck's four suits
+        desired[:, [(desired_value - 1) + suit * 13 for suit in range(4)]] = True
+        desired &= available
+    desired_count = desired.sum(axis=1)
+    others = available & ~desired
+    others_count = others.sum(axis=1)
+
+    # Rows without desired cards draw from everything available, padded with blanks
+    plain = desired_count == 0
+    fill = np.where(plain, 0, np.minimum(others_count, np.maximum(0, pool_size - desired_count)))
+    plain_count = np.where(plain, others_count, 0)
+    pool = np.maximum(pool_size, np.where(plain, others_count, desired_count))
+
+    slot = (rng.random(rows) * pool).astype(np.int64)
+    take_desired = slot < desired_count
+    take_other = ~take_desired & (slot < desired_count + fill + plain_count)
+
+    picked = np.full(rows, BLANK_CARD)
+    picked[take_desired] = pick_in_mask(rng, desired[take_desired])
+    picked[take_other] = pick_in_mask(rng, others[take_other])
+    return picked
+
+
+def random_deck_states(rng, rows, total_cards, owned):
+    """Availability masks for random deck states with `owned` cards taken; also returns one owned card per row"""
+    order = np.argsort(rng.random((rows, total_cards)), axis=1)
+    available = np.ones((rows, total_cards), dtype=bool)
+    np.put_along_axis(available, order[:, :owned], False, axis=1)
+    return available, order[:, 0]
+
+
+# --- Reporting ---
+
+def value_table(probabilities):
+    """Collapse card-index probabilities into value 1-13 (0 = blank)"""
+    table = np.zeros(14)
+    for idx, probability in probabilities.items():
+        table[0 if idx == BLANK_CARD else card_value(idx)] += probability
+    return table
+
+
+def counts_to_values(picked):
+    values = np.where(picked == BLANK_CARD, 0, picked % 13 + 1)
+    return np.bincount(values, minlength=14) / len(picked)
+
+
+def fixed_deck_state(args, total_cards):
+    """One reproducible deck state: the player holds a card of --current, other owned cards are random"""
+    rng = random.Random(args.seed)
+    player_card = args.current - 1
+    others = [idx for idx in range(total_cards) if idx != player_card]
+    owned = [player_card] + rng.sample(others, max(0, args.owned - 1))
+    return available_card_indices(total_cards, owned)
+
+
+def run_fixed(args, total_cards):
+    available_indices = fixed_deck_state(args, total_cards)
+    mask = np.zeros(total_cards, dtype=bool)
+    mask[available_indices] = True
+    rng = np.random.default_rng(args.seed)
+
+    if args.action == 'swap':
+        exact = exact_swap_distribution(available_indices, args.current, args.chants)
+        kernel = lambda rows: simulate_swaps(rng, np.broadcast_to(mask, (rows, total_cards)),
+                                             np.full(rows, args.current), args.chants)
+        engine = lambda stream: pick_swap_card(stream, available_indices, args.current, args.chants)[0]
+        label = f"swap, current {args.current}, {args.chants} chants ({chant_boost_percentage(args.chants)}% boost)"
+    else:
+        exact = exact_boost_distribution(available_indices, args.boost_level, args.desired)
+        kernel = lambda rows: simulate_boosts(rng, np.broadcast_to(mask, (rows, total_cards)),
+                                              args.boost_level, args.desired)
+        engine = lambda stream: pick_boost_card(stream, available_indices, args.boost_level, args.desired)
+        label = f"boost level {args.boost_level}, desired {args.desired} (pool {boost_pool_size(args.boost_level)})"
+
+    # NumPy Monte Carlo
+    start = time.perf_counter()
+    tallies = np.zeros(14)
+    done = 0
+    while done < args.trials:
+        rows = min(CHUNK_SIZE, args.trials - done)
+        tallies += counts_to_values(kernel(rows)) * rows
+        done += rows
+    numpy_elapsed = time.perf_counter() - start
+    numpy_table = tallies / args.trials
+
+    # Live engine (game_rules with a room stream, exactly as the handlers call it)
+    stream = RoomRandom(args.seed)
+    start = time.perf_counter()
+    engine_picks = np.array([engine(stream) for _ in range(args.engine_trials)])
+    engine_elapsed = time.perf_counter() - start
+    engine_table = counts_to_values(engine_picks)
+
+    exact_table = value_table(exact)
+    print(f"{label} | {args.decks} deck(s), {args.owned} owned, {len(available_indices)} available")
+    print(f"{'value':>6} {'exact %':>9} {'numpy %':>9} {'engine %':>9}")
+    for value in range(14):
+        if exact_table[value] or numpy_table[value] or engine_table[value]:
+            name = 'blank' if value == 0 else str(value)
+            print(f"{name:>6} {exact_table[value] * 100:9.3f} {numpy_table[value] * 100:9.3f} {engine_table[value] * 100:9.3f}")
+
+    print(f"Total variation vs exact: numpy {np.abs(numpy_table - exact_table).sum() / 2:.5f}, "
+          f"engine {np.abs(engine_table - exact_table).sum() / 2:.5f}")
+    print(f"Throughput: numpy {args.trials / numpy_elapsed:,.0f} sims/s, "
+          f"engine {args.engine_trials / engine_elapsed:,.0f} sims/s")
+
+
+def run_sweep(args, total_cards):
+    """Outcome shares as the deck empties, over batched random deck states"""
+    rng = np.random.default_rng(args.seed)
+    values = np.arange(total_cards) % 13 + 1
+    print(f"{args.action} sweep | {args.decks} deck(s), {args.trials:,} random deck states per row")
+    if args.action == 'swap':
+        print(f"{'owned':>6} {'better %':>9} {'same %':>9} {'worse %':>9} {'blank %':>9} {'avg gain':>9}")
+    else:
+        print(f"{'owned':>6} {'desired %':>10} {'other %':>9} {'blank %':>9}")
+
+    start = time.perf_counter()
+    for owned in range(args.owned, total_cards + 1, args.step):
+        available, player_cards = random_deck_states(rng, args.trials, total_cards, owned)
+        current = values[player_cards]
+        if args.action == 'swap':
+            picked = simulate_swaps(rng, available, current, args.chants)
+            blank = picked == BLANK_CARD
+            gain = np.where(blank, 0, values[np.where(blank, 0, picked)] - current)
+            print(f"{owned:6d} {(gain > 0).mean() * 100:9.2f} {((gain == 0) & ~blank).mean() * 100:9.2f} "
+                  f"{(gain < 0).mean() * 100:9.2f} {blank.mean() * 100:9.2f} {gain.mean():9.3f}")
+        else:
+            picked = simulate_boosts(rng, available, args.boost_level, args.desired)
+            blank = picked == BLANK_CARD
+            desired = ~blank & (picked < CARDS_PER_DECK) & (values[np.where(blank, 0, picked)] == args.desired)
+            print(f"{owned:6d} {desired.mean() * 100:10.2f} {(~blank & ~desired).mean() * 100:9.2f} "
+                  f"{blank.mean() * 100:9.2f}")
+    elapsed = time.perf_counter() - start
+    rows = len(range(args.owned, total_cards + 1, args.step)) * args.trials
+    print(f"Throughput: {rows / elapsed:,.0f} sims/s (including deck state generation)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate swap/boost outcome distributions')
+    parser.add_argument('--action', choices=['swap', 'boost'], default='swap')
+    parser.add_argument('--mode', type=int, choices=[3, 6], default=3, help='cards per player')
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--decks', type=int, default=1)
+    parser.add_argument('--owned', type=int, help='cards already owned (default: players x mode)')
+    parser.add_argument('--chants', type=int, default=0, help='chant count for swaps (0-3)')
+    parser.add_argument('--current', type=int, default=7, help='value of the card being swapped (1-13)')
+    parser.add_argument('--boost-level', type=int, choices=[1, 2, 3, 4], default=2)
+    parser.add_argument('--desired', type=int, default=13, help='desired value for boosts (1-13)')
+    parser.add_argument('--trials', type=int, default=1_000_000)
+    parser.add_argument('--engine-trials', type=int, default=100_000)
+    parser.add_argument('--sweep', action='store_true', help='show how outcomes shift as the deck empties')
+    parser.add_argument('--step', type=int, default=4, help='owned-card step for --sweep')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    total_cards = CARDS_PER_DECK * args.decks
+    if args.owned is None:
+        args.owned = args.players * args.mode
+    args.owned = max(1, min(args.owned, total_cards))
+
+    if args.sweep:
+        if args.trials == parser.get_default('trials'):
+            args.trials = 100_000
+        run_sweep(args, total_cards)
+    else:
+        run_fixed(args, total_cards)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import marshal
+import mmap
+import os
+import sys
+
+# Header guards against loading a snapshot from another format or Python version
+MAGIC = b'GOG-WARM-SNAPSHOT-1 %d.%d\n' % sys.version_info[:2]
+
+
+def write_snapshot(path, state):
+    """Write a compact marshal snapshot atomically"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        marshal.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def read_snapshot(path):
+    """Memory-map and decode a snapshot; None if missing or unreadable"""
+    if not os.path.exists(path) or os.path.getsize(path) <= len(MAGIC):
+        return None
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(MAGIC)] != MAGIC:
+                print(f"[SNAPSHOT] Ignoring {path}: written by another version")
+                return None
+            with memoryview(mapped) as view, view[len(MAGIC):] as body:
+                return marshal.loads(body)
+    except (OSError, ValueError, EOFError, TypeError) as e:
+        print(f"[SNAPSHOT] Ignoring unreadable {path}: {e}")
+        return None
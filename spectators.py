@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from functools import partial
+
+# Events after which watchers get a full snapshot instead of patching their view
+RESYNC_EVENTS = {'new_round_started', 'player_joined'}
+
+
+def encode(data):
+    """Serialize a delivery once - every watcher is sent the same JSON string"""
+    return json.dumps(data, separators=(',', ':'))
+
+
+def conflate(events):
+    """Keep only the latest state per (event, player, card) - intermediate states are dropped"""
+    latest = {}
+    for position, (event, data) in enumerate(events):
+        latest[(event, data.get('player_id'), data.get('card_index'))] = position
+    return [events[position] for position in sorted(latest.values())]
+
+
+class SpectatorHub:
+    """Read-only spectator channel: room events are batched, serialized once per tick and fanned out off the player path"""
+
+    def __init__(self, socketio, snapshot, interval=0.2, max_batch=50, max_backlog=20):
+        self.socketio = socketio
+        self._snapshot = snapshot  # room_id -> public room state for (re)syncing watchers
+        self.interval = interval  # Seconds between deliveries to spectators
+        self.max_batch = max_batch  # Longer batches are conflated, then replaced by a snapshot
+        self.max_backlog = max_backlog  # Unacknowledged deliveries before a watcher counts as slow
+        self._watchers = {}  # room_id -> {sid: needs_snapshot}
+        self._room_of = {}  # sid -> room_id
+        self._pending = {}  # room_id -> [(event, data)] published since the last tick
+        self._in_flight = {}  # sid -> deliveries the watcher has not acknowledged yet
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Start the background delivery loop (once)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def watch(self, room_id, sid):
+        """Add a spectator - it receives a snapshot on the next tick"""
+        with self._lock:
+            self._unwatch(sid)
+            self._watchers.setdefault(room_id, {})[sid] = True
+            self._room_of[sid] = room_id
+
+    def unwatch(self, sid):
+        with self._lock:
+            self._unwatch(sid)
+
+    def _unwatch(self, sid):
+        self._in_flight.pop(sid, None)
+        room_id = self._room_of.pop(sid, None)
+        if room_id is None:
+            return
+        watchers = self._watchers.get(room_id, {})
+        watchers.pop(sid, None)
+        if not watchers:
+            self._watchers.pop(room_id, None)
+            self._pending.pop(room_id, None)
+
+    def count(self, room_id):
+        with self._lock:
+            return len(self._watchers.get(room_id, ()))
+
+    def publish(self, room_id, event, data):
+        """Queue a room event for its spectators - O(1), never sends on the caller's thread"""
+        with self._lock:
+            if room_id in self._watchers:
+                self._pending.setdefault(room_id, []).append((event, data))
+
+    def flush(self):
+        """Deliver one tick: a batch (or snapshot) per room, encoded once for all its watchers"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            rooms = [(room_id, dict(watchers)) for room_id, watchers in self._watchers.items()
+                     if room_id in pending or any(watchers.values())]
+
+        for room_id, watchers in rooms:
+            events = pending.get(room_id, [])
+            if len(events) > self.max_batch:
+                events = conflate(events)
+            resync_all = len(events) > self.max_batch or any(event in RESYNC_EVENTS for event, _ in events)
+            if len(events) > self.max_batch:
+                events = []  # Still too long - everyone gets the (smaller) snapshot instead
+
+            batch = None
+            snapshot = None
+            needs_snapshot = {}
+            for sid, wants_snapshot in watchers.items():
+                if self._in_flight.get(sid, 0) > self.max_backlog:
+                    # Slow watcher: skip its intermediate states, resync once it has caught up
+                    needs_snapshot[sid] = True
+                    continue
+
+                if wants_snapshot:
+                    if snapshot is None:
+                        snapshot = encode(self._snapshot(room_id))
+                    self._send(sid, 'spectator_snapshot', snapshot)
+                elif events:
+                    if batch is None:
+                        batch = encode({'events': events})
+                    self._send(sid, 'spectator_batch', batch)
+                needs_snapshot[sid] = resync_all
+
+            with self._lock:
+                current = self._watchers.get(room_id, {})
+                for sid, value in needs_snapshot.items():
+                    if sid in current:
+                        current[sid] = value
+
+    def _send(self, sid, event, encoded):
+        # The client acknowledges each delivery; unacknowledged ones are the watcher's backlog
+        with self._lock:
+            self._in_flight[sid] = self._in_flight.get(sid, 0) + 1
+        self.socketio.emit(event, encoded, to=sid, callback=partial(self._delivered, sid))
+
+    def _delivered(self, sid, *args):
+        with self._lock:
+            if self._in_flight.get(sid):
+                self._in_flight[sid] -= 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[SPECTATORS] Error while delivering to spectators: {e}")
@@ -58,6 +58,8 @@ let gameState = {
     fingersTouching: 0,
     roomId: ROOM_ID,
     playerId: null,
+    playersProgress: {}, // player_id -> rub-energy percentage, from progress_snapshot
+    lastReportedProgress: null,
     maxBoosts: 3,
     totalSwaps: 0,
     swapLimitReached: false,
@@ -95,6 +97,7 @@ const readyProgressText = document.getElementById('readyProgressText');
 const readyStatusList = document.getElementById('readyStatusList');
 const readyCountDisplay = document.getElementById('readyCount');
 const totalPlayersDisplay = document.getElementById('totalPlayers');
+const rubbingProgressDisplay = document.getElementById('rubbingProgress');
 const foldedCountDisplay = document.getElementById('foldedCount');
 const timerDisplay = document.getElementById('timer');
 const energyFill = document.getElementById('energyFill');
@@ -405,10 +408,21 @@ socket.on('player_joined', function(data) {
     showToast(`🆕 ${playerName} đã tham gia phòng! Tổng: ${data.total_players} người chơi`, 'info');
 });
 
+// Swaps and boosts send only the cards that changed hands; system swaps still send the whole list
+function applyUsedCards(data) {
+    if (data.used_cards) {
+        gameState.usedCards = data.used_cards;
+        return;
+    }
+    const removed = data.used_cards_removed || [];
+    gameState.usedCards = gameState.usedCards.filter(index => !removed.includes(index))
+        .concat((data.used_cards_added || []).filter(index => !gameState.usedCards.includes(index)));
+}
+
 socket.on('card_swapped', function(data) {
    
     // Update used cards list
-    gameState.usedCards = data.used_cards || [];
+    applyUsedCards(data);
 
     // If this is the player who swapped, update their card
     if (data.player_id === socket.id && data.new_card) {
@@ -443,7 +457,7 @@ socket.on('card_swapped', function(data) {
 socket.on('boost_completed', function(data) {
 
     // Update used cards list
-    gameState.usedCards = data.used_cards || [];
+    applyUsedCards(data);
 
     // If this is the player who boosted, update their card
     if (data.player_id === socket.id && data.new_card) {
@@ -504,6 +518,20 @@ socket.on('player_folded', function(data) {
 });
 
 socket.on('all_players_folded_silently', function(data) {
+    foldSilently(data);
+});
+
+// System reveal: every player folded with all cards open, in one event
+socket.on('cards_revealed', function(data) {
+    const ownCards = (data.hands || {})[socket.id];
+    if (ownCards) {
+        gameState.flippedCards = ownCards.map((card, index) => index);
+    }
+    updateCardDisplay();
+    foldSilently(data);
+});
+
+function foldSilently(data) {
     // Update room stats
     updateRoomStats(data);
 
@@ -534,7 +562,7 @@ socket.on('all_players_folded_silently', function(data) {
         card.style.pointerEvents = 'none';
         card.style.opacity = '0.7';
     });
-});
+}
 
 socket.on('show_toast', function(data) {
     showToast(data.message, data.type || 'info');
@@ -590,6 +618,23 @@ socket.on('card_flipped', function(data) {
     updateCardDisplay();
 });
 
+// Live rub-energy progress of every player in the room
+socket.on('progress_snapshot', function(data) {
+    gameState.playersProgress = data.players;
+    updateRubbingProgress();
+});
+
+// Status panel: how many other players are rubbing right now, and the closest one to a swap
+function updateRubbingProgress() {
+    if (!rubbingProgressDisplay) return;
+    const others = Object.entries(gameState.playersProgress || {})
+        .filter(([playerId, percentage]) => playerId !== socket.id && percentage > 0)
+        .map(([, percentage]) => percentage);
+    rubbingProgressDisplay.textContent = others.length
+        ? `${others.length} · ${Math.round(Math.max(...others))}%`
+        : '0';
+}
+
 socket.on('swap_failed', function(data) {
     showToast(data.message, 'error');
 });
@@ -602,6 +647,16 @@ socket.on('error', function(data) {
     showToast(data.message, 'error');
 });
 
+// Server is busy (e.g. everyone reconnecting after a restart) - wait and join again instead of reloading
+socket.on('join_retry', function(data) {
+    if (joinTimeout) {
+        clearTimeout(joinTimeout);
+        joinTimeout = null;
+    }
+    showToast(data.message, 'info');
+    setTimeout(joinCurrentRoom, (data.retry_after || 2) * 1000);
+});
+
 // Preload all card images before showing them
 function preloadCardImages(callback) {
     // Preload only the 3 available card back images
@@ -1870,11 +1925,22 @@ function isCardAvailable(value, suit) {
 }
 
 
+// Report rub-energy progress to the server (it coalesces samples and broadcasts snapshots)
+function reportProgress(percent) {
+    if (percent === gameState.lastReportedProgress) return;
+    gameState.lastReportedProgress = percent;
+    socket.emit('report_progress', {
+        room_id: ROOM_ID,
+        percentage: percent
+    });
+}
+
 // Update energy display
 function updateEnergyDisplay() {
     const percent = Math.round(gameState.energy);
     energyFill.style.width = `${percent}%`;
     energyPercent.textContent = `${percent}%`;
+    reportProgress(percent);
     overlayEnergyFill.style.width = `${percent}%`;
     // overlayEnergyPercent.textContent = `${percent}%`; // Commented out - overlay removed
 
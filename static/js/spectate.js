@@ -0,0 +1,134 @@
+// Spectator view - read-only, fed by room snapshots and batched events from the server
+const socket = io();
+
+let spectatorState = {
+    round: 1,
+    players: [],
+    totalPlayers: 0,
+    foldedCount: 0,
+    spectators: 0
+};
+
+socket.on('connect', function() {
+    socket.emit('spectate_room', { room_id: ROOM_ID });
+});
+
+// Deliveries arrive as JSON strings (encoded once for every watcher); acknowledging them
+// tells the server this watcher keeps up, otherwise it skips ahead to a snapshot
+// Full state: on join, after a new round, or after falling behind
+socket.on('spectator_snapshot', function(encoded, ack) {
+    if (ack) ack();
+    const data = JSON.parse(encoded);
+    if (data.closed) {
+        showToast('Phòng đã đóng', 'error');
+        return;
+    }
+    spectatorState.round = data.round;
+    spectatorState.players = data.players;
+    spectatorState.totalPlayers = data.total_players;
+    spectatorState.foldedCount = data.folded_count;
+    spectatorState.spectators = data.spectators;
+    renderSpectatorView();
+});
+
+// Events since the last tick, oldest first
+socket.on('spectator_batch', function(encoded, ack) {
+    if (ack) ack();
+    const data = JSON.parse(encoded);
+    data.events.forEach(function(entry) {
+        applySpectatorEvent(entry[0], entry[1]);
+    });
+    renderSpectatorView();
+});
+
+socket.on('error', function(data) {
+    showToast(data.message, 'error');
+});
+
+function findPlayer(playerId) {
+    return spectatorState.players.find(player => player.player_id === playerId);
+}
+
+function applySpectatorEvent(event, data) {
+    const player = findPlayer(data.player_id);
+
+    if (event === 'card_flipped') {
+        if (player && data.card) {
+            player.cards[data.card_index] = data.card;
+        }
+    } else if (event === 'card_swapped' || event === 'boost_completed') {
+        // Only positions already flipped are shown
+        if (player && player.cards[data.card_index]) {
+            player.cards[data.card_index] = data.new_card;
+        }
+    } else if (event === 'player_folded') {
+        if (player) player.folded = true;
+    } else if (event === 'cards_revealed') {
+        spectatorState.players.forEach(p => {
+            p.folded = true;
+            if (data.hands[p.player_id]) p.cards = data.hands[p.player_id];
+        });
+        showToast('Tất cả bài đã được lật!');
+    } else if (event === 'all_folded' || event === 'all_players_folded_silently') {
+        spectatorState.players.forEach(p => { p.folded = true; });
+        showToast('Tất cả đã buông bài!');
+    } else if (event === 'new_round_started') {
+        showToast('🎯 Ván mới đã bắt đầu!', 'success');
+    } else if (event === 'player_joined') {
+        showToast(`🆕 ${data.player_name || 'Người chơi mới'} đã tham gia phòng!`, 'info');
+    }
+
+    if (data.total_players !== undefined) spectatorState.totalPlayers = data.total_players;
+    if (data.folded_count !== undefined) spectatorState.foldedCount = data.folded_count;
+}
+
+function cardLabel(card) {
+    const values = { 1: 'A', 11: 'J', 12: 'Q', 13: 'K' };
+    const suits = ['♠', '♥', '♦', '♣'];
+    return `${values[card.value] || card.value}${suits[card.suit % 4]}`;
+}
+
+function renderSpectatorView() {
+    document.getElementById('roundNumber').textContent = spectatorState.round;
+    document.getElementById('totalPlayers').textContent = spectatorState.totalPlayers;
+    document.getElementById('foldedCount').textContent = spectatorState.foldedCount;
+    document.getElementById('spectatorCount').textContent = spectatorState.spectators;
+
+    const container = document.getElementById('spectatorPlayers');
+    container.innerHTML = '';
+    spectatorState.players.forEach(function(player) {
+        const row = document.createElement('div');
+        row.className = 'spectator-player' + (player.folded ? ' folded' : '');
+
+        const name = document.createElement('div');
+        name.className = 'spectator-player-name';
+        name.textContent = player.name + (player.folded ? ' (đã buông)' : '');
+        row.appendChild(name);
+
+        const cards = document.createElement('div');
+        cards.className = 'spectator-cards';
+        player.cards.forEach(function(card) {
+            const cardElement = document.createElement('div');
+            if (card && card.index >= 0) {
+                const isRed = card.suit % 4 === 1 || card.suit % 4 === 2;
+                cardElement.className = 'spectator-card' + (isRed ? ' red' : '');
+                cardElement.textContent = cardLabel(card);
+            } else {
+                cardElement.className = 'spectator-card hidden';
+            }
+            cards.appendChild(cardElement);
+        });
+        row.appendChild(cards);
+
+        container.appendChild(row);
+    });
+}
+
+function showToast(message, type = 'info') {
+    const toast = document.getElementById('toast');
+    toast.textContent = message;
+    toast.className = `toast show ${type}`;
+    setTimeout(() => {
+        toast.className = 'toast';
+    }, 3000);
+}
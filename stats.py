@@ -0,0 +1,140 @@
+import atexit
+import sqlite3
+import threading
+import time
+
+# Leaderboard orderings -> indexed player_stats column
+LEADERBOARD_COLUMNS = {
+    'hand': 'avg_hand',
+    'best': 'best_hand',
+    'rounds': 'rounds_played',
+    'swaps': 'swaps',
+    'boost': 'boost_rate',
+}
+
+
+def hand_strength(hand):
+    """Sum of card values in a Hand (blank cards count 0)"""
+    return sum(hand.values())
+
+
+class PlayerStats:
+    """Per-identifier aggregates, updated incrementally at round end, with indexed top-K leaderboards"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._pending_boosts = {}  # identifier -> [attempts, successes] since the last write
+        self._lock = threading.Lock()
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS player_stats (
+                    identifier TEXT PRIMARY KEY,
+                    name TEXT,
+                    rounds_played INTEGER NOT NULL DEFAULT 0,
+                    swaps INTEGER NOT NULL DEFAULT 0,
+                    boost_attempts INTEGER NOT NULL DEFAULT 0,
+                    boost_successes INTEGER NOT NULL DEFAULT 0,
+                    hand_total INTEGER NOT NULL DEFAULT 0,  -- Sum of final hand strengths
+                    best_hand INTEGER NOT NULL DEFAULT 0,
+                    avg_hand REAL NOT NULL DEFAULT 0,  -- Derived, stored so it can be indexed
+                    boost_rate REAL NOT NULL DEFAULT 0,  -- Derived, stored so it can be indexed
+                    updated_at REAL
+                )
+            ''')
+            # One index per leaderboard: top-K is an index walk, independent of history size
+            for column in LEADERBOARD_COLUMNS.values():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_player_stats_{column} ON player_stats ({column} DESC)')
+
+        atexit.register(self.flush)
+
+    def record_boost(self, identifier, success):
+        """Count a boost attempt - kept in memory until the next round end"""
+        if not identifier:
+            return
+        with self._lock:
+            counts = self._pending_boosts.setdefault(identifier, [0, 0])
+            counts[0] += 1
+            counts[1] += int(bool(success))
+
+    def record_round(self, players):
+        """Fold a finished round into the aggregates: players are the round's PlayerRound objects"""
+        with self._lock:
+            boosts, self._pending_boosts = self._pending_boosts, {}
+
+        rows = {}
+        for player in players:
+            identifier = player.identifier
+            if not identifier:
+                continue
+            strength = hand_strength(player.hand)
+            rows[identifier] = [player.name, 1, player.total_swaps, 0, 0, strength, strength]
+        for identifier, (attempts, successes) in boosts.items():
+            row = rows.setdefault(identifier, [None, 0, 0, 0, 0, 0, 0])
+            row[3] += attempts
+            row[4] += successes
+        if not rows:
+            return
+
+        now = time.time()
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                # Unqualified columns in DO UPDATE are the stored totals, excluded.* this round's deltas
+                conn.executemany('''
+                    INSERT INTO player_stats (identifier, name, rounds_played, swaps, boost_attempts, boost_successes,
+                                              hand_total, best_hand, avg_hand, boost_rate, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(identifier) DO UPDATE SET
+                        name = COALESCE(excluded.name, name),
+                        rounds_played = rounds_played + excluded.rounds_played,
+                        swaps = swaps + excluded.swaps,
+                        boost_attempts = boost_attempts + excluded.boost_attempts,
+                        boost_successes = boost_successes + excluded.boost_successes,
+                        hand_total = hand_total + excluded.hand_total,
+                        best_hand = MAX(best_hand, excluded.best_hand),
+                        avg_hand = (hand_total + excluded.hand_total) * 1.0
+                                   / MAX(1, rounds_played + excluded.rounds_played),
+                        boost_rate = (boost_successes + excluded.boost_successes) * 1.0
+                                     / MAX(1, boost_attempts + excluded.boost_attempts),
+                        updated_at = excluded.updated_at
+                ''', [(identifier, name, rounds, swaps, attempts, successes, hand_total, best_hand,
+                       hand_total / max(1, rounds), successes / max(1, attempts), now)
+                      for identifier, (name, rounds, swaps, attempts, successes, hand_total, best_hand) in rows.items()])
+        except Exception:
+            # Keep the boost counts for the next attempt
+            with self._lock:
+                for identifier, (attempts, successes) in boosts.items():
+                    counts = self._pending_boosts.setdefault(identifier, [0, 0])
+                    counts[0] += attempts
+                    counts[1] += successes
+            raise
+
+    def flush(self):
+        """Write pending boost counts without a round end - called on shutdown"""
+        try:
+            self.record_round([])
+        except Exception as e:
+            print(f"[STATS] Error while writing player stats: {e}")
+
+    def leaderboard(self, by='hand', limit=10, min_rounds=1):
+        """Top players by one aggregate, read straight off its index"""
+        # Identifiers double as reconnect secrets, so they are never part of the leaderboard
+        column = LEADERBOARD_COLUMNS[by]
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(f'''
+                SELECT name, rounds_played, swaps, boost_attempts, boost_successes,
+                       best_hand, avg_hand, boost_rate
+                FROM player_stats
+                WHERE rounds_played >= ?
+                ORDER BY {column} DESC
+                LIMIT ?
+            ''', (min_rounds, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, identifier):
+        """Aggregates of one player, or None"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM player_stats WHERE identifier = ?', (identifier,)).fetchone()
+        return dict(row) if row else None
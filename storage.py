@@ -0,0 +1,884 @@
+import abc
+import heapq
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from archive import encode_round, decode_round, merge_round
+from monitor import Counter, Histogram
+
+try:
+    import psycopg2
+    import psycopg2.pool
+except ImportError:  # Optional - only needed for DATABASE_URL=postgresql://...
+    psycopg2 = None
+
+POSTGRES_POOL_SIZE = 10  # Connections per process
+SQLITE_POOL_SIZE = 4  # Idle connections kept per SQLite file
+
+# room_players columns in the order load_round returns them (and the archive stores them)
+ROUND_COLUMNS = '''player_id, name, identifier, cards, chant_count, total_swaps, folded,
+                   ready_for_new_round, flipped_cards, completion_percentage, joined_at, card_order'''
+
+
+def open_storage(url, shards=1):
+    """Storage backend for a DATABASE_URL-style string: postgresql://..., memory://, or a SQLite file path
+
+    With shards > 1 a SQLite path becomes that many files (game.0.db, game.1.db, ...), rooms hashed across them.
+    """
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresStorage(url)
+    if url.startswith('memory://'):
+        return MemoryStorage()
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    if shards > 1:
+        return ShardedStorage(url, shards)
+    return SQLiteStorage(url)
+
+
+def shard_path(db_path, shard):
+    root, ext = os.path.splitext(db_path)
+    return f'{root}.{shard}{ext or ".db"}'
+
+
+# What GameDatabase, EventLog and RoundArchive need from a backend:
+#   max_event_seq, append_events, read_events_since, read_room_events,
+#   compact_events                                                      - room_events log
+#   last_checkpoint, write_checkpoint                                   - rooms/room_players materialization
+#   load_room, load_round, find_player_room, room_ids, room_exists,
+#   rooms_inactive_since                                                - reads
+#   archive_rounds                                                      - finished rounds -> room_rounds_archive
+class SQLStorage(abc.ABC):
+    """Backend over a DB-API connection; queries are written with ? placeholders"""
+
+    placeholder = '?'
+    db_path = None  # Local SQLite file, if the backend has one
+
+    @abc.abstractmethod
+    def connect(self, write=False):
+        """Context manager: a connection in a transaction; write=True for transactions that modify data"""
+
+    def _sql(self, query):
+        return query if self.placeholder == '?' else query.replace('?', self.placeholder)
+
+    def _execute(self, conn, query, params=()):
+        cursor = conn.cursor()
+        cursor.execute(self._sql(query), params)
+        return cursor
+
+    def _executemany(self, conn, query, rows):
+        conn.cursor().executemany(self._sql(query), rows)
+
+    # --- Event log ---
+
+    def max_event_seq(self):
+        # Compaction may have emptied the log - sequence numbers still never go back below the checkpoint
+        with self.connect() as conn:
+            return max(self._execute(conn, 'SELECT MAX(seq) FROM room_events').fetchone()[0] or 0,
+                       self._execute(conn, 'SELECT last_seq FROM event_checkpoints WHERE id = 1').fetchone()[0])
+
+    def append_events(self, batch):
+        """Write (seq, room_id, type, payload_json, created_at) rows in one transaction
+
+        Rows already written are skipped, so a batch can be retried after a partial (per-shard) commit.
+        """
+        with self.connect(write=True) as conn:
+            self._executemany(conn, '''
+                INSERT INTO room_events (seq, room_id, type, payload, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(seq) DO NOTHING
+            ''', batch)
+
+    def read_events_since(self, seq):
+        """Yield (seq, room_id, type, payload_json) after seq, in order"""
+        with self.connect() as conn:
+            cursor = self._execute(conn, '''
+                SELECT seq, room_id, type, payload FROM room_events
+                WHERE seq > ?
+                ORDER BY seq
+            ''', (seq,))
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                yield from rows
+
+    def read_room_events(self, room_id, limit):
+        """(seq, type, payload_json, created_at) of one room, oldest first"""
+        with self.connect() as conn:
+            return self._execute(conn, '''
+                SELECT seq, type, payload, created_at FROM room_events
+                WHERE room_id = ?
+                ORDER BY seq
+                LIMIT ?
+            ''', (room_id, limit)).fetchall()
+
+    def compact_events(self, before, limit):
+        """Delete up to `limit` of the oldest events that the checkpoint covers and that were written before
+        the epoch time `before`; returns how many were deleted"""
+        with self.connect(write=True) as conn:
+            last_seq = self._execute(conn, 'SELECT last_seq FROM event_checkpoints WHERE id = 1').fetchone()[0]
+            # created_at grows with seq, so the scan stops at the first event inside the window
+            first_kept = self._execute(conn, '''
+                SELECT seq FROM room_events WHERE created_at >= ? ORDER BY seq LIMIT 1
+            ''', (before,)).fetchone()
+            if first_kept:
+                last_seq = min(last_seq, first_kept[0] - 1)
+            return self._execute(conn, '''
+                DELETE FROM room_events
+                WHERE seq IN (SELECT seq FROM room_events WHERE seq <= ? ORDER BY seq LIMIT ?)
+            ''', (last_seq, limit)).rowcount
+
+    # --- Checkpoints ---
+
+    def last_checkpoint(self):
+        with self.connect() as conn:
+            return self._execute(conn, 'SELECT last_seq FROM event_checkpoints WHERE id = 1').fetchone()[0]
+
+    def write_checkpoint(self, deleted, rooms, last_seq):
+        """One transaction: drop deleted rooms, upsert rooms and their player rows, advance the checkpoint
+
+        rooms: [(room_id, (mode, max_boosts, decks, used_cards_json, rng_seed, created_at, last_active, rng_round,
+                           rng_draws), pending_sql, player_rows)]
+        A deleted room's events go with it, up to last_seq - a room re-created under the same ID keeps its own.
+        """
+        with self.connect(write=True) as conn:
+            for room_id in deleted:
+                self._execute(conn, 'DELETE FROM room_events WHERE room_id = ? AND seq <= ?', (room_id, last_seq))
+                self._execute(conn, 'DELETE FROM room_players WHERE room_id = ?', (room_id,))
+                self._execute(conn, 'DELETE FROM room_rounds_archive WHERE room_id = ?', (room_id,))
+                self._execute(conn, 'DELETE FROM rooms WHERE id = ?', (room_id,))
+
+            for room_id, settings, pending_sql, player_rows in rooms:
+                self._execute(conn, '''
+                    INSERT INTO rooms (id, mode, max_boosts, decks, used_cards, rng_seed, created_at, last_active,
+                                       rng_round, rng_draws)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET used_cards = excluded.used_cards, rng_seed = excluded.rng_seed,
+                                                  last_active = excluded.last_active, rng_round = excluded.rng_round,
+                                                  rng_draws = excluded.rng_draws
+                ''', (room_id, *settings))
+
+                for kind, player_id, value in pending_sql:
+                    if kind == 'session':
+                        # Rounds that already have a row for the new session keep the old one
+                        self._execute(conn, '''
+                            UPDATE room_players
+                            SET player_id = ?
+                            WHERE player_id = ? AND room_id = ? AND NOT EXISTS (
+                                SELECT 1 FROM room_players other
+                                WHERE other.player_id = ? AND other.room_id = room_players.room_id
+                                  AND other.round_number = room_players.round_number
+                            )
+                        ''', (value, player_id, room_id, value))
+                    else:
+                        self._execute(conn, '''
+                            UPDATE room_players
+                            SET identifier = ?
+                            WHERE player_id = ? AND room_id = ?
+                        ''', (value, player_id, room_id))
+
+                self._executemany(conn, '''
+                    INSERT INTO room_players (player_id, room_id, name, identifier, round_number, cards, chant_count,
+                                              total_swaps, folded, ready_for_new_round, flipped_cards,
+                                              completion_percentage, joined_at, card_order)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(player_id, room_id, round_number) DO UPDATE SET
+                        name = excluded.name, identifier = excluded.identifier, cards = excluded.cards,
+                        chant_count = excluded.chant_count, total_swaps = excluded.total_swaps,
+                        folded = excluded.folded, ready_for_new_round = excluded.ready_for_new_round,
+                        flipped_cards = excluded.flipped_cards,
+                        completion_percentage = excluded.completion_percentage, card_order = excluded.card_order
+                ''', player_rows)
+
+            self._execute(conn, '''
+                UPDATE event_checkpoints
+                SET last_seq = ?, created_at = CURRENT_TIMESTAMP
+                WHERE id = 1
+            ''', (last_seq,))
+
+    # --- Reads ---
+
+    def load_room(self, room_id):
+        """(mode, max_boosts, decks, used_cards_json, rng_seed, created_at, rng_round, rng_draws, current_round),
+        or None"""
+        with self.connect() as conn:
+            row = self._execute(conn, '''
+                SELECT mode, max_boosts, decks, used_cards, rng_seed, created_at, rng_round, rng_draws
+                FROM rooms
+                WHERE id = ?
+            ''', (room_id,)).fetchone()
+            if not row:
+                return None
+            max_round = (
+                self._execute(conn, 'SELECT MAX(round_number) FROM room_players WHERE room_id = ?',
+                              (room_id,)).fetchone()[0] or
+                self._execute(conn, 'SELECT MAX(round_number) FROM room_rounds_archive WHERE room_id = ?',
+                              (room_id,)).fetchone()[0])
+            return tuple(row) + (max_round if max_round else 1,)
+
+    def load_round(self, room_id, round_number):
+        """Player rows of one round (ROUND_COLUMNS order) - finished rounds come from the archive"""
+        with self.connect() as conn:
+            rows = self._execute(conn, f'''
+                SELECT {ROUND_COLUMNS}
+                FROM room_players
+                WHERE room_id = ? AND round_number = ?
+                ORDER BY joined_at ASC, id ASC
+            ''', (room_id, round_number)).fetchall()
+            row = self._execute(conn, '''
+                SELECT players FROM room_rounds_archive
+                WHERE room_id = ? AND round_number = ?
+            ''', (room_id, round_number)).fetchone()
+            return merge_round(decode_round(row[0]), rows) if row else rows
+
+    def find_player_room(self, player_id):
+        with self.connect() as conn:
+            row = self._execute(conn, '''
+                SELECT room_id FROM room_players WHERE player_id = ? ORDER BY joined_at DESC LIMIT 1
+            ''', (player_id,)).fetchone()
+            return row[0] if row else None
+
+    def room_ids(self):
+        with self.connect() as conn:
+            return {row[0] for row in self._execute(conn, 'SELECT id FROM rooms').fetchall()}
+
+    def room_exists(self, room_id):
+        with self.connect() as conn:
+            return self._execute(conn, 'SELECT 1 FROM rooms WHERE id = ?', (room_id,)).fetchone() is not None
+
+    def rooms_inactive_since(self, cutoff):
+        """Rooms last changed (created included) before the epoch time cutoff, as of the last checkpoint"""
+        with self.connect() as conn:
+            return {row[0] for row in self._execute(conn, '''
+                SELECT id FROM rooms WHERE COALESCE(last_active, 0) < ?
+            ''', (cutoff,)).fetchall()}
+
+    # --- Export ---
+
+    def export_rooms(self, after, limit, since=None, until=None, room_id=None):
+        """Next page of (id, mode, max_boosts, decks, created_at) with id > after, by id - keyset pagination"""
+        query = 'SELECT id, mode, max_boosts, decks, created_at FROM rooms WHERE id > ?'
+        params = [after]
+        for condition, value in (('created_at >= ?', since), ('created_at < ?', until), ('id = ?', room_id)):
+            if value is not None:
+                query += f' AND {condition}'
+                params.append(value)
+        with self.connect() as conn:
+            return [tuple(row) for row in self._execute(conn, query + ' ORDER BY id LIMIT ?',
+                                                        params + [limit]).fetchall()]
+
+    def export_rounds(self, room_ids, after=('', 0), limit=1000):
+        """Up to `limit` rounds of these rooms with (room_id, round_number) > after, in that order
+
+        [(room_id, round_number, [row in ROUND_COLUMNS order, join order])] - keyset pagination over rounds,
+        so a room with thousands of rounds is read a page at a time too.
+        """
+        if not room_ids:
+            return []
+        placeholders = ', '.join('?' * len(room_ids))
+        with self.connect() as conn:
+            keys = [tuple(key) for key in self._execute(conn, f'''
+                SELECT room_id, round_number FROM room_players
+                WHERE room_id IN ({placeholders}) AND (room_id, round_number) > (?, ?)
+                UNION
+                SELECT room_id, round_number FROM room_rounds_archive
+                WHERE room_id IN ({placeholders}) AND (room_id, round_number) > (?, ?)
+                ORDER BY room_id, round_number
+                LIMIT ?
+            ''', (*room_ids, *after, *room_ids, *after, limit)).fetchall()]
+            if not keys:
+                return []
+            page = (*room_ids, *after, *keys[-1])
+            live = {}
+            for row in self._execute(conn, f'''
+                SELECT room_id, round_number, {ROUND_COLUMNS}
+                FROM room_players
+                WHERE room_id IN ({placeholders}) AND (room_id, round_number) > (?, ?)
+                  AND (room_id, round_number) <= (?, ?)
+                ORDER BY joined_at ASC, id ASC
+            ''', page).fetchall():
+                live.setdefault((row[0], row[1]), []).append(tuple(row[2:]))
+            archived = {(room_id, round_number): blob for room_id, round_number, blob in self._execute(conn, f'''
+                SELECT room_id, round_number, players FROM room_rounds_archive
+                WHERE room_id IN ({placeholders}) AND (room_id, round_number) > (?, ?)
+                  AND (room_id, round_number) <= (?, ?)
+            ''', page).fetchall()}
+        return [(*key, merge_round(decode_round(archived[key]), live.get(key, [])) if key in archived else live[key])
+                for key in keys]
+
+    # --- Archive ---
+
+    def archive_rounds(self, limit):
+        """Move up to `limit` finished rounds into room_rounds_archive in one transaction; returns how many"""
+        with self.connect(write=True) as conn:
+            # A round is finished once its room has a later round in room_players
+            finished = self._execute(conn, '''
+                SELECT rp.room_id, rp.round_number
+                FROM room_players rp
+                JOIN (SELECT room_id, MAX(round_number) AS current_round
+                      FROM room_players GROUP BY room_id) rooms_now
+                  ON rooms_now.room_id = rp.room_id
+                WHERE rp.round_number < rooms_now.current_round
+                GROUP BY rp.room_id, rp.round_number
+                LIMIT ?
+            ''', (limit,)).fetchall()
+
+            now = time.time()
+            for room_id, round_number in finished:
+                rows = self._execute(conn, f'''
+                    SELECT {ROUND_COLUMNS}
+                    FROM room_players
+                    WHERE room_id = ? AND round_number = ?
+                    ORDER BY joined_at ASC, id ASC
+                ''', (room_id, round_number)).fetchall()
+                # Already archived once: these rows came back with a late update, the rest stay in the blob
+                archived = self._execute(conn, '''
+                    SELECT players FROM room_rounds_archive
+                    WHERE room_id = ? AND round_number = ?
+                ''', (room_id, round_number)).fetchone()
+                if archived:
+                    rows = merge_round(decode_round(archived[0]), rows)
+                self._execute(conn, '''
+                    INSERT INTO room_rounds_archive (room_id, round_number, players, archived_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(room_id, round_number) DO UPDATE SET
+                        players = excluded.players, archived_at = excluded.archived_at
+                ''', (room_id, round_number, encode_round(rows), now))
+                self._execute(conn, 'DELETE FROM room_players WHERE room_id = ? AND round_number = ?',
+                              (room_id, round_number))
+        return len(finished)
+
+
+class SQLiteStorage(SQLStorage):
+    """Single-file SQLite backend (WAL) - the default"""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path='game.db', pool_size=SQLITE_POOL_SIZE):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._idle = queue.LifoQueue()  # Open connections ready for reuse
+        self.lock_waits = Histogram()  # Seconds each write transaction waited for the file's write lock
+        self.lock_timeouts = Counter()  # ... and gave up with 'database is locked'
+        self.init_schema()
+
+    @contextmanager
+    def connect(self, write=False):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            with conn:  # Commits, or rolls back on error
+                if write:
+                    self._lock_for_write(conn)
+                yield conn
+        finally:
+            if self._idle.qsize() < self.pool_size:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+    def _lock_for_write(self, conn):
+        """Take the write lock up front (a deferred transaction that has to upgrade fails at once when
+        busy) - sqlite3's busy handler retries for up to its 5s timeout, and that wait is what is timed"""
+        start = time.perf_counter()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            self.lock_timeouts.inc()
+            raise
+        finally:
+            self.lock_waits.observe(time.perf_counter() - start)
+
+    def init_schema(self):
+        with self.connect() as conn:
+            # WAL lets log appends and checkpoints run alongside readers
+            conn.execute('PRAGMA journal_mode=WAL')
+
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rooms (
+                    id TEXT PRIMARY KEY,
+                    mode INTEGER NOT NULL,  -- 3 or 6 cards
+                    max_boosts INTEGER NOT NULL,
+                    decks INTEGER DEFAULT 1,  -- Number of decks (1 or 2)
+                    used_cards TEXT DEFAULT '[]',  -- JSON array of used card indices
+                    rng_seed INTEGER,  -- Seed of the room's random streams, for exact replays
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_active REAL,  -- Epoch time of the room's last change, for inactive-room cleanup
+                    rng_round INTEGER,  -- Round whose random stream has had rng_draws floats drawn,
+                    rng_draws INTEGER DEFAULT 0  -- so a cold start resumes it at the same point
+                )
+            ''')
+
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS room_players (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    player_id TEXT NOT NULL,  -- session ID
+                    room_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    identifier TEXT,  -- persistent player identifier for reconnection
+                    round_number INTEGER NOT NULL DEFAULT 1,
+                    cards TEXT DEFAULT '[]',  -- JSON array of cards
+                    chant_count INTEGER DEFAULT 0,  -- Number of successful chants (also used for boost count)
+                    total_swaps INTEGER DEFAULT 0,  -- Total number of swaps done by player in this round
+                    folded INTEGER DEFAULT 0,
+                    ready_for_new_round INTEGER DEFAULT 0,
+                    flipped_cards TEXT DEFAULT '[]',  -- JSON array
+                    completion_percentage REAL DEFAULT 0.0,
+                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    card_order TEXT,  -- JSON display permutation (position -> card slot), NULL = dealt order
+                    FOREIGN KEY (room_id) REFERENCES rooms(id),
+                    UNIQUE(player_id, room_id, round_number)
+                )
+            ''')
+            # Room lookups - finished rounds are archived, so this only spans current rounds
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_room_players_room ON room_players (room_id, round_number)')
+
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS room_rounds_archive (
+                    room_id TEXT NOT NULL,
+                    round_number INTEGER NOT NULL,
+                    players BLOB NOT NULL,  -- zlib-compressed JSON, hands as card codes
+                    archived_at REAL NOT NULL,
+                    PRIMARY KEY (room_id, round_number)
+                ) WITHOUT ROWID
+            ''')
+
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS room_events (
+                    seq INTEGER PRIMARY KEY,
+                    room_id TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,  -- JSON
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_room_events_room ON room_events (room_id, seq)')
+
+            # Last event already reflected in the rooms/room_players rows
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS event_checkpoints (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_seq INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('INSERT OR IGNORE INTO event_checkpoints (id, last_seq) VALUES (1, 0)')
+
+            # Migrate databases created before rng_seed existed
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(rooms)')]
+            if 'rng_seed' not in columns:
+                conn.execute('ALTER TABLE rooms ADD COLUMN rng_seed INTEGER')
+            # ... and before last_active - until then activity was read from the (uncompacted) event log
+            if 'last_active' not in columns:
+                conn.execute('ALTER TABLE rooms ADD COLUMN last_active REAL')
+                conn.execute('''
+                    UPDATE rooms
+                    SET last_active = (SELECT MAX(created_at) FROM room_events WHERE room_events.room_id = rooms.id)
+                ''')
+            # ... and before the stream position - those rooms restart their current round's stream at draw 0
+            if 'rng_round' not in columns:
+                conn.execute('ALTER TABLE rooms ADD COLUMN rng_round INTEGER')
+                conn.execute('ALTER TABLE rooms ADD COLUMN rng_draws INTEGER DEFAULT 0')
+            # ... and before card_order
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(room_players)')]
+            if 'card_order' not in columns:
+                conn.execute('ALTER TABLE room_players ADD COLUMN card_order TEXT')
+
+
+class PostgresStorage(SQLStorage):
+    """PostgreSQL backend with a thread-safe connection pool - concurrent writers instead of one file lock
+
+    Experimental: not run in production. bench_storage.py runs the same conformance checks as the SQLite
+    backends against it when POSTGRES_TEST_DSN points at a scratch database.
+    """
+
+    name = 'postgresql'
+    placeholder = '%s'
+
+    def __init__(self, url, pool_size=POSTGRES_POOL_SIZE):
+        if psycopg2 is None:
+            raise RuntimeError('DATABASE_URL points at PostgreSQL but psycopg2 is not installed')
+        self.url = url
+        self.pool = psycopg2.pool.ThreadedConnectionPool(1, pool_size, url)
+        # The pool raises PoolError when every connection is out; callers past pool_size wait here instead
+        self._slots = threading.BoundedSemaphore(pool_size)
+        print("[STORAGE] PostgreSQL backend is experimental")
+        self.init_schema()
+
+    @contextmanager
+    def connect(self, write=False):
+        with self._slots:
+            conn = self.pool.getconn()
+            try:
+                with conn:  # Commits, or rolls back on error
+                    yield conn
+            finally:
+                self.pool.putconn(conn)
+
+    def init_schema(self):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            # Timestamps stay TEXT in SQLite's CURRENT_TIMESTAMP format so both backends compare them the same way
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS rooms (
+                    id TEXT PRIMARY KEY,
+                    mode INTEGER NOT NULL,
+                    max_boosts INTEGER NOT NULL,
+                    decks INTEGER DEFAULT 1,
+                    used_cards TEXT DEFAULT '[]',
+                    rng_seed BIGINT,
+                    created_at TEXT DEFAULT to_char(now() AT TIME ZONE 'utc', 'YYYY-MM-DD HH24:MI:SS'),
+                    last_active DOUBLE PRECISION,
+                    rng_round INTEGER,
+                    rng_draws BIGINT DEFAULT 0
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS room_players (
+                    id BIGSERIAL PRIMARY KEY,
+                    player_id TEXT NOT NULL,
+                    room_id TEXT NOT NULL REFERENCES rooms(id),
+                    name TEXT NOT NULL,
+                    identifier TEXT,
+                    round_number INTEGER NOT NULL DEFAULT 1,
+                    cards TEXT DEFAULT '[]',
+                    chant_count INTEGER DEFAULT 0,
+                    total_swaps INTEGER DEFAULT 0,
+                    folded INTEGER DEFAULT 0,
+                    ready_for_new_round INTEGER DEFAULT 0,
+                    flipped_cards TEXT DEFAULT '[]',
+                    completion_percentage DOUBLE PRECISION DEFAULT 0.0,
+                    joined_at TEXT DEFAULT to_char(now() AT TIME ZONE 'utc', 'YYYY-MM-DD HH24:MI:SS'),
+                    card_order TEXT,
+                    UNIQUE (player_id, room_id, round_number)
+                )
+            ''')
+            cursor.execute('ALTER TABLE room_players ADD COLUMN IF NOT EXISTS card_order TEXT')
+            cursor.execute('ALTER TABLE rooms ADD COLUMN IF NOT EXISTS last_active DOUBLE PRECISION')
+            cursor.execute('ALTER TABLE rooms ADD COLUMN IF NOT EXISTS rng_round INTEGER')
+            cursor.execute('ALTER TABLE rooms ADD COLUMN IF NOT EXISTS rng_draws BIGINT DEFAULT 0')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_room_players_room ON room_players (room_id, round_number)')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS room_rounds_archive (
+                    room_id TEXT NOT NULL,
+                    round_number INTEGER NOT NULL,
+                    players BYTEA NOT NULL,
+                    archived_at DOUBLE PRECISION NOT NULL,
+                    PRIMARY KEY (room_id, round_number)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS room_events (
+                    seq BIGINT PRIMARY KEY,
+                    room_id TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at DOUBLE PRECISION NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_room_events_room ON room_events (room_id, seq)')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS event_checkpoints (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_seq BIGINT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('INSERT INTO event_checkpoints (id, last_seq) VALUES (1, 0) ON CONFLICT (id) DO NOTHING')
+            # Rooms from before last_active: their activity is still in the (uncompacted) event log
+            cursor.execute('''
+                UPDATE rooms
+                SET last_active = (SELECT MAX(created_at) FROM room_events WHERE room_events.room_id = rooms.id)
+                WHERE last_active IS NULL
+            ''')
+
+
+class MemoryStorage:
+    """Everything in process memory - for benchmarks and tests; nothing survives the process"""
+
+    name = 'memory'
+    db_path = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []  # (seq, room_id, type, payload_json, created_at), in seq order
+        self._checkpoint_seq = 0
+        self._rooms = {}  # room_id -> (mode, max_boosts, decks, used_cards_json, rng_seed, created_at)
+        self._last_active = {}  # room_id -> epoch time of its last change
+        self._rng_draws = {}  # room_id -> (rng_round, rng_draws)
+        self._rounds = {}  # (room_id, round_number) -> {player_id: row in ROUND_COLUMNS order}
+        self._archive = {}  # (room_id, round_number) -> encode_round blob
+
+    def max_event_seq(self):
+        with self._lock:
+            return max(self._events[-1][0] if self._events else 0, self._checkpoint_seq)
+
+    def append_events(self, batch):
+        with self._lock:
+            self._events.extend(batch)
+
+    def read_events_since(self, seq):
+        with self._lock:
+            events = [event[:4] for event in self._events if event[0] > seq]
+        yield from events
+
+    def read_room_events(self, room_id, limit):
+        with self._lock:
+            rows = [(seq, event_type, payload, created_at)
+                    for seq, event_room, event_type, payload, created_at in self._events if event_room == room_id]
+        return rows[:limit]
+
+    def compact_events(self, before, limit):
+        with self._lock:
+            count = 0
+            while (count < limit and count < len(self._events) and self._events[count][0] <= self._checkpoint_seq
+                   and self._events[count][4] < before):
+                count += 1
+            del self._events[:count]
+        return count
+
+    def last_checkpoint(self):
+        return self._checkpoint_seq
+
+    def write_checkpoint(self, deleted, rooms, last_seq):
+        with self._lock:
+            if deleted:
+                gone = set(deleted)
+                self._events = [event for event in self._events if event[1] not in gone or event[0] > last_seq]
+            for room_id in deleted:
+                self._rooms.pop(room_id, None)
+                self._last_active.pop(room_id, None)
+                self._rng_draws.pop(room_id, None)
+                for key in [key for key in list(self._rounds) + list(self._archive) if key[0] == room_id]:
+                    self._rounds.pop(key, None)
+                    self._archive.pop(key, None)
+
+            for room_id, settings, pending_sql, player_rows in rooms:
+                mode, max_boosts, decks, used_cards, rng_seed, created_at, last_active, rng_round, rng_draws = settings
+                if room_id in self._rooms:
+                    created_at = self._rooms[room_id][5]
+                self._rooms[room_id] = (mode, max_boosts, decks, used_cards, rng_seed, created_at)
+                self._last_active[room_id] = last_active
+                self._rng_draws[room_id] = (rng_round, rng_draws)
+
+                for kind, player_id, value in pending_sql:
+                    for key, players in self._rounds.items():
+                        if key[0] != room_id or player_id not in players:
+                            continue
+                        if kind == 'session':
+                            if value not in players:
+                                self._rounds[key] = {(value if pid == player_id else pid): (
+                                    (value,) + row[1:] if pid == player_id else row) for pid, row in players.items()}
+                        else:
+                            row = players[player_id]
+                            players[player_id] = row[:2] + (value,) + row[3:]
+
+                for (player_id, _, name, identifier, round_number, cards, chant_count, total_swaps, folded,
+                     ready, flipped, completion, joined_at, card_order) in player_rows:
+                    players = self._rounds.setdefault((room_id, round_number), {})
+                    if player_id in players:
+                        joined_at = players[player_id][10]
+                    players[player_id] = (player_id, name, identifier, cards, chant_count, total_swaps, folded,
+                                          ready, flipped, completion, joined_at, card_order)
+
+            self._checkpoint_seq = last_seq
+
+    def load_room(self, room_id):
+        with self._lock:
+            settings = self._rooms.get(room_id)
+            if settings is None:
+                return None
+            rounds = [number for room, number in self._rounds if room == room_id] or \
+                     [number for room, number in self._archive if room == room_id]
+            return settings + self._rng_draws.get(room_id, (None, 0)) + (max(rounds) if rounds else 1,)
+
+    def load_round(self, room_id, round_number):
+        with self._lock:
+            # Dicts keep insertion order, standing in for the id tiebreak
+            rows = sorted(self._rounds.get((room_id, round_number), {}).values(), key=lambda row: row[10])
+            blob = self._archive.get((room_id, round_number))
+            return merge_round(decode_round(blob), rows) if blob else rows
+
+    def find_player_room(self, player_id):
+        with self._lock:
+            found = [(players[player_id][10], room_id) for (room_id, _), players in self._rounds.items()
+                     if player_id in players]
+        return max(found)[1] if found else None
+
+    def room_ids(self):
+        with self._lock:
+            return set(self._rooms)
+
+    def room_exists(self, room_id):
+        with self._lock:
+            return room_id in self._rooms
+
+    def rooms_inactive_since(self, cutoff):
+        with self._lock:
+            return {room_id for room_id in self._rooms if (self._last_active.get(room_id) or 0) < cutoff}
+
+    def export_rooms(self, after, limit, since=None, until=None, room_id=None):
+        with self._lock:
+            rooms = [(rid, mode, max_boosts, decks, created_at)
+                     for rid, (mode, max_boosts, decks, _, _, created_at) in self._rooms.items()
+                     if rid > after and (since is None or created_at >= since) and
+                     (until is None or created_at < until) and (room_id is None or rid == room_id)]
+        return sorted(rooms)[:limit]
+
+    def export_rounds(self, room_ids, after=('', 0), limit=1000):
+        room_ids = set(room_ids)
+        with self._lock:
+            keys = sorted({key for key in list(self._rounds) + list(self._archive)
+                           if key[0] in room_ids and key > tuple(after)})[:limit]
+            live = {key: sorted(self._rounds[key].values(), key=lambda row: row[10])
+                    for key in keys if key in self._rounds}
+            archived = {key: self._archive[key] for key in keys if key in self._archive}
+        return [(*key, merge_round(decode_round(archived[key]), live.get(key, [])) if key in archived else live[key])
+                for key in keys]
+
+    def archive_rounds(self, limit):
+        with self._lock:
+            current = {}
+            for room_id, round_number in self._rounds:
+                current[room_id] = max(current.get(room_id, 0), round_number)
+            finished = [key for key in self._rounds if key[1] < current[key[0]]][:limit]
+            for key in finished:
+                rows = sorted(self._rounds.pop(key).values(), key=lambda row: row[10])
+                if key in self._archive:
+                    rows = merge_round(decode_round(self._archive[key]), rows)
+                self._archive[key] = encode_round(rows)
+        return len(finished)
+
+
+class ShardedStorage:
+    """SQLite split over N files by hash(room_id) - each shard has its own WAL, write lock and connections
+
+    A room's rows and events live in one shard; work over many rooms fans out to every shard in parallel.
+    The shard count is fixed for a deployment: changing it leaves existing rooms in the wrong files.
+
+    Sharding does not raise write throughput - today it costs some. Events still go through EventLog's
+    single flush thread, and each flush is split into one transaction per shard (on a thread each, all
+    under one GIL). bench_storage.py's EventLog column measured ~50-60k events/s at 1 shard, ~35-55k at
+    4 and ~30-35k at 8. What shards buy is separate write locks, so a checkpoint, the round archiver and
+    the event flush touching different shards do not wait on each other.
+    """
+
+    name = 'sqlite-sharded'
+
+    def __init__(self, db_path, shards, pool_size=SQLITE_POOL_SIZE):
+        self.db_path = db_path  # Not a shard itself - local data such as the leaderboard stays here
+        self.shards = [SQLiteStorage(shard_path(db_path, shard), pool_size) for shard in range(shards)]
+
+    def shard(self, room_id):
+        # crc32, unlike hash(), is the same in every process
+        return self.shards[zlib.crc32(room_id.encode()) % len(self.shards)]
+
+    def _fan_out(self, work, args_by_shard=None):
+        """Run work(shard, *args) on every shard in parallel; results in shard order
+
+        A shard whose args are None is skipped (its result is None).
+        """
+        args_by_shard = args_by_shard or [()] * len(self.shards)
+        jobs = [i for i, args in enumerate(args_by_shard) if args is not None]
+        results, errors = [None] * len(self.shards), []
+
+        def run(i):
+            try:
+                results[i] = work(self.shards[i], *args_by_shard[i])
+            except Exception as e:
+                errors.append(e)
+
+        # Plain threads rather than an executor: the final checkpoint runs at exit, after executors shut down.
+        # The first job runs on the calling thread, so single-shard work costs no thread at all
+        threads = [threading.Thread(target=run, args=(i,)) for i in jobs[1:]]
+        for thread in threads:
+            thread.start()
+        if jobs:
+            run(jobs[0])
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def _split(self, items, room_id_of):
+        parts = [[] for _ in self.shards]
+        for item in items:
+            parts[zlib.crc32(room_id_of(item).encode()) % len(self.shards)].append(item)
+        return parts
+
+    def max_event_seq(self):
+        return max(self._fan_out(SQLiteStorage.max_event_seq))
+
+    def append_events(self, batch):
+        # Not atomic across shards: when one shard fails EventLog retries the whole batch, and the
+        # shards that did commit skip the rows they already have
+        parts = self._split(batch, lambda event: event[1])
+        self._fan_out(SQLiteStorage.append_events, [(part,) if part else None for part in parts])
+
+    def read_events_since(self, seq):
+        # Sequence numbers are global, so the per-shard logs merge back into one order
+        return heapq.merge(*(shard.read_events_since(seq) for shard in self.shards))
+
+    def read_room_events(self, room_id, limit):
+        return self.shard(room_id).read_room_events(room_id, limit)
+
+    def compact_events(self, before, limit):
+        # Each shard compacts up to its own checkpoint - its rows already reflect everything below it
+        return sum(self._fan_out(SQLiteStorage.compact_events, [(before, limit)] * len(self.shards)))
+
+    def last_checkpoint(self):
+        # Shards commit their checkpoints separately, so events a shard already checkpointed may be
+        # replayed on top of its rows. That is safe because each room's events are re-applied in order
+        # and each one either sets absolute values or (used_cards_changed) adds / removes set members:
+        # whatever was replayed, the last event touching a field or a card decides where it ends up
+        return min(self._fan_out(SQLiteStorage.last_checkpoint))
+
+    def write_checkpoint(self, deleted, rooms, last_seq):
+        deleted_parts = self._split(deleted, lambda room_id: room_id)
+        room_parts = self._split(rooms, lambda room: room[0])
+        self._fan_out(SQLiteStorage.write_checkpoint,
+                      [(part_deleted, part_rooms, last_seq) for part_deleted, part_rooms in zip(deleted_parts, room_parts)])
+
+    def load_room(self, room_id):
+        return self.shard(room_id).load_room(room_id)
+
+    def load_round(self, room_id, round_number):
+        return self.shard(room_id).load_round(room_id, round_number)
+
+    def find_player_room(self, player_id):
+        # Session IDs are unique, so at most one shard knows the player
+        return next((room_id for room_id in self._fan_out(SQLiteStorage.find_player_room, [(player_id,)] * len(self.shards))
+                     if room_id), None)
+
+    def room_ids(self):
+        return set().union(*self._fan_out(SQLiteStorage.room_ids))
+
+    def room_exists(self, room_id):
+        return self.shard(room_id).room_exists(room_id)
+
+    def rooms_inactive_since(self, cutoff):
+        return set().union(*self._fan_out(SQLiteStorage.rooms_inactive_since, [(cutoff,)] * len(self.shards)))
+
+    def export_rooms(self, after, limit, since=None, until=None, room_id=None):
+        if room_id is not None:
+            return self.shard(room_id).export_rooms(after, limit, since, until, room_id)
+        pages = self._fan_out(SQLiteStorage.export_rooms, [(after, limit, since, until)] * len(self.shards))
+        return list(heapq.merge(*pages))[:limit]
+
+    def export_rounds(self, room_ids, after=('', 0), limit=1000):
+        # Each shard's first `limit` rounds after the key include the overall first `limit`
+        parts = self._split(room_ids, lambda room_id: room_id)
+        pages = self._fan_out(SQLiteStorage.export_rounds,
+                              [(part, after, limit) if part else None for part in parts])
+        return list(heapq.merge(*(page for page in pages if page), key=lambda page_round: page_round[:2]))[:limit]
+
+    def archive_rounds(self, limit):
+        return sum(self._fan_out(SQLiteStorage.archive_rounds, [(limit,)] * len(self.shards)))